@@ -0,0 +1,31 @@
+#!/usr/bin/python
+# -*- coding: latin-1 -*-
+
+# Newer Messages Editor - Edits NewerSMBW's messages.bin
+# Version 1.3
+# Copyright (C) 2013-2014 RoadrunnerWMC
+
+# This file is part of Newer Messages Editor.
+
+# Newer Messages Editor is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Newer Messages Editor is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Newer Messages Editor.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# benchmarks/__init__.py
+# Performance benchmarks for Newer Messages Editor
+# Run them from the repository root, e.g.:
+#     python3 -m benchmarks.bench_parse
+# benchmarks.suite runs all of the main ones and saves the results
+# as JSON, to compare with later runs:
+#     python3 -m benchmarks.suite -o before.json
+#     python3 -m benchmarks.suite --compare before.json
@@ -0,0 +1,118 @@
+#!/usr/bin/python
+# -*- coding: latin-1 -*-
+
+# Newer Messages Editor - Edits NewerSMBW's messages.bin
+# Version 1.3
+# Copyright (C) 2013-2014 RoadrunnerWMC
+
+# This file is part of Newer Messages Editor.
+
+# Newer Messages Editor is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Newer Messages Editor is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Newer Messages Editor.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# benchmarks/bench_open.py
+# Measures how long opening a file in chunks takes to produce its first
+# messages, compared with parsing all of them, both with and without
+# memory-mapping. Also checks that a memory-mapped file isn't read as a
+# whole to get its first messages. Usage:
+#     python3 -m benchmarks.bench_open [count ...]
+
+
+################################################################
+################################################################
+
+# Imports
+import gc, os, sys, tempfile, time
+
+from benchmarks.synthetic import GenerateFile
+import nme_core
+
+
+# The first messages should be ready this quickly, whatever the size
+FirstChunkBudget = 0.1 # seconds
+
+
+def BytesRead():
+    """Returns the number of bytes this process has read from files so
+    far, or None where that isn't known (anywhere but Linux). Pages of
+    memory-mapped files aren't counted"""
+    try:
+        with open('/proc/self/io') as file:
+            for line in file:
+                if line.startswith('rchar:'): return int(line.split()[1])
+    except OSError: pass
+    return None
+
+
+def Measure(fp):
+    """Opens fp in chunks and returns (seconds to the first chunk,
+    seconds to the last one, bytes read to get the first chunk or None)"""
+    gc.collect()
+    before = BytesRead()
+    start = time.perf_counter()
+    file, count, chunks = nme_core.OpenFileInChunks(fp)
+    first = read = None
+    for chunk in chunks:
+        file.AppendMessages(chunk)
+        if first is None:
+            first = time.perf_counter() - start
+            if before is not None: read = BytesRead() - before
+    total = time.perf_counter() - start
+
+    if len(file.Messages) != count: raise AssertionError('Not every message was loaded')
+    if isinstance(file, nme_core.LazyMessagesBin): file.close()
+    return first or total, total, read
+
+
+def main(counts):
+    """Runs the benchmark for each message count"""
+    print('%10s %10s | %20s | %20s' % ('messages', 'MB', 'in memory', 'memory-mapped'))
+    print('%10s %10s | %9s %10s | %9s %10s' % ('', '', 'first', 'all', 'first', 'all'))
+    threshold = nme_core.LazyLoadThreshold
+    over = wholeFile = False
+    with tempfile.TemporaryDirectory() as dir:
+        fp = os.path.join(dir, 'messages.bin')
+        for count in counts:
+            data = GenerateFile(count)
+            with open(fp, 'wb') as file: file.write(data)
+            del data
+
+            try:
+                nme_core.LazyLoadThreshold = 1 << 62
+                eager = Measure(fp)
+                nme_core.LazyLoadThreshold = 0
+                lazy = Measure(fp)
+            finally: nme_core.LazyLoadThreshold = threshold
+
+            # Files this big would really be memory-mapped
+            if os.path.getsize(fp) >= threshold: first = lazy[0]
+            else: first = eager[0]
+            over = over or first > FirstChunkBudget
+
+            # Only the index table needs reading, not the strings
+            readAll = lazy[2] is not None and lazy[2] >= os.path.getsize(fp)
+            wholeFile = wholeFile or readAll
+
+            print('%10d %10.1f | %7.1f ms %8.3f s | %7.1f ms %8.3f s%s%s' % (
+                count, os.path.getsize(fp) / 1048576, eager[0] * 1000, eager[1], lazy[0] * 1000, lazy[1],
+                '  OVER BUDGET' if first > FirstChunkBudget else '', '  READ THE WHOLE FILE' if readAll else ''))
+
+    if over: print('The first messages took longer than %d ms' % (FirstChunkBudget * 1000))
+    if wholeFile: print('The whole memory-mapped file was read to get its first messages')
+    return not over and not wholeFile
+
+
+if __name__ == '__main__':
+    counts = [int(arg) for arg in sys.argv[1:]] or [10000, 100000, 1000000]
+    sys.exit(0 if main(counts) else 1)
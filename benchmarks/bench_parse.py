@@ -0,0 +1,97 @@
+#!/usr/bin/python
+# -*- coding: latin-1 -*-
+
+# Newer Messages Editor - Edits NewerSMBW's messages.bin
+# Version 1.3
+# Copyright (C) 2013-2014 RoadrunnerWMC
+
+# This file is part of Newer Messages Editor.
+
+# Newer Messages Editor is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Newer Messages Editor is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Newer Messages Editor.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# benchmarks/bench_parse.py
+# Compares the old byte-at-a-time messages.bin parser with the
+# current one. Usage:
+#     python3 -m benchmarks.bench_parse [count ...]
+
+
+################################################################
+################################################################
+
+# Imports
+import sys, time
+
+from benchmarks.synthetic import GenerateFile
+from nme_core import Message, MessagesBin
+
+
+def LegacyInitFromData(data):
+    """The parser from Newer Messages Editor 1.2, for reference"""
+    NumberOfMessages = (data[0] << 24) | (data[1] << 16) | (data[2] << 8) | data[3]
+
+    messages = []
+    for i in range(NumberOfMessages):
+        id = (data[(12*i)+4] << 24) | (data[(12*i)+5] << 16) | (data[(12*i)+6] << 8) | data[(12*i)+7]
+        tOffset = (data[(12*i)+8] << 24) | (data[(12*i)+9] << 16) | (data[(12*i)+10] << 8) | data[(12*i)+11]
+        bOffset = (data[(12*i)+12] << 24) | (data[(12*i)+13] << 16) | (data[(12*i)+14] << 8) | data[(12*i)+15]
+        id -= 0x100
+
+        strings = []
+        for j in (tOffset, bOffset):
+            string = ''
+            while True:
+                try: char = (data[j] << 8) | data[j+1]
+                except: break
+                char = chr(char)
+                if char == chr(0x00): break
+                string += char
+                j += 2
+            strings.append(string)
+
+        messages.append(Message(id, strings[0], strings[1]))
+
+    return messages
+
+
+def Time(func, *args):
+    """Runs func(*args) and returns (seconds, result)"""
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def main(counts):
+    """Runs the benchmark for each message count"""
+    print('%10s %10s %12s %12s %8s' % ('messages', 'MB', 'legacy (s)', 'bulk (s)', 'speedup'))
+    for count in counts:
+        data = GenerateFile(count)
+
+        legacyTime, legacy = Time(LegacyInitFromData, data)
+        bulkTime, bulk = Time(MessagesBin, data)
+
+        # Both parsers have to agree
+        for a, b in zip(legacy, bulk.Messages):
+            if (a.id, a.title, a.text) != (b.id, b.title, b.text):
+                raise AssertionError('Parsers disagree on message %d' % a.id)
+        if len(legacy) != len(bulk.Messages):
+            raise AssertionError('Parsers disagree on the message count')
+
+        print('%10d %10.1f %12.3f %12.3f %7.1fx' % (
+            count, len(data) / 1048576, legacyTime, bulkTime, legacyTime / bulkTime))
+
+
+if __name__ == '__main__':
+    counts = [int(arg) for arg in sys.argv[1:]] or [10000, 100000, 1000000]
+    main(counts)
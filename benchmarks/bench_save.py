@@ -0,0 +1,127 @@
+#!/usr/bin/python
+# -*- coding: latin-1 -*-
+
+# Newer Messages Editor - Edits NewerSMBW's messages.bin
+# Version 1.3
+# Copyright (C) 2013-2014 RoadrunnerWMC
+
+# This file is part of Newer Messages Editor.
+
+# Newer Messages Editor is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Newer Messages Editor is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Newer Messages Editor.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# benchmarks/bench_save.py
+# Compares the old list-of-ints MessagesBin.save with the current
+# writer, both for speed and for peak memory. Usage:
+#     python3 -m benchmarks.bench_save [count ...]
+
+
+################################################################
+################################################################
+
+# Imports
+import io, sys, time, tracemalloc
+
+from benchmarks.synthetic import GenerateFile
+from nme_core import MessagesBin
+
+
+def LegacySave(file):
+    """MessagesBin.save from Newer Messages Editor 1.2, for reference"""
+    data = []
+
+    M = len(file.Messages)
+    data.append((M >> 24) & 0xFF)
+    data.append((M >> 16) & 0xFF)
+    data.append((M >>  8) & 0xFF)
+    data.append((M >>  0) & 0xFF)
+
+    textData = []
+    i = 4 + 12*len(file.Messages)
+    for msg in file.Messages:
+        id = 0x0100 + msg.id
+        data.append((id >> 24) & 0xFF)
+        data.append((id >> 16) & 0xFF)
+        data.append((id >>  8) & 0xFF)
+        data.append((id >>  0) & 0xFF)
+
+        for string in (msg.title, msg.text):
+            data.append((i >> 24) & 0xFF)
+            data.append((i >> 16) & 0xFF)
+            data.append((i >>  8) & 0xFF)
+            data.append((i >>  0) & 0xFF)
+
+            for j in string:
+                char = ord(j)
+                textData.append((char >> 8) & 0xFF)
+                textData.append((char >> 0) & 0xFF)
+                i += 2
+
+            textData.append(0)
+            textData.append(0)
+            i += 2
+
+    for i in textData: data.append(i)
+    return bytes(data)
+
+
+class NullFile():
+    """File object that throws away everything written to it"""
+    def write(self, data):
+        """Does nothing"""
+        return len(data)
+
+
+def Measure(func, *args):
+    """Returns (seconds, peak MB, result) for func(*args)"""
+    start = time.perf_counter()
+    result = func(*args)
+    seconds = time.perf_counter() - start
+
+    # Measured separately, since tracing slows everything down a lot
+    del result
+    tracemalloc.start()
+    result = func(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return seconds, peak / 1048576, result
+
+
+def main(counts):
+    """Runs the benchmark for each message count"""
+    print('%10s %10s | %22s | %22s | %22s' % ('messages', 'MB', 'legacy save', 'save', 'saveTo'))
+    for count in counts:
+        data = GenerateFile(count)
+        file = MessagesBin(data)
+
+        legacy = Measure(LegacySave, file)
+        new = Measure(file.save)
+        streamed = Measure(file.saveTo, NullFile())
+
+        # The writers have to agree with each other
+        if legacy[2] != data or new[2] != data:
+            raise AssertionError('save() output differs from the original file')
+        stream = io.BytesIO()
+        file.saveTo(stream)
+        if stream.getvalue() != data:
+            raise AssertionError('saveTo() output differs from the original file')
+
+        print('%10d %10.1f | %8.3f s %9.1f MB | %8.3f s %9.1f MB | %8.3f s %9.1f MB' % (
+            (count, len(data) / 1048576) + legacy[:2] + new[:2] + streamed[:2]))
+
+
+if __name__ == '__main__':
+    counts = [int(arg) for arg in sys.argv[1:]] or [10000, 100000, 1000000]
+    main(counts)
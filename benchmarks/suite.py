@@ -0,0 +1,270 @@
+#!/usr/bin/python
+# -*- coding: latin-1 -*-
+
+# Newer Messages Editor - Edits NewerSMBW's messages.bin
+# Version 1.3
+# Copyright (C) 2013-2014 RoadrunnerWMC
+
+# This file is part of Newer Messages Editor.
+
+# Newer Messages Editor is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Newer Messages Editor is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Newer Messages Editor.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# benchmarks/suite.py
+# Times the main operations of Newer Messages Editor over a range of
+# synthetic files, and writes the results as JSON so that runs can be
+# compared with each other. Usage:
+#     python3 -m benchmarks.suite [-o results.json] [--compare old.json]
+# The GUI benchmarks use Qt's offscreen platform, and are skipped if
+# PyQt5 isn't installed. Each case also measures how much memory the
+# parsed file takes, as a MessagesBin and as a ColumnarMessagesBin.
+
+
+################################################################
+################################################################
+
+# Imports
+import argparse, collections, gc, json, os, platform, sys, time, tracemalloc
+
+from benchmarks.synthetic import GenerateFile
+from nme_core import version, ColumnarIdIndex, ColumnarMessagesBin, IdIndex, MessagesBin
+import nme_memory, nme_strings
+
+
+# Message counts for each preset
+Presets = {
+    'quick': [1, 1000, 10000],
+    'default': [1, 1000, 10000, 100000],
+    'full': [1, 1000, 10000, 100000, 1000000],
+    }
+
+# Variations on the default file, run at VariantCount messages
+VariantCount = 10000
+Variants = collections.OrderedDict([
+    ('short-strings', {'titleLen': 4, 'textLen': 8}),
+    ('long-strings', {'titleLen': 64, 'textLen': 1024}),
+    ('ascii', {'wideRatio': 0}),
+    ('mostly-wide', {'wideRatio': 0.9}),
+    ('astral', {'astralRatio': 0.05}),
+    ('shuffled-ids', {'ids': 'shuffled'}),
+    ('sparse-ids', {'ids': 'sparse'}),
+    ('duplicate-ids', {'ids': 'duplicates'}),
+    ])
+
+MinRuns = 3 # each benchmark runs at least this many times...
+MaxSeconds = 2 # ...and keeps going for this long if it's quick
+DefaultThreshold = 0.25 # slowdown counted as a regression by --compare
+
+
+def Time(func, minRuns=MinRuns, maxSeconds=MaxSeconds):
+    """Runs func a few times, and returns the fastest and median times
+    in seconds"""
+    times = []
+    end = time.perf_counter() + maxSeconds
+    while len(times) < minRuns or (time.perf_counter() < end and len(times) < 100):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return collections.OrderedDict([
+        ('min', times[0]),
+        ('median', times[len(times) // 2]),
+        ('runs', len(times)),
+        ])
+
+
+def MemoryUse(parse):
+    """Returns the number of bytes taken up by what parse() returns"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        kept = parse() # until it's been measured
+        return tracemalloc.get_traced_memory()[0]
+    finally: tracemalloc.stop()
+
+
+def ReadAll(file):
+    """Reads the ID, title and text of every message in file"""
+    for msg in file.Messages: msg.id, msg.title, msg.text
+
+
+def Cases(counts, variants=True):
+    """Yields (name, GenerateFile() keyword arguments) for each case"""
+    for count in counts:
+        yield 'default-%d' % count, {'count': count}
+    if not variants: return
+    for name, kwargs in Variants.items():
+        kwargs = dict(kwargs, count=VariantCount)
+        yield '%s-%d' % (name, VariantCount), kwargs
+
+
+class GuiBenchmarks():
+    """Times the message viewer, with Qt drawing offscreen"""
+    def __init__(self):
+        """Inits GuiBenchmarks. Raises ImportError if PyQt5 isn't there"""
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+        os.environ.setdefault('QT_LOGGING_RULES', 'qt.qpa.*=false') # the offscreen platform is chatty
+        from PyQt5 import QtWidgets
+        import newer_messages_editor
+
+        self.app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv[:1])
+        self.viewer = newer_messages_editor.MessageViewer()
+        self.viewer.resize(800, 600)
+        self.viewer.show()
+
+    def Run(self, file):
+        """Returns timings for file"""
+        viewer, app = self.viewer, self.app
+        timings = collections.OrderedDict()
+
+        def SetFile():
+            viewer.setFile(file)
+            viewer.indexTimer.stop() # indexing for searches happens later
+            app.processEvents()
+        timings['viewer_setfile'] = Time(SetFile)
+
+        viewer.picker.setCurrentIndex(viewer.model.index(0, 0))
+        def UpdateNames():
+            viewer.UpdateNames()
+            app.processEvents()
+        timings['viewer_updatenames'] = Time(UpdateNames)
+
+        viewer.setFile(None)
+        return timings
+
+
+def RunCase(kwargs, gui=None, memory=True):
+    """Returns the results for one case"""
+    data = GenerateFile(**kwargs)
+    file = MessagesBin(data)
+    columnar = ColumnarMessagesBin(data)
+    if file.diagnostics: raise AssertionError('the generated file has problems')
+    if file.save() != data: raise AssertionError('save() output differs from the generated file')
+    if columnar.save() != data: raise AssertionError('ColumnarMessagesBin.save() output differs from the generated file')
+
+    timings = collections.OrderedDict()
+    timings['parse'] = Time(lambda: MessagesBin().InitFromData(data))
+    timings['save'] = Time(file.save)
+    timings['compact_save'] = Time(lambda: file.save(compact=True))
+    timings['round_trip'] = Time(lambda: MessagesBin(MessagesBin(data).save()))
+    timings['duplicate_check'] = Time(lambda: IdIndex(file.Messages).Duplicates())
+    timings['read_all'] = Time(lambda: ReadAll(file))
+    timings['tokenize'] = Time(lambda: [nme_strings.Tokenize(msg.text) for msg in file.Messages])
+
+    # Translation memory suggestions, for 100 slightly changed texts
+    memory = nme_memory.TranslationMemory()
+    memory.AddMessages(file.Messages)
+    queries = [msg.text + ' mario' for msg in file.Messages[::max(len(file.Messages) // 100, 1)]]
+    timings['memory_build'] = Time(lambda: nme_memory.TranslationMemory().AddMessages(file.Messages), minRuns=1)
+    timings['memory_lookup_100'] = Time(lambda: [memory.Lookup(query) for query in queries])
+
+    # The same, with the messages kept in columns
+    timings['columnar_parse'] = Time(lambda: ColumnarMessagesBin().InitFromData(data))
+    timings['columnar_save'] = Time(columnar.save)
+    timings['columnar_duplicate_check'] = Time(lambda: ColumnarIdIndex(columnar).Duplicates())
+    timings['columnar_read_all'] = Time(lambda: ReadAll(columnar))
+    if gui is not None: timings.update(gui.Run(file))
+
+    result = collections.OrderedDict()
+    result['params'] = kwargs
+    result['bytes'] = len(data)
+    result['compact_bytes'] = len(file.save(compact=True))
+    result['timings'] = timings
+    if memory:
+        result['memory'] = collections.OrderedDict([
+            ('messages', MemoryUse(lambda: MessagesBin(data))),
+            ('columnar', MemoryUse(lambda: ColumnarMessagesBin(data))),
+            ])
+    return result
+
+
+def Environment():
+    """Returns a description of the machine the benchmarks ran on"""
+    return collections.OrderedDict([
+        ('version', version),
+        ('python', platform.python_version()),
+        ('implementation', platform.python_implementation()),
+        ('platform', platform.platform()),
+        ('machine', platform.machine()),
+        ('cpus', os.cpu_count()),
+        ('time', time.strftime('%Y-%m-%dT%H:%M:%S%z')),
+        ])
+
+
+def Compare(old, new, threshold):
+    """Prints how new's timings changed since old's, and returns the
+    list of (case, benchmark, ratio) that got slower than threshold"""
+    regressions = []
+    for case, result in new['cases'].items():
+        if case not in old['cases']: continue
+        oldTimings = old['cases'][case]['timings']
+        for name, timing in result['timings'].items():
+            if name not in oldTimings: continue
+            before, after = oldTimings[name]['min'], timing['min']
+            ratio = after / before if before else 1
+            flag = ''
+            if ratio > 1 + threshold:
+                regressions.append((case, name, ratio))
+                flag = '  <-- slower'
+            print('%-22s %-20s %10.4f s -> %10.4f s  %6.2fx%s' % (case, name, before, after, ratio, flag))
+    return regressions
+
+
+def main(argv=None):
+    """Runs the benchmarks. Returns False if --compare found regressions"""
+    parser = argparse.ArgumentParser(prog='benchmarks.suite', description='Newer Messages Editor benchmark suite')
+    sizes = parser.add_mutually_exclusive_group()
+    sizes.add_argument('--preset', choices=sorted(Presets), default='default',
+        help='message counts to run (default: %(default)s; "full" goes up to 1M messages)')
+    sizes.add_argument('--counts', type=int, nargs='+', metavar='count', help='message counts to run')
+    parser.add_argument('--no-variants', action='store_true', help='skip the string length and ID distribution cases')
+    parser.add_argument('--no-gui', action='store_true', help='skip the message viewer benchmarks')
+    parser.add_argument('--no-memory', action='store_true', help='skip measuring memory use, which is slow for big files')
+    parser.add_argument('-o', '--output', help='file to write the results to, as JSON')
+    parser.add_argument('--compare', metavar='old.json', help='results of an earlier run to compare with')
+    parser.add_argument('--threshold', type=float, default=DefaultThreshold,
+        help='slowdown that counts as a regression (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    gui = None
+    if not args.no_gui:
+        try: gui = GuiBenchmarks()
+        except ImportError as e: sys.stderr.write('Skipping the GUI benchmarks: %s\n' % e)
+
+    results = collections.OrderedDict()
+    results['environment'] = Environment()
+    results['cases'] = collections.OrderedDict()
+    for name, kwargs in Cases(args.counts or Presets[args.preset], not args.no_variants):
+        result = results['cases'][name] = RunCase(kwargs, gui, not args.no_memory)
+        print('%-22s %s' % (name, '  '.join('%s %.4f' % (k, v['min']) for k, v in result['timings'].items())))
+        if 'memory' in result:
+            print('%-22s memory: %s' % ('', '  '.join('%s %.1f MB' % (k, v / 1e6) for k, v in result['memory'].items())))
+        sys.stdout.flush()
+
+    if args.output is not None:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=1)
+            file.write('\n')
+
+    if args.compare is None: return True
+    with open(args.compare, 'r', encoding='utf-8') as file: old = json.load(file)
+    print()
+    regressions = Compare(old, results, args.threshold)
+    if regressions: print('%d benchmarks got more than %d%% slower' % (len(regressions), args.threshold * 100))
+    return not regressions
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,97 @@
+#!/usr/bin/python
+# -*- coding: latin-1 -*-
+
+# Newer Messages Editor - Edits NewerSMBW's messages.bin
+# Version 1.3
+# Copyright (C) 2013-2014 RoadrunnerWMC
+
+# This file is part of Newer Messages Editor.
+
+# Newer Messages Editor is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Newer Messages Editor is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Newer Messages Editor.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# benchmarks/synthetic.py
+# Deterministic generator of synthetic messages.bin files
+
+
+################################################################
+################################################################
+
+# Imports
+import random, struct
+
+
+# Characters used to build message strings
+AsciiChars = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789 .,!?\''
+WideChars = 'éüñßあマリオ★→'
+AstralChars = '\U0001F344\U0001F31F' # stored as surrogate pairs
+
+# How message IDs can be handed out
+IdDistributions = ('sequential', 'shuffled', 'sparse', 'duplicates')
+
+
+def RandomString(rng, length, wideRatio, astralRatio=0):
+    """Returns a random string of the given length"""
+    chars = []
+    for i in range(length):
+        if astralRatio and rng.random() < astralRatio: chars.append(rng.choice(AstralChars))
+        elif wideRatio and rng.random() < wideRatio: chars.append(rng.choice(WideChars))
+        else: chars.append(rng.choice(AsciiChars))
+    return ''.join(chars)
+
+
+def GenerateIds(rng, count, distribution):
+    """Returns count message IDs, handed out the given way"""
+    if distribution == 'sequential': return list(range(count))
+    if distribution == 'shuffled':
+        ids = list(range(count))
+        rng.shuffle(ids)
+        return ids
+    if distribution == 'sparse': return sorted(rng.sample(range(count * 16), count))
+    if distribution == 'duplicates': return [rng.randrange(max(count // 2, 1)) for i in range(count)]
+    raise ValueError('Unknown ID distribution: %s' % distribution)
+
+
+def GenerateStrings(count, titleLen=16, textLen=96, wideRatio=0.05, astralRatio=0, ids='sequential', seed=0):
+    """Yields (id, title, text) tuples for a synthetic file"""
+    rng = random.Random(seed)
+
+    # Generating every string from scratch would dominate the run
+    # time for big counts, so draw from a pool instead
+    poolSize = min(count, 4096) or 1
+    titles = [RandomString(rng, rng.randint(0, titleLen * 2), wideRatio, astralRatio) for i in range(poolSize)]
+    texts = [RandomString(rng, rng.randint(0, textLen * 2), wideRatio, astralRatio) for i in range(poolSize)]
+
+    for id in GenerateIds(rng, count, ids):
+        yield id, titles[rng.randrange(poolSize)], texts[rng.randrange(poolSize)]
+
+
+def GenerateFile(count, **kwargs):
+    """Returns the data of a synthetic messages.bin with count messages"""
+    table = bytearray(4 + 12 * count)
+    struct.pack_into('>I', table, 0, count)
+
+    strings = []
+    offset = len(table)
+    pos = 4
+    for id, title, text in GenerateStrings(count, **kwargs):
+        title = title.encode('utf-16-be') + b'\0\0'
+        text = text.encode('utf-16-be') + b'\0\0'
+        struct.pack_into('>III', table, pos, id + 0x100, offset, offset + len(title))
+        strings.append(title)
+        strings.append(text)
+        offset += len(title) + len(text)
+        pos += 12
+
+    return bytes(table) + b''.join(strings)
@@ -30,157 +30,27 @@
 ################################################################
 
 
-version = '1.3'
-
 from PyQt5 import QtCore, QtGui, QtWidgets
-import sys
-
-
+import bisect, collections, os, sys, time
 
+from nme_core import version, Diagnostic, Message, MessagesBin, LazyMessagesBin, OpenFile, OpenFileInChunks, ParseData, ReplaceFile, WriteTemporaryFile, SyncDirectory
+import nme_layout, nme_memory, nme_merge, nme_perf, nme_reload, nme_search, nme_textio, nme_undo
 
 
-################################################################
-################################################################
-################################################################
-#################### File data Classes #########################
-
+# Background of messages whose IDs are used more than once
+DuplicateBrush = QtGui.QBrush(QtGui.QColor(255, 192, 192))
 
-class Message():
-    """Class that represents a message (ID, title, text)"""
-    def __init__(self, id=0, title='New Message', text=''):
-        """Inits the Message"""
-        self.id = id
-        self.title = title
-        self.text = text
+# Background of messages that don't fit in the message box
+OverflowBrush = QtGui.QBrush(QtGui.QColor(255, 230, 170))
 
-    def toPyObject(self):
-        """Py2 / Py3 compatibility"""
-        return self
+# Background of messages with unsaved edits that were changed on disk too
+ConflictBrush = QtGui.QBrush(QtGui.QColor(200, 210, 255))
 
+# File dialog filter for text import/export
+TextFilter = 'JSON Lines Files (*.jsonl);;CSV Files (*.csv);;All Files (*)'
 
-class MessagesBin():
-    """Class that represents Newer's Messages.bin"""
-    def __init__(self, data=None):
-        """Inits the MessagesBin"""
-        self.Messages = []
 
-        try: self.InitFromData(data)
-        except: self.Messages = [] # erase corrupt data
 
-    def InitFromData(self, data):
-        """Inits the MessagesBin from file data"""
-        # data[0:4] is the number of messages
-        NumberOfMessages = (data[0] << 24) | (data[1] << 16) | (data[2] << 8) | data[3]
-        
-        # Get each message
-        messages = []
-        for i in range(NumberOfMessages):
-            id = (data[(12*i)+4] << 24) | (data[(12*i)+5] << 16) | (data[(12*i)+6] << 8) | data[(12*i)+7]
-            tOffset = (data[(12*i)+8] << 24) | (data[(12*i)+9] << 16) | (data[(12*i)+10] << 8) | data[(12*i)+11]
-            bOffset = (data[(12*i)+12] << 24) | (data[(12*i)+13] << 16) | (data[(12*i)+14] << 8) | data[(12*i)+15]
-            id -= 0x100
-
-            # Get the title
-            title = ''
-            j = tOffset
-            while True: # keep going until 0x0000 is found
-                try: char = (data[j] << 8) | data[j+1] # 2 bytes per char
-                except: break
-
-                char = chr(char)
-                
-                if char == chr(0x00): break
-                
-                title += char
-                j += 2
-
-            # Get the text
-            text = ''
-            j = bOffset
-            while True: # keep going until 0x0000 is found
-                try: char = (data[j] << 8) | data[j+1] # 2 bytes per char
-                except: break
-                char = chr(char)
-                if char == chr(0x00): break
-                
-                text += char
-                j += 2
-
-            messages.append(Message(id, title, text))
-
-        # Assign it to self.Messages
-        self.Messages = messages
-
-    def save(self):
-        """Returns data that can be saved to a file"""
-        data = []
-
-        # Add the number of messages
-        M = len(self.Messages)
-        data.append((M >> 24) & 0xFF)
-        data.append((M >> 16) & 0xFF)
-        data.append((M >>  8) & 0xFF)
-        data.append((M >>  0) & 0xFF)
-
-        # Find the expected text offset
-        tOffset = 4 + 12*len(self.Messages)
-
-        # Add text and offsets
-        textData = []
-        i = int(tOffset)
-        for msg in self.Messages:
-            # Add the ID
-            id = 0x0100 + msg.id
-            data.append((id >> 24) & 0xFF)
-            data.append((id >> 16) & 0xFF)
-            data.append((id >>  8) & 0xFF)
-            data.append((id >>  0) & 0xFF)
-
-            # Add the title offset
-            data.append((i >> 24) & 0xFF)
-            data.append((i >> 16) & 0xFF)
-            data.append((i >>  8) & 0xFF)
-            data.append((i >>  0) & 0xFF)
-
-            # Add the title
-            for j in msg.title: # each character
-                char = ord(j)
-                textData.append((char >> 8) & 0xFF)
-                textData.append((char >> 0) & 0xFF)
-                i += 2
-
-            # Add two empty bytes
-            textData.append(0)
-            textData.append(0)
-            i += 2
-
-            # Add the text offset
-            data.append((i >> 24) & 0xFF)
-            data.append((i >> 16) & 0xFF)
-            data.append((i >>  8) & 0xFF)
-            data.append((i >>  0) & 0xFF)
-
-            # Add the text
-            for j in msg.text: # each character
-                char = ord(j)
-                textData.append((char >> 8) & 0xFF)
-                textData.append((char >> 0) & 0xFF)
-                i += 2
-
-            # Add two empty bytes
-            textData.append(0)
-            textData.append(0)
-            i += 2
-
-        # Add the text data to the end of data
-        for i in textData: data.append(i)
-
-        # Return it
-        if sys.version[0] == '2':
-            new = ''
-            for i in data: new += chr(i) # not chr
-            return new
-        else: return bytes(data)
 
 
 ################################################################
@@ -189,29 +59,365 @@ class MessagesBin():
 ######################### UI Classes ###########################
 
 
+class MessageListModel(QtCore.QAbstractListModel):
+    """List model that shows the messages in a MessagesBin. Labels and
+    tooltips are only worked out for rows that are actually shown.
+
+    The model can be filtered down to a set of messages, so its rows
+    ("view rows") aren't always the same as rows in the file. Methods
+    that take or return plain rows use file rows"""
+    MimeType = 'application/x-nme-message-rows'
+
+    def __init__(self):
+        """Initialises the model"""
+        QtCore.QAbstractListModel.__init__(self)
+        self.file = None
+        self.search = nme_search.SearchIndex()
+        self.memory = nme_memory.TranslationMemory() # for suggesting similar messages
+        self.metrics = nme_layout.BuiltinMetrics() # glyph widths of the game font
+        self.overflows = nme_layout.OverflowIndex(self.metrics)
+        self.conflicts = set() # messages edited here that were changed on disk too
+        self.matches = None # set of messages to show, or None to show all
+        self.rows = None # view row -> file row, while filtered
+        self.viewRows = None # file row -> view row, while filtered
+
+    def setFile(self, file):
+        """Changes the file to show"""
+        self.beginResetModel()
+        self.file = file
+        self.search = nme_search.SearchIndex()
+        self.memory = nme_memory.TranslationMemory()
+        self.overflows = nme_layout.OverflowIndex(self.metrics)
+        self.conflicts = set()
+        self.matches = self.rows = self.viewRows = None
+        self.endResetModel()
+
+    def SetFilter(self, matches):
+        """Only shows the messages in the set matches, or all of them if it's None"""
+        self.beginResetModel()
+        self.matches = matches
+        self.UpdateRows()
+        self.endResetModel()
+
+    def UpdateRows(self):
+        """Works out which file rows are shown, after the filter or the file changed"""
+        if self.matches is None:
+            self.rows = self.viewRows = None
+            return
+
+        matches = self.matches
+        self.rows = [row for row, msg in enumerate(self.file.Messages) if msg in matches]
+        self.viewRows = dict((row, viewRow) for viewRow, row in enumerate(self.rows))
+
+    def IsFiltered(self):
+        """Returns True if only some of the messages are shown"""
+        return self.rows is not None
+
+    def FileRow(self, viewRow):
+        """Converts a view row to a file row"""
+        if self.rows is None: return viewRow
+        return self.rows[viewRow]
+
+    def ViewIndex(self, row):
+        """Returns the model index of a file row, which is invalid if
+        the row is filtered out"""
+        if self.viewRows is not None:
+            row = self.viewRows.get(row)
+            if row is None: return QtCore.QModelIndex()
+        return self.index(row)
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        """Returns the number of messages"""
+        if parent.isValid() or self.file is None: return 0
+        if self.rows is not None: return len(self.rows)
+        return len(self.file.Messages)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        """Returns the label, tooltip or Message for a row"""
+        if not index.isValid(): return None
+        msg = self.file.Messages[self.FileRow(index.row())]
+
+        if role == QtCore.Qt.DisplayRole:
+            return str(msg.id) + ': ' + str(msg.title)
+        elif role == QtCore.Qt.ToolTipRole:
+            text = '<b> Message ' + str(msg.id) + ':</b><br>' + str(msg.text)
+            overflow = self.overflows.Flags(msg)
+            if overflow: text = '<b>(Too long: ' + ', '.join(nme_layout.DescribeOverflow(overflow)) + '!)</b><br>' + text
+            if msg in self.conflicts: text = '<b>(Also changed on disk!)</b><br>' + text
+            if self.file.ids.IsDuplicate(msg.id): text = '<b>(Duplicate ID!)</b><br>' + text
+            return text
+        elif role == QtCore.Qt.BackgroundRole:
+            if self.file.ids.IsDuplicate(msg.id): return DuplicateBrush
+            if msg in self.conflicts: return ConflictBrush
+            if self.overflows.Flags(msg): return OverflowBrush
+        elif role == QtCore.Qt.UserRole:
+            return msg
+        return None
+
+    def flags(self, index):
+        """Rows can be selected and dragged; drops go between rows"""
+        if not index.isValid(): return QtCore.Qt.ItemIsDropEnabled
+        return QtCore.Qt.ItemIsSelectable | QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsDragEnabled
+
+    def supportedDropActions(self):
+        """Messages can only be moved around"""
+        return QtCore.Qt.MoveAction
+
+    def mimeTypes(self):
+        """Returns the MIME type used for dragging rows"""
+        return [self.MimeType]
+
+    def mimeData(self, indexes):
+        """Encodes the dragged row number"""
+        data = QtCore.QMimeData()
+        data.setData(self.MimeType, QtCore.QByteArray(str(indexes[0].row()).encode('ascii')))
+        return data
+
+    def dropMimeData(self, data, action, row, column, parent):
+        """Moves a dragged row, if the view didn't already do it by
+        calling moveRows. Returns False so the view won't remove anything"""
+        if action != QtCore.Qt.MoveAction or not data.hasFormat(self.MimeType): return False
+        if row == -1: row = parent.row() if parent.isValid() else self.rowCount()
+
+        source = int(bytes(data.data(self.MimeType)).decode('ascii'))
+        self.moveRows(QtCore.QModelIndex(), source, 1, QtCore.QModelIndex(), row)
+        return False
+
+    def moveRows(self, sourceParent, sourceRow, count, destinationParent, destinationChild):
+        """Moves messages to before the destinationChild'th message"""
+        if sourceParent.isValid() or destinationParent.isValid(): return False
+        if self.IsFiltered(): return False # the rows in between aren't shown
+        if destinationChild in range(sourceRow, sourceRow + count + 1): return False # no-op
+        if not self.beginMoveRows(sourceParent, sourceRow, sourceRow + count - 1, destinationParent, destinationChild):
+            return False
+
+        messages = self.file.Messages
+        moved = messages[sourceRow:sourceRow + count]
+        del messages[sourceRow:sourceRow + count]
+        if destinationChild > sourceRow: destinationChild -= count
+        messages[destinationChild:destinationChild] = moved
+
+        self.endMoveRows()
+        return True
+
+    def AddMessage(self, msg):
+        """Adds a message to the end of the file"""
+        self.InsertMessage(len(self.file.Messages), msg)
+
+    def AppendMessages(self, messages, matches=()):
+        """Adds messages to the end of the file. While the model is
+        filtered, only the ones in the set matches are shown"""
+        row = len(self.file.Messages)
+        if self.IsFiltered():
+            self.matches.update(matches)
+            newRows = [row + i for i, msg in enumerate(messages) if msg in matches]
+            viewRow = len(self.rows)
+            if newRows: self.beginInsertRows(QtCore.QModelIndex(), viewRow, viewRow + len(newRows) - 1)
+            self.file.AppendMessages(messages)
+            self.rows.extend(newRows)
+            self.viewRows.update((row, viewRow + i) for i, row in enumerate(newRows))
+            if newRows: self.endInsertRows()
+        elif messages:
+            self.beginInsertRows(QtCore.QModelIndex(), row, row + len(messages) - 1)
+            self.file.AppendMessages(messages)
+            self.endInsertRows()
+
+        # Messages already shown may have gotten duplicate IDs
+        self.AllChanged()
+
+    def InsertMessage(self, row, msg):
+        """Inserts a message into the file"""
+        if self.IsFiltered():
+            # New messages are always shown, matching or not
+            self.matches.add(msg)
+            viewRow = bisect.bisect_left(self.rows, row)
+            self.beginInsertRows(QtCore.QModelIndex(), viewRow, viewRow)
+            self.file.InsertMessage(row, msg)
+            self.UpdateRows()
+            self.endInsertRows()
+        else:
+            self.beginInsertRows(QtCore.QModelIndex(), row, row)
+            self.file.InsertMessage(row, msg)
+            self.endInsertRows()
+
+        self.search.Add(msg)
+        self.memory.Add(msg)
+        self.overflows.Update(msg)
+        self.DuplicatesChanged(msg.id)
+
+    def RemoveRow(self, row):
+        """Removes a message from the file"""
+        if self.IsFiltered():
+            viewRow = self.viewRows.get(row)
+            if viewRow is not None: self.beginRemoveRows(QtCore.QModelIndex(), viewRow, viewRow)
+            msg = self.file.RemoveMessage(row)
+            self.matches.discard(msg)
+            self.UpdateRows()
+            if viewRow is not None: self.endRemoveRows()
+        else:
+            self.beginRemoveRows(QtCore.QModelIndex(), row, row)
+            msg = self.file.RemoveMessage(row)
+            self.endRemoveRows()
+
+        self.search.Remove(msg)
+        self.memory.Remove(msg)
+        self.overflows.Remove(msg)
+        self.conflicts.discard(msg)
+        self.DuplicatesChanged(msg.id)
+
+    def MoveMessage(self, row, newRow):
+        """Moves the message in row so that it ends up in newRow"""
+        if self.IsFiltered():
+            # Take it out and put it back in, since the rows in between
+            # may not be shown
+            messages = self.file.Messages
+            viewRow = self.viewRows.get(row)
+            if viewRow is not None: self.beginRemoveRows(QtCore.QModelIndex(), viewRow, viewRow)
+            msg = messages.pop(row)
+            self.UpdateRows()
+            if viewRow is not None:
+                self.endRemoveRows()
+                viewRow = bisect.bisect_left(self.rows, newRow)
+                self.beginInsertRows(QtCore.QModelIndex(), viewRow, viewRow)
+            messages.insert(newRow, msg)
+            self.UpdateRows()
+            if viewRow is not None: self.endInsertRows()
+        else:
+            self.moveRows(QtCore.QModelIndex(), row, 1, QtCore.QModelIndex(), newRow + 1 if newRow > row else newRow)
+
+    def ReplaceMessages(self, messages, changed=()):
+        """Replaces the list of messages in one go, keeping the indexes
+        of those that are still there. changed are kept messages whose
+        title or text changed. Messages that weren't there before are
+        always shown, like inserted ones"""
+        old = dict((id(msg), msg) for msg in self.file.Messages)
+        kept = set(id(msg) for msg in messages)
+        self.beginResetModel()
+        self.file.Messages = messages
+        for msg in old.values():
+            if id(msg) in kept: continue
+            self.search.Remove(msg)
+            self.memory.Remove(msg)
+            self.overflows.Remove(msg)
+            self.conflicts.discard(msg)
+            if self.matches is not None: self.matches.discard(msg)
+        for msg in messages:
+            if id(msg) in old: continue
+            self.search.Add(msg)
+            self.memory.Add(msg)
+            self.overflows.Update(msg)
+            if self.matches is not None: self.matches.add(msg)
+        for msg in changed:
+            self.search.Update(msg)
+            self.memory.Update(msg)
+            self.overflows.Update(msg)
+        self.UpdateRows()
+        self.endResetModel()
+
+    def RowOf(self, msg, hint=None):
+        """Returns the row of msg. hint is where it's probably found"""
+        messages = self.file.Messages
+        if hint is not None and hint < len(messages) and messages[hint] == msg: return hint
+        for row, other in enumerate(messages):
+            if other == msg: return row
+
+    def SetId(self, msg, id):
+        """Changes the ID of msg"""
+        oldId = msg.id
+        self.file.SetId(msg, id)
+        self.DuplicatesChanged(oldId, id)
+
+    def IdChanged(self, msg, oldId):
+        """Updates the ID index after msg.id was changed from oldId"""
+        self.file.IdChanged(msg, oldId)
+        self.DuplicatesChanged(oldId, msg.id)
+
+    def DuplicatesChanged(self, *ids):
+        """Redraws the rows if messages with any of these IDs may have
+        started or stopped being duplicates"""
+        # Other rows with these IDs could be anywhere, but only the
+        # visible ones actually get redrawn, so this is cheap
+        if any(self.file.FindId(id) for id in ids): self.AllChanged()
+
+    def MessageChanged(self, row):
+        """Tells views that the message in row has changed"""
+        msg = self.file.Messages[row]
+        self.search.Update(msg)
+        self.memory.Update(msg)
+        self.overflows.Update(msg)
+        index = self.ViewIndex(row)
+        if index.isValid(): self.dataChanged.emit(index, index)
+
+    def SetConflicts(self, messages):
+        """Changes the messages flagged as conflicting with changes made on disk"""
+        self.conflicts = set(messages)
+        self.AllChanged()
+
+    def SetMetrics(self, metrics):
+        """Changes the glyph widths messages are checked with. They all
+        need to be checked again, with AddMessages on self.overflows"""
+        self.metrics = metrics
+        self.overflows = nme_layout.OverflowIndex(metrics)
+        self.AllChanged()
+
+    def AllChanged(self):
+        """Tells views that every message may have changed"""
+        if self.rowCount() == 0: return
+        self.dataChanged.emit(self.index(0), self.index(self.rowCount() - 1))
+
+
 class MessageViewer(QtWidgets.QWidget):
     """Widget that allows you to view the data in Message.bin"""
+    historyChanged = QtCore.pyqtSignal()
+    statusMessage = QtCore.pyqtSignal(str)
+    messageSelected = QtCore.pyqtSignal(object) # key (ID, n) of the message picked by the user
+    IndexBatchSize = 200 # messages added to the search index at once
+    IndexTimeSlice = 0.02 # seconds spent indexing per event loop pass
+    ScanBatchSize = 500 # messages checked for overflows at once
+    SuggestionCount = 5 # similar messages suggested
+    SuggestionDelay = 200 # ms to wait for typing to stop before looking for them
+    MaxReloadRows = 1000 # rows added, removed or moved one by one when reloading
 
     # Drag-and-Drop Picker
-    class DNDPicker(QtWidgets.QListWidget):
-        """A list widget which calls a function when an item's been moved"""
+    class DNDPicker(QtWidgets.QListView):
+        """A list view which calls a function when an item's been moved"""
         def __init__(self, handler):
-            QtWidgets.QListWidget.__init__(self)
+            QtWidgets.QListView.__init__(self)
             self.handler = handler
-            self.setDragDropMode(QtWidgets.QListWidget.InternalMove)
+            self.setDragDropMode(QtWidgets.QListView.InternalMove)
+            self.setDefaultDropAction(QtCore.Qt.MoveAction)
+            self.setUniformItemSizes(True) # don't measure every row
+            self.setLayoutMode(QtWidgets.QListView.Batched) # show the first rows right away
+            self.setBatchSize(2000)
         def dropEvent(self, event):
-            QtWidgets.QListWidget.dropEvent(self, event)
+            QtWidgets.QListView.dropEvent(self, event)
             self.handler()
+        def dataChanged(self, topLeft, bottomRight, roles=[]):
+            # QListView lays out every row again when any of them
+            # changes, but all rows have the same size here, so
+            # repainting the changed ones is enough
+            QtWidgets.QAbstractItemView.dataChanged(self, topLeft, bottomRight, roles)
 
     # Init
     def __init__(self):
         """Initialises the widget"""
         QtWidgets.QWidget.__init__(self)
         self.file = None
+        self.loading = False # True while messages are still being added
+        self.history = nme_undo.UndoHistory()
+        self.replaying = False # True while undoing, redoing or reloading
+        self.changes = 0 # changes made to the file, to tell if there are unsaved ones
+        self.peers = [] # (name, MessageViewer) of every open file, to suggest messages from
 
         # Create the message picker widgets
         PickerBox = QtWidgets.QGroupBox('Messages')
+        self.searchBox = QtWidgets.QLineEdit()
+        self.searchBox.setPlaceholderText('Search')
+        self.searchBox.setClearButtonEnabled(True)
+        self.searchBox.setToolTip('<b>Search:</b><br>Only shows messages whose ID, title or text contain this')
+        self.model = MessageListModel()
         self.picker = self.DNDPicker(self.HandleDragDrop)
+        self.picker.setModel(self.model)
         self.ABtn = QtWidgets.QPushButton('Add')
         self.RBtn = QtWidgets.QPushButton('Remove')
 
@@ -220,29 +426,59 @@ class MessageViewer(QtWidgets.QWidget):
         self.RBtn.setToolTip('<b>Remove:</b><br>Removes the currently selected file')
 
         # Connect them to handlers
-        self.picker.currentItemChanged.connect(self.HandleMsgSel)
+        self.picker.selectionModel().currentChanged.connect(self.HandleMsgSel)
+        self.searchBox.textChanged.connect(self.HandleSearch)
+        self.model.rowsMoved.connect(self.HandleRowsMoved)
         self.ABtn.clicked.connect(self.HandleA)
         self.RBtn.clicked.connect(self.HandleR)
 
         # Disable them for now
         self.picker.setEnabled(False)
+        self.searchBox.setEnabled(False)
         self.ABtn.setEnabled(False)
         self.RBtn.setEnabled(False)
 
         # Set up the QGroupBox layout
         L = QtWidgets.QGridLayout()
-        L.addWidget(self.picker, 0, 0, 1, 2)
-        L.addWidget(self.ABtn, 1, 0)
-        L.addWidget(self.RBtn, 1, 1)
+        L.addWidget(self.searchBox, 0, 0, 1, 2)
+        L.addWidget(self.picker, 1, 0, 1, 2)
+        L.addWidget(self.ABtn, 2, 0)
+        L.addWidget(self.RBtn, 2, 1)
         PickerBox.setLayout(L)
 
+        # The search index is built a bit at a time while the event
+        # loop is idle
+        self.indexer = None # messages waiting to be indexed
+        self.indexTimer = QtCore.QTimer(self)
+        self.indexTimer.setInterval(0)
+        self.indexTimer.timeout.connect(self.HandleIndexTimer)
+
+        # So is the list of messages that don't fit in the message box
+        self.scanner = None # messages waiting to be checked
+        self.scanStart = 0.0 # when checking started
+        self.scanTimer = QtCore.QTimer(self)
+        self.scanTimer.setInterval(0)
+        self.scanTimer.timeout.connect(self.HandleScanTimer)
+
         # Create the message editor
         self.MsgBox = QtWidgets.QGroupBox('Message') # assigned to self.MsgBox because the title changes later
         self.edit = MessageEditor()
         self.edit.dataChanged.connect(self.HandleMsgDatChange)
+        self.edit.edited.connect(self.HandleEdited)
+        self.preview = MessagePreview(self.model.metrics)
+        self.suggestions = SuggestionList()
+        self.suggestions.picked.connect(self.UseSuggestion)
         L = QtWidgets.QVBoxLayout()
         L.addWidget(self.edit)
+        L.addWidget(self.preview)
+        L.addWidget(self.suggestions)
         self.MsgBox.setLayout(L)
+
+        # Similar messages are looked for once typing stops
+        self.suggestionTimer = QtCore.QTimer(self)
+        self.suggestionTimer.setSingleShot(True)
+        self.suggestionTimer.setInterval(self.SuggestionDelay)
+        self.suggestionTimer.timeout.connect(self.UpdateSuggestions)
         
         # Make the main layout
         L = QtWidgets.QHBoxLayout()
@@ -251,46 +487,83 @@ class MessageViewer(QtWidgets.QWidget):
         self.setLayout(L)
 
 
-    def setFile(self, file):
-        """Changes the file to view"""
+    @nme_perf.Timed('MessageViewer.setFile')
+    def setFile(self, file, loading=False):
+        """Changes the file to view (None for none). If loading is True,
+        its messages are still being added with AppendMessages, and
+        messages can't be added, removed or moved until FinishLoading"""
         self.file = file
-        self.picker.clear()
+        self.loading = loading
         self.edit.clear()
+        self.preview.setMessage(None)
         self.MsgBox.setTitle('Message')
 
         # Enable widgets
-        self.picker.setEnabled(True)
-        self.ABtn.setEnabled(True)
-        self.RBtn.setEnabled(True)
-
-        # Add messages
-        for msg in file.Messages:
-            item = QtWidgets.QListWidgetItem() # self.UpdateNames will add the name
-            item.setData(QtCore.Qt.UserRole, msg)
-            self.picker.addItem(item)
+        self.picker.setEnabled(file is not None)
+        self.searchBox.setEnabled(file is not None)
+        self.ABtn.setEnabled(file is not None and not loading)
+
+        # The model creates rows as they're needed
+        self.searchBox.blockSignals(True)
+        self.searchBox.clear()
+        self.searchBox.blockSignals(False)
+        self.picker.setDragEnabled(not loading)
+        self.model.setFile(file)
+
+        # Start indexing it for searches
+        self.indexer = collections.deque(file.Messages) if file is not None else None
+        if file is not None: self.indexTimer.start()
+        else: self.indexTimer.stop()
+        self.StartScan()
+
+        self.history.Clear()
+        self.changes = 0
+        self.historyChanged.emit()
+        self.UpdateRBtn()
 
-        self.UpdateNames()
+    @nme_perf.Timed('MessageViewer.AppendMessages')
+    def AppendMessages(self, messages):
+        """Adds messages being loaded to the end of the file"""
+        text = self.searchBox.text()
+        self.model.AppendMessages(messages, nme_search.Scan(messages, text) if text else ())
+
+        # Index them, too
+        self.indexer.extend(messages)
+        self.indexTimer.start()
+        self.scanner.extend(messages)
+        self.scanTimer.start()
+
+    def FinishLoading(self):
+        """Allows changes to the file, once all of it is loaded"""
+        self.loading = False
+        self.ABtn.setEnabled(True)
+        self.picker.setDragEnabled(not self.model.IsFiltered())
         self.UpdateRBtn()
+        if not self.indexTimer.isActive(): self.HandleIndexTimer() # finish indexing
+        if not self.scanTimer.isActive(): self.HandleScanTimer()
 
     def saveFile(self):
         """Returns the file in saved form"""
         return self.file.save() # self.file does this for us
     
 
+    def CurrentRow(self):
+        """Returns the row of the current message in the file, or None"""
+        index = self.picker.currentIndex()
+        if not index.isValid(): return None
+        return self.model.FileRow(index.row())
+
+    @nme_perf.Timed('MessageViewer.UpdateNames')
     def UpdateNames(self):
         """Updates item names in the msg picker"""
-        for item in self.picker.findItems('', QtCore.Qt.MatchContains):
-            msg = item.data(QtCore.Qt.UserRole)
-            text = str(msg.id) + ': ' + str(msg.title)
-            item.setText(text)
-            text = '<b> Message ' + str(msg.id) + ':</b><br>' + str(msg.text)
-            item.setToolTip(text)
+        self.model.AllChanged()
+        self.UpdateTitle()
 
-        # Rename the group box
-        currentItem = self.picker.currentItem()
-        
-        if currentItem == None: return
-        msg = currentItem.data(QtCore.Qt.UserRole)
+    def UpdateTitle(self):
+        """Renames the group box after the current message"""
+        row = self.CurrentRow()
+        if row == None: return
+        msg = self.file.Messages[row]
 
         hexcode = '(0x' + hex(msg.id)[2:].upper() + ')'
         text = 'Message ' + str(msg.id) + ' ' + hexcode
@@ -299,90 +572,355 @@ class MessageViewer(QtWidgets.QWidget):
 
     def UpdateRBtn(self):
         """Enables/disables the Remove Last button"""
-        self.RBtn.setEnabled(len(self.file.Messages) > 0)
+        self.RBtn.setEnabled(self.file is not None and not self.loading and self.CurrentRow() is not None)
 
+    @nme_perf.Timed('MessageViewer.HandleMsgDatChange', slot=True)
     def HandleMsgDatChange(self):
         """Handles changes to the current message data"""
-        self.UpdateNames()
+        row = self.CurrentRow()
+        if row == None: return
+
+        # Only the edited row needs to be redrawn, and only the edited
+        # message laid out again
+        self.model.MessageChanged(row)
+        self.preview.Reflow()
+        self.UpdateTitle()
+        self.suggestionTimer.start()
 
+    @nme_perf.Timed('MessageViewer.HandleMsgSel', slot=True)
     def HandleMsgSel(self):
         """Handles the user picking a message"""
         self.edit.clear()
+        self.preview.setMessage(None)
+        self.history.StopMerging()
+        self.suggestionTimer.start()
 
-        # Get the current item (it's None if nothing's selected)
-        currentItem = self.picker.currentItem()
+        # Get the current row (it's None if nothing's selected)
+        row = self.CurrentRow()
 
         # Enable/disable the Remove button
-        self.RBtn.setEnabled(currentItem != None)
+        self.UpdateRBtn()
 
         # Get the message
-        if currentItem == None: return
-        msg = currentItem.data(QtCore.Qt.UserRole)
+        if row == None: return
+        msg = self.file.Messages[row]
 
         # Set up the message editor
         self.edit.setMessage(msg)
+        self.preview.setMessage(msg)
 
         # Rename the group box
-        self.UpdateNames()
+        self.UpdateTitle()
+        self.messageSelected.emit(self.KeyOf(msg))
+
+    def KeyOf(self, msg):
+        """Returns the key of msg: its ID, and how many messages with
+        that ID come before it"""
+        return (msg.id, next((n for n, other in enumerate(self.file.FindIdInOrder(msg.id)) if other == msg), 0))
+
+    def SelectKey(self, key):
+        """Selects the message with key, or the last one with its ID if
+        there aren't that many. Returns False if there's no such ID"""
+        if self.file is None: return False
+        id, n = key
+        messages = self.file.FindIdInOrder(id)
+        if not messages: return False
+        msg = messages[min(n, len(messages) - 1)]
+
+        row = self.model.RowOf(msg)
+        index = self.model.ViewIndex(row)
+        if not index.isValid():
+            # It's hidden by the search, so stop searching
+            self.searchBox.clear()
+            index = self.model.ViewIndex(row)
+        self.picker.setCurrentIndex(index)
+        self.picker.scrollTo(index)
+        return True
+
+    def SetPeers(self, peers):
+        """Changes the files similar messages are suggested from: (name,
+        MessageViewer) pairs, which should include this one"""
+        self.peers = peers
+        self.suggestionTimer.start()
+
+    @nme_perf.Timed('MessageViewer.UpdateSuggestions', slot=True)
+    def UpdateSuggestions(self):
+        """Shows the messages most like the current one, in this file and
+        the other ones, and the messages with the same ID in the rest"""
+        msg = self.edit.msg
+        if msg is None:
+            self.suggestions.setSuggestions([])
+            return
+
+        viewers = [(name, viewer) for name, viewer in self.peers or [('', self)] if viewer.file is not None]
+        found = []
+        for name, viewer in viewers:
+            for score, other in viewer.model.memory.Lookup(msg.text, self.SuggestionCount, msg):
+                found.append((score, name, viewer, other))
+        found.sort(key=lambda f: f[0], reverse=True)
+
+        suggestions = []
+        for score, name, viewer, other in found[:self.SuggestionCount]:
+            id, n = viewer.KeyOf(other)
+            translations = []
+            for otherName, otherViewer in viewers:
+                same = otherViewer.file.FindIdInOrder(id) if otherViewer is not viewer else None
+                if same: translations.append((otherName, same[min(n, len(same) - 1)]))
+            suggestions.append((score, name, other, translations))
+        self.suggestions.setSuggestions(suggestions)
+
+    def UseSuggestion(self, text):
+        """Replaces the text of the current message with text"""
+        if self.edit.msg is None or self.loading: return
+        self.history.StopMerging() # undone on its own
+        self.edit.text.setPlainText(text)
+        self.history.StopMerging()
 
     def HandleDragDrop(self):
         """Handles dragging and dropping"""
-        # First, update the file
-        newMessages = []
-        for item in self.picker.findItems('', QtCore.Qt.MatchContains):
-            msg = item.data(QtCore.Qt.UserRole)
-            newMessages.append(msg)
-        self.file.Messages = newMessages
-
-        # Then, update the names
-        self.UpdateNames()
+        # The model has already reordered the file, so just update the
+        # group box, since the current message may have moved
+        self.UpdateTitle()
 
     def HandleA(self):
         """Handles the user clicking Add"""
         msg = Message()
-        if len(self.file.Messages) > 0: msg.id = self.file.Messages[-1].id + 1
-        else: msg.id = 0
-        self.file.Messages.append(msg)
+        msg.id = self.file.NextFreeId()
 
-        item = QtWidgets.QListWidgetItem() # self.UpdateNames will add the name
-        item.setData(QtCore.Qt.UserRole, msg)
-        self.picker.addItem(item)
+        self.Record(nme_undo.AddCommand(len(self.file.Messages), msg))
+        self.model.AddMessage(msg)
 
-        self.UpdateNames()
     def HandleR(self):
         """Handles the user clicking Remove"""
-        item = self.picker.currentItem()
-        msg = item.data(QtCore.Qt.UserRole)
-
-        # Remove it from file and the picker
-        self.file.Messages.remove(msg)
-        self.picker.takeItem(self.picker.row(item))
+        row = self.CurrentRow()
+        if row == None: return
 
         # Clear the selection
         self.edit.clear()
+        self.preview.setMessage(None)
         self.picker.clearSelection()
+        self.picker.setCurrentIndex(QtCore.QModelIndex())
         self.RBtn.setEnabled(False)
 
-        self.UpdateNames()
+        # Remove it from file and the picker
+        self.Record(nme_undo.RemoveCommand(row, self.file.Messages[row]))
+        self.model.RemoveRow(row)
+        self.MsgBox.setTitle('Message')
+
+    @nme_perf.Timed('MessageViewer.HandleEdited', slot=True)
+    def HandleEdited(self, msg, field, old, new):
+        """Records an edit made in the message editor"""
+        if field == 'id':
+            self.model.IdChanged(msg, old)
+            self.Record(nme_undo.IdCommand(self.CurrentRow(), msg, old, new))
+        else: self.Record(nme_undo.EditCommand(self.CurrentRow(), msg, field, old, new))
+
+    def HandleRowsMoved(self, parent, start, end, destination, row):
+        """Records a message being dragged to another row"""
+        if self.replaying: return
+        self.Record(nme_undo.MoveCommand(start, row - 1 if row > start else row))
+
+    @nme_perf.Timed('MessageViewer.HandleIndexTimer', slot=True)
+    def HandleIndexTimer(self):
+        """Adds messages to the search index for a short while"""
+        indexer = self.indexer
+        end = time.perf_counter() + self.IndexTimeSlice
+        while indexer and time.perf_counter() < end:
+            batch = [indexer.popleft() for i in range(min(self.IndexBatchSize, len(indexer)))]
+            self.model.search.AddMessages(batch)
+            self.model.memory.AddMessages(batch)
+        if indexer: return
+
+        # Done, unless more messages are on the way
+        self.indexTimer.stop()
+        if self.loading: return
+        self.indexer = None
+        stats = self.model.search.Stats()
+        self.statusMessage.emit('Search index ready: %d messages, %d words, built in %.2f s, about %.1f MB' % (
+            stats['messages'], stats['words'], stats['seconds'], stats['bytes'] / 1048576))
+
+        # Searches made so far had to scan every message
+        if self.searchBox.text(): self.HandleSearch(self.searchBox.text())
+
+    def StartScan(self):
+        """Starts checking every message for overflows, in the background"""
+        self.scanner = collections.deque(self.file.Messages) if self.file is not None else None
+        self.scanStart = time.perf_counter()
+        if self.file is not None: self.scanTimer.start()
+        else: self.scanTimer.stop()
+
+    def SetMetrics(self, metrics):
+        """Changes the glyph widths messages are laid out with"""
+        self.model.SetMetrics(metrics)
+        self.preview.setMetrics(metrics)
+        self.StartScan()
+
+    @nme_perf.Timed('MessageViewer.HandleScanTimer', slot=True)
+    def HandleScanTimer(self):
+        """Checks messages for overflows for a short while"""
+        scanner, overflows = self.scanner, self.model.overflows
+        found = len(overflows)
+        end = time.perf_counter() + self.IndexTimeSlice
+        while scanner and time.perf_counter() < end:
+            overflows.AddMessages([scanner.popleft() for i in range(min(self.ScanBatchSize, len(scanner)))])
+
+        # Only the rows on screen actually get redrawn
+        if len(overflows) != found: self.model.AllChanged()
+        if scanner: return
+
+        # Done, unless more messages are on the way
+        self.scanTimer.stop()
+        if self.loading: return
+        self.scanner = None
+        self.statusMessage.emit('%d of %d messages don\'t fit in the message box (checked in %.2f s)' % (
+            len(overflows), len(self.file.Messages), time.perf_counter() - self.scanStart))
+
+    @nme_perf.Timed('MessageViewer.HandleSearch', slot=True)
+    def HandleSearch(self, text):
+        """Filters the message list as the search text changes"""
+        if self.file is None: return
+        start = time.perf_counter()
+
+        if not text: matches = None
+        else:
+            matches = None
+            if self.indexer is None: matches = self.model.search.Search(text)
+            if matches is None: matches = nme_search.Scan(self.file.Messages, text)
+
+        # Keep the current message selected if it's still shown
+        row = self.CurrentRow()
+        self.model.SetFilter(matches)
+        self.picker.setDragEnabled(matches is None and not self.loading) # rows in between would be hidden
+        if row is not None:
+            index = self.model.ViewIndex(row)
+            self.picker.setCurrentIndex(index)
+            if index.isValid(): self.picker.scrollTo(index)
+
+        if matches is None: self.statusMessage.emit('')
+        else:
+            self.statusMessage.emit('%d matching messages (%.1f ms)' % (
+                len(self.model.rows), (time.perf_counter() - start) * 1000))
+
+    @nme_perf.Timed('MessageViewer.ApplyReload')
+    def ApplyReload(self, reload):
+        """Picks up the changes made on disk in an nme_reload.Reload.
+        Only the rows that changed are updated, and the current message
+        stays selected unless it was removed"""
+        row = self.CurrentRow()
+        current = self.file.Messages[row] if row is not None else None
+        result = reload.Result(self.file) # this changes titles and texts already
+        model, messages = self.model, self.file.Messages
+
+        self.replaying = True # moves aren't undoable
+        try:
+            # While searching, every row added or moved means working
+            # out which ones are shown again, so start over instead
+            patch = reload.patch
+            count = len(patch.removed) + len(patch.added) + len(patch.placed)
+            if count > self.MaxReloadRows or (count and model.IsFiltered()):
+                model.ReplaceMessages(result, reload.changed)
+                if current is not None:
+                    index = model.ViewIndex(model.RowOf(current, row))
+                    self.picker.setCurrentIndex(index)
+                    if index.isValid(): self.picker.scrollTo(index)
+            else:
+                kept = set(id(msg) for msg in result)
+                for row in reversed(range(len(messages))):
+                    if id(messages[row]) not in kept: model.RemoveRow(row)
+
+                old = set(id(msg) for msg in messages)
+                for row, msg in enumerate(result):
+                    if row < len(messages) and messages[row] is msg: continue
+                    if id(msg) in old: model.MoveMessage(messages.index(msg, row + 1), row)
+                    else: model.InsertMessage(row, msg)
+
+                rows = dict((id(msg), row) for row, msg in enumerate(messages))
+                for msg in reload.changed: model.MessageChanged(rows[id(msg)])
+        finally: self.replaying = False
+
+        model.SetConflicts(model.conflicts.union(reload.flagged))
+        if current is not None and current in reload.changed:
+            self.edit.setMessage(current)
+            self.preview.setMessage(current)
+        self.UpdateTitle()
+        self.UpdateRBtn()
+
+        # The rows recorded in the undo history may be wrong now
+        if not reload.IsEmpty():
+            self.history.Clear()
+            self.historyChanged.emit()
+
+    def Record(self, command):
+        """Adds a command to the undo history"""
+        self.history.Push(command)
+        self.changes += 1
+        self.historyChanged.emit()
+
+    def Undo(self):
+        """Undoes the last change"""
+        self.Replay(self.history.Undo)
+
+    def Redo(self):
+        """Redoes the last undone change"""
+        self.Replay(self.history.Redo)
+
+    def Replay(self, func):
+        """Undoes or redoes a command and shows the row it affected"""
+        if self.file is None: return
+        self.replaying = True
+        try: row = func(self.model)
+        finally: self.replaying = False
+        self.changes += 1
+
+        if row is None:
+            self.picker.setCurrentIndex(QtCore.QModelIndex())
+            self.edit.clear()
+            self.preview.setMessage(None)
+            self.MsgBox.setTitle('Message')
+        else:
+            index = self.model.ViewIndex(row)
+            if not index.isValid():
+                # It's hidden by the search, so stop searching
+                self.searchBox.clear()
+                index = self.model.ViewIndex(row)
+            if self.picker.currentIndex() == index:
+                self.edit.setMessage(self.file.Messages[row]) # show the change
+                self.preview.setMessage(self.file.Messages[row])
+            else: self.picker.setCurrentIndex(index)
+            self.picker.scrollTo(index)
+            self.UpdateTitle()
+
+        self.history.StopMerging()
+        self.historyChanged.emit()
 
 
 
 class MessageEditor(QtWidgets.QWidget):
     """Widget that allows you to edit the data in a message"""
     dataChanged = QtCore.pyqtSignal()
+    edited = QtCore.pyqtSignal(object, str, object, object) # message, field, old value, new value
+    MinId = -0x100 # IDs are stored plus 0x100, as a u32
+    MaxId = 0xFFFFFFFF - 0x100
     def __init__(self):
         """Initialises the MessageEditor"""
         QtWidgets.QWidget.__init__(self)
         self.msg = None
 
         # Create widgets
-        self.id = QtWidgets.QSpinBox()
-        self.id.setMaximum(255)
+        # QSpinBox only goes up to 2^31 - 1
+        self.id = QtWidgets.QDoubleSpinBox()
+        self.id.setDecimals(0)
+        self.id.setRange(self.MinId, self.MaxId)
         self.title = QtWidgets.QLineEdit()
         self.title.setMaxLength(255)
         self.text = QtWidgets.QPlainTextEdit()
         self.text.setLineWrapMode(self.text.NoWrap)
 
+        # Undo and redo are handled by MessageViewer, for whole messages
+        self.text.setUndoRedoEnabled(False)
+        for widget in (self.id, self.title, self.text):
+            widget.installEventFilter(self)
+
         # Add some tooltips
         self.id.setToolTip('<b>ID:</b><br>This is the value the Message Box sprite uses to find messages. Make sure you don\'t repeat IDs!')
         self.title.setToolTip('<b>Title:</b><br>Changes the text which will appear on the top of the message box')
@@ -406,6 +944,7 @@ class MessageEditor(QtWidgets.QWidget):
     def clear(self):
         """Clears all data from the MessageEditor"""
         self.msg = None
+        self.BlockSignals(True)
 
         # ID
         self.id.setEnabled(False)
@@ -419,9 +958,12 @@ class MessageEditor(QtWidgets.QWidget):
         self.text.setEnabled(False)
         self.text.setPlainText('')
 
+        self.BlockSignals(False)
+
     def setMessage(self, msg):
         """Sets the current message to msg"""
         self.msg = msg
+        self.BlockSignals(True)
 
         # ID
         self.id.setEnabled(True)
@@ -435,25 +977,201 @@ class MessageEditor(QtWidgets.QWidget):
         self.text.setEnabled(True)
         self.text.setPlainText(str(msg.text))
 
+        self.BlockSignals(False)
+
+    def BlockSignals(self, block):
+        """Blocks or unblocks the boxes' signals, so that filling them in
+        (and the ID box clamping values) isn't taken for an edit"""
+        for widget in (self.id, self.title, self.text):
+            widget.blockSignals(block)
+
+    def eventFilter(self, obj, event):
+        """Keeps the input widgets from grabbing the undo/redo shortcuts"""
+        if event.type() == QtCore.QEvent.ShortcutOverride:
+            if event.matches(QtGui.QKeySequence.Undo) or event.matches(QtGui.QKeySequence.Redo):
+                return True # not accepted, so the menu shortcut gets it
+        return False
+
+    @nme_perf.Timed('MessageEditor.HandleIdChanged', slot=True)
     def HandleIdChanged(self):
         """Handles changes to the ID box"""
         if self.msg == None: return
-        self.msg.id = self.id.value()
+        old, new = self.msg.id, int(self.id.value())
+        if old == new: return
+
+        self.msg.id = new
+        self.edited.emit(self.msg, 'id', old, new)
         self.dataChanged.emit()
 
+    @nme_perf.Timed('MessageEditor.HandleTitleChanged', slot=True)
     def HandleTitleChanged(self):
         """Handles changes to the title box"""
         if self.msg == None: return
-        self.msg.title = str(self.title.text())
+        old, new = self.msg.title, str(self.title.text())
+        if old == new: return
+
+        self.msg.title = new
+        self.edited.emit(self.msg, 'title', old, new)
         self.dataChanged.emit()
 
+    @nme_perf.Timed('MessageEditor.HandleTextChanged', slot=True)
     def HandleTextChanged(self):
         """Handles changes to the text box"""
         if self.msg == None: return
-        self.msg.text = str(self.text.toPlainText())
+        old, new = self.msg.text, str(self.text.toPlainText())
+        if old == new: return
+
+        self.msg.text = new
+        self.edited.emit(self.msg, 'text', old, new)
         self.dataChanged.emit()
 
 
+class MessagePreview(QtWidgets.QWidget):
+    """Widget that draws a message where the message box would put its
+    characters, with whatever doesn't fit in red"""
+    Margin = 12 # around the box, in font pixels
+    OverflowColor = QtGui.QColor(220, 0, 0)
+
+    def __init__(self, metrics):
+        """Initialises the MessagePreview"""
+        QtWidgets.QWidget.__init__(self)
+        self.metrics = metrics
+        self.msg = None
+        self.laidOut = None # (title, text) of self.msgLayout
+        self.msgLayout = None # nme_layout.Layout of the message
+        self.setSizePolicy(QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Fixed)
+        self.setToolTip('<b>Preview:</b><br>Shows how the message fits in the message box, using %s glyph widths' % metrics.name)
+
+    def sizeHint(self):
+        """Asks for room to draw everything at two thirds of its size"""
+        width, height = self.DrawingSize()
+        return QtCore.QSize(width * 2 // 3, height * 2 // 3)
+
+    def DrawingSize(self):
+        """Returns the size of everything drawn, in font pixels: the
+        title bar and box, a line past each of their edges, and a line
+        saying what's wrong"""
+        lineHeight = self.metrics.lineHeight
+        width = nme_layout.TextWidth * 5 // 4 + self.Margin * 2
+        return width, lineHeight * (nme_layout.TextLines + 3) + self.Margin * 4
+
+    def setMetrics(self, metrics):
+        """Changes the glyph widths used"""
+        self.metrics = metrics
+        self.laidOut = None
+        self.setToolTip('<b>Preview:</b><br>Shows how the message fits in the message box, using %s glyph widths' % metrics.name)
+        self.updateGeometry()
+        self.Reflow()
+
+    def setMessage(self, msg):
+        """Shows msg (None for none)"""
+        if msg is not self.msg: self.laidOut = None
+        self.msg = msg
+        self.Reflow()
+
+    @nme_perf.Timed('MessagePreview.Reflow')
+    def Reflow(self):
+        """Lays the message out again, if it's changed"""
+        if self.msg is None:
+            self.laidOut = self.msgLayout = None
+            self.update()
+            return
+
+        key = (self.msg.title, self.msg.text)
+        if key == self.laidOut: return
+        self.laidOut = key
+        self.msgLayout = nme_layout.Layout(key[0], key[1], self.metrics)
+        self.update()
+
+    def paintEvent(self, event):
+        """Draws the box and the message in it"""
+        painter = QtGui.QPainter(self)
+        painter.setRenderHint(QtGui.QPainter.Antialiasing)
+        width, height = self.DrawingSize()
+        lineHeight, margin = self.metrics.lineHeight, self.Margin
+        scale = min(self.width() / width, self.height() / height)
+        painter.scale(scale, scale)
+
+        # Title bar and box
+        palette = self.palette()
+        titleRect = QtCore.QRectF(margin, margin, nme_layout.TitleWidth, lineHeight)
+        boxRect = QtCore.QRectF(margin, margin * 2 + lineHeight, nme_layout.TextWidth, lineHeight * nme_layout.TextLines)
+        painter.setPen(palette.mid().color())
+        painter.setBrush(palette.base())
+        painter.drawRoundedRect(titleRect.adjusted(-4, -4, 4, 4), 6, 6)
+        painter.drawRoundedRect(boxRect.adjusted(-4, -4, 4, 4), 6, 6)
+
+        layout = self.msgLayout
+        if layout is None: return
+        font = painter.font()
+        font.setPixelSize(lineHeight * 3 // 4)
+        painter.setFont(font)
+
+        def DrawLine(line, widths, x, y, limit, fits):
+            """Draws a line a character at a time, at the positions the
+            glyph widths give them"""
+            for c, w in zip(line, widths):
+                painter.setPen(palette.text().color() if fits and x + w <= limit else self.OverflowColor)
+                painter.drawText(QtCore.QRectF(x, y, max(w, 1), lineHeight), QtCore.Qt.AlignCenter | QtCore.Qt.TextDontClip, c)
+                x += w
+
+        DrawLine(layout.title, layout.titleWidths, margin, margin, margin + nme_layout.TitleWidth, True)
+        shown = nme_layout.TextLines + 1 # the first line that doesn't fit, too
+        for i, (line, widths) in enumerate(zip(layout.lines[:shown], layout.widths)):
+            y = boxRect.top() + i * lineHeight
+            DrawLine(line, widths, margin, y, margin + nme_layout.TextWidth, i < nme_layout.TextLines)
+
+        # Say what's wrong under the box
+        problems = nme_layout.DescribeOverflow(layout.flags)
+        if problems:
+            painter.setPen(self.OverflowColor)
+            below = QtCore.QRectF(margin, boxRect.bottom() + lineHeight + margin * 2, width, lineHeight)
+            painter.drawText(below, QtCore.Qt.AlignLeft | QtCore.Qt.TextDontClip, 'Too long: ' + ', '.join(problems))
+
+
+
+
+class SuggestionList(QtWidgets.QTreeWidget):
+    """Translation memory: lists the messages most like the current
+    one, with the messages with the same ID in the other open files
+    (its translations) under each of them"""
+    picked = QtCore.pyqtSignal(str) # text of a message that was double-clicked
+    MaxLabelLength = 80 # characters of each message shown
+
+    def __init__(self):
+        """Initialises the SuggestionList"""
+        QtWidgets.QTreeWidget.__init__(self)
+        self.setHeaderLabels(['Match', 'File', 'Message'])
+        self.setToolTip('<b>Translation Memory:</b><br>Messages like this one in the open files, with the same message in the other files under each. Double-click one to use its text')
+        self.itemDoubleClicked.connect(self.HandleDoubleClicked)
+
+    def setSuggestions(self, suggestions):
+        """Shows suggestions: (score, file name, message, [(file name,
+        message), ...]) tuples, the list being its translations"""
+        self.clear()
+        for score, name, msg, translations in suggestions:
+            item = self.MakeItem('%d%%' % (score * 100), name, msg)
+            for otherName, other in translations:
+                item.addChild(self.MakeItem('', otherName, other))
+            self.addTopLevelItem(item)
+            item.setExpanded(True)
+        self.resizeColumnToContents(0)
+
+    def MakeItem(self, match, name, msg):
+        """Returns an item for msg"""
+        text = msg.text
+        label = '%d: %s' % (msg.id, ' '.join(text.split()))
+        if len(label) > self.MaxLabelLength: label = label[:self.MaxLabelLength - 3] + '...'
+        item = QtWidgets.QTreeWidgetItem([match, name, label])
+        item.setData(0, QtCore.Qt.UserRole, text)
+        item.setToolTip(2, text)
+        return item
+
+    def HandleDoubleClicked(self, item):
+        """Picks the text of a message"""
+        self.picked.emit(item.data(0, QtCore.Qt.UserRole))
+
+
 
 
 # Check Duplicate IDs dialog
@@ -463,25 +1181,8 @@ class CheckDuplicateIDsDlg(QtWidgets.QDialog):
         """Initialises the dialog"""
         QtWidgets.QDialog.__init__(self)
 
-        # Find duplicates
-        IDs = []
-        for msg in file.Messages:
-            i = msg.id
-            counter = None
-            found = False
-            for acounter in IDs:
-                if acounter[0] == i:
-                    counter = acounter
-                    found = True
-
-            if found == True:
-                counter[1] += 1
-            else:
-                counter = [i, 1]
-                IDs.append(counter)
-
-        # Sort it
-        IDs = sorted(IDs, key=lambda msg: msg[0])
+        # Find duplicates; the file keeps track of them already
+        IDs = sorted(file.ids.Duplicates().items())
 
         # Make a header label
         head = QtWidgets.QLabel('The file has been scanned. Problems are listed below:')
@@ -489,8 +1190,8 @@ class CheckDuplicateIDsDlg(QtWidgets.QDialog):
         # Make a list widget
         listW = QtWidgets.QListWidget()
         listW.setSelectionMode(listW.NoSelection)
-        for id in IDs:
-            if id[1] > 1: listW.addItem('There are %d messages with ID %d' % (id[1], id[0]))
+        for id, count in IDs:
+            listW.addItem('There are %d messages with ID %d' % (count, id))
 
         # Make the buttonbox
         buttonBox = QtWidgets.QDialogButtonBox(QtWidgets.QDialogButtonBox.Ok | QtWidgets.QDialogButtonBox.Cancel)
@@ -505,6 +1206,306 @@ class CheckDuplicateIDsDlg(QtWidgets.QDialog):
         self.setLayout(L)
         
 
+
+# Merge dialog
+class MergeDlg(QtWidgets.QDialog):
+    """Dialog which shows the conflicts of a merge side by side, so a
+    version of each message can be picked. Either version can be edited
+    before it's picked, too"""
+    Sides = ((nme_merge.Ours, 'Your Version', 'Yours'), (nme_merge.Theirs, 'Their Version', 'Theirs'))
+
+    def __init__(self, merge, parent=None):
+        """Initialises the dialog"""
+        QtWidgets.QDialog.__init__(self, parent)
+        self.setWindowTitle('Merge Changes')
+        self.merge = merge
+        self.conflicts = [c for c in merge.conflicts if c.kind != nme_merge.Conflict.Order]
+        self.placeholders = set() # ids of the messages standing in for removed ones
+
+        # Make a header label
+        head = QtWidgets.QLabel('%d changes were merged, but these were changed on both sides. Pick the version to keep for each one:' % merge.changes)
+        head.setWordWrap(True)
+
+        # Make a viewer for each side, listing its version of every
+        # conflicting message in the same rows
+        self.viewers = []
+        viewersL = QtWidgets.QHBoxLayout()
+        for side, title, owner in self.Sides:
+            file = MessagesBin()
+            file.Messages = [self.Candidate(c, side) for c in self.conflicts]
+            viewer = MessageViewer()
+            viewer.setFile(file)
+            viewer.ABtn.hide()
+            viewer.RBtn.hide()
+            viewer.picker.setDragEnabled(False)
+            viewer.picker.selectionModel().currentChanged.connect(self.HandleMsgSel)
+            viewer.edit.dataChanged.connect(self.UpdateState)
+            self.viewers.append(viewer)
+
+            keepBtn = QtWidgets.QPushButton('Keep %s' % title)
+            keepBtn.clicked.connect(lambda checked, side=side: self.Choose(side))
+            keepAllBtn = QtWidgets.QPushButton('Keep All of %s' % owner)
+            keepAllBtn.clicked.connect(lambda checked, side=side: self.ChooseAll(side))
+
+            L = QtWidgets.QGridLayout()
+            L.addWidget(viewer, 0, 0, 1, 2)
+            L.addWidget(keepBtn, 1, 0)
+            L.addWidget(keepAllBtn, 1, 1)
+            box = QtWidgets.QGroupBox(title)
+            box.setLayout(L)
+            box.setVisible(bool(self.conflicts))
+            viewersL.addWidget(box)
+
+        # Make a label showing what's picked
+        self.state = QtWidgets.QLabel()
+        self.state.setWordWrap(True)
+
+        # Make a box for picking the order, if both sides changed it
+        self.order = QtWidgets.QComboBox()
+        self.order.addItems(['Keep your order of the messages', 'Keep their order of the messages'])
+        self.order.setToolTip('<b>Order:</b><br>The messages were reordered on both sides. Messages only one side has are placed after the ones they came after there')
+        self.order.setVisible(merge.orderConflict is not None)
+
+        # Make the buttonbox
+        buttonBox = QtWidgets.QDialogButtonBox(QtWidgets.QDialogButtonBox.Ok | QtWidgets.QDialogButtonBox.Cancel)
+        buttonBox.accepted.connect(self.accept)
+        buttonBox.rejected.connect(self.reject)
+
+        # Make a layout
+        L = QtWidgets.QVBoxLayout()
+        L.addWidget(head)
+        L.addLayout(viewersL)
+        L.addWidget(self.state)
+        L.addWidget(self.order)
+        L.addWidget(buttonBox)
+        self.setLayout(L)
+        self.resize(1000, 560)
+
+        if self.conflicts: self.viewers[0].picker.setCurrentIndex(self.viewers[0].model.ViewIndex(0))
+        self.UpdateState()
+
+    def Candidate(self, conflict, side):
+        """Returns the message a side wants, or a placeholder if it
+        removed the message"""
+        msg = conflict.ours if side == nme_merge.Ours else conflict.theirs
+        if msg is None:
+            msg = Message(conflict.key[0], '(removed)', '')
+            self.placeholders.add(id(msg))
+        return msg
+
+    def CurrentRow(self):
+        """Returns the row of the current conflict, or None"""
+        for viewer in self.viewers:
+            row = viewer.CurrentRow()
+            if row is not None: return row
+        return None
+
+    def HandleMsgSel(self):
+        """Selects the same conflict on both sides"""
+        source = next(v for v in self.viewers if v.picker.selectionModel() is self.sender())
+        row = source.CurrentRow()
+        for viewer in self.viewers:
+            if viewer is not source and row is not None and viewer.CurrentRow() != row:
+                viewer.picker.setCurrentIndex(viewer.model.ViewIndex(row))
+
+            # Removed messages can't be edited
+            current = viewer.CurrentRow()
+            if current is not None and id(viewer.file.Messages[current]) in self.placeholders:
+                viewer.edit.clear()
+        self.UpdateState()
+
+    def Choose(self, side):
+        """Picks one side's version of the current conflict"""
+        row = self.CurrentRow()
+        if row is None: return
+        self.conflicts[row].choice = side
+        self.UpdateState()
+
+    def ChooseAll(self, side):
+        """Picks one side's version of every conflict"""
+        for conflict in self.conflicts: conflict.choice = side
+        self.UpdateState()
+
+    def UpdateState(self):
+        """Describes the current conflict and what's picked"""
+        theirs = sum(1 for c in self.conflicts if c.choice == nme_merge.Theirs)
+        text = 'Keeping your version of %d messages and theirs of %d.' % (len(self.conflicts) - theirs, theirs)
+        row = self.CurrentRow()
+        if row is not None:
+            conflict = self.conflicts[row]
+            description = str(conflict)
+            text = '<b>%s:</b> keeping %s version. %s' % (description[0].upper() + description[1:],
+                'your' if conflict.choice == nme_merge.Ours else 'their', text)
+        self.state.setText(text)
+
+    def accept(self):
+        """Picks the order, too, before closing"""
+        if self.merge.orderConflict is not None:
+            self.merge.orderConflict.choice = nme_merge.Theirs if self.order.currentIndex() else nme_merge.Ours
+        QtWidgets.QDialog.accept(self)
+
+
+
+# Performance dialog
+class HistogramWidget(QtWidgets.QWidget):
+    """Bar chart of an operation's recent timings, one bar per bucket"""
+    def __init__(self):
+        """Initialises the HistogramWidget"""
+        QtWidgets.QWidget.__init__(self)
+        self.counts = []
+        self.setMinimumSize(400, 140)
+
+    def setCounts(self, counts):
+        """Changes the counts shown"""
+        self.counts = counts
+        self.update()
+
+    @staticmethod
+    def BucketLabel(i):
+        """Returns the label of bucket i: its upper bound, kept short"""
+        bound = nme_perf.Buckets[min(i, len(nme_perf.Buckets) - 1)]
+        label = '%gms' % (bound * 1000) if bound < 1 else '%gs' % bound
+        return '>' + label if i == len(nme_perf.Buckets) else label
+
+    def paintEvent(self, event):
+        """Draws the bars"""
+        painter = QtGui.QPainter(self)
+        rect = self.rect().adjusted(4, 4, -4, -4)
+        labelHeight = painter.fontMetrics().height() * 2
+        buckets = len(nme_perf.Buckets) + 1
+        width = rect.width() / buckets
+        height = rect.height() - labelHeight
+        biggest = max(self.counts or [0]) or 1
+
+        for i in range(buckets):
+            count = self.counts[i] if i < len(self.counts) else 0
+            x = rect.left() + i * width
+            barHeight = height * count / biggest
+            painter.fillRect(QtCore.QRectF(x + 2, rect.top() + height - barHeight, width - 4, barHeight), self.palette().highlight())
+
+            # Bucket and count labels
+            labels = QtCore.QRectF(x, rect.top() + height, width, labelHeight)
+            painter.drawText(labels, QtCore.Qt.AlignHCenter | QtCore.Qt.AlignTop, '%s\n%d' % (self.BucketLabel(i), count))
+
+
+class PerformanceDlg(QtWidgets.QDialog):
+    """Dialog that shows how long the editor's slow operations have
+    been taking, and can save a trace of them"""
+    RefreshInterval = 500 # ms
+    Columns = ('Operation', 'Calls', 'Last', 'Median', '95%', 'Max')
+
+    def __init__(self, parent=None):
+        """Initialises the dialog"""
+        QtWidgets.QDialog.__init__(self, parent)
+        self.setWindowTitle('Performance')
+        self.items = {} # operation name -> QTreeWidgetItem
+
+        # Recording can be turned on here, too
+        self.enabled = QtWidgets.QCheckBox('Record timings')
+        self.enabled.setToolTip('<b>Record timings:</b><br>Can also be turned on by starting the editor with --perf, or with the NME_PERF environment variable set')
+        self.enabled.setChecked(nme_perf.Enabled)
+        self.enabled.toggled.connect(nme_perf.Enable)
+
+        # Make the table of operations
+        self.tree = QtWidgets.QTreeWidget()
+        self.tree.setHeaderLabels(self.Columns)
+        self.tree.setRootIsDecorated(False)
+        self.tree.setSortingEnabled(True)
+        self.tree.sortByColumn(0, QtCore.Qt.AscendingOrder)
+        self.tree.currentItemChanged.connect(self.Refresh)
+
+        # Histogram of the current operation, and the counters
+        self.histogramBox = QtWidgets.QGroupBox('Recent calls')
+        self.histogram = HistogramWidget()
+        L = QtWidgets.QVBoxLayout()
+        L.addWidget(self.histogram)
+        self.histogramBox.setLayout(L)
+        self.counters = QtWidgets.QLabel()
+        self.counters.setWordWrap(True)
+
+        # Make the buttonbox
+        buttonBox = QtWidgets.QDialogButtonBox(QtWidgets.QDialogButtonBox.Close)
+        buttonBox.rejected.connect(self.reject)
+        resetBtn = buttonBox.addButton('Reset', QtWidgets.QDialogButtonBox.ResetRole)
+        resetBtn.clicked.connect(self.HandleReset)
+        traceBtn = buttonBox.addButton('Save Trace...', QtWidgets.QDialogButtonBox.ActionRole)
+        traceBtn.setToolTip('<b>Save Trace:</b><br>Saves every recorded call, which can be viewed in chrome://tracing or ui.perfetto.dev')
+        traceBtn.clicked.connect(self.HandleSaveTrace)
+
+        # Make a layout
+        L = QtWidgets.QVBoxLayout()
+        L.addWidget(self.enabled)
+        L.addWidget(self.tree)
+        L.addWidget(self.histogramBox)
+        L.addWidget(self.counters)
+        L.addWidget(buttonBox)
+        self.setLayout(L)
+        self.resize(760, 520)
+
+        # Keep it up to date while it's open
+        self.timer = QtCore.QTimer(self)
+        self.timer.setInterval(self.RefreshInterval)
+        self.timer.timeout.connect(self.Refresh)
+        self.timer.start()
+        self.Refresh()
+
+    @staticmethod
+    def FormatTime(seconds):
+        """Returns a short human-readable form of a time"""
+        if seconds >= 1: return '%.3g s' % seconds
+        if seconds >= 0.001: return '%.3g ms' % (seconds * 1000)
+        return '%.3g \u00b5s' % (seconds * 1000000)
+
+    def Refresh(self):
+        """Shows the latest timings"""
+        stats, counters = nme_perf.Snapshot()
+
+        # Update the rows in place, so the selection stays put
+        self.tree.setSortingEnabled(False)
+        for stat in stats:
+            item = self.items.get(stat.name)
+            if item is None:
+                item = self.items[stat.name] = QtWidgets.QTreeWidgetItem(self.tree, [stat.name])
+                for column in range(1, len(self.Columns)): item.setTextAlignment(column, QtCore.Qt.AlignRight)
+            item.setText(1, str(stat.count))
+            for column, seconds in enumerate((stat.last, stat.Percentile(50), stat.Percentile(95), stat.max), 2):
+                item.setText(column, self.FormatTime(seconds))
+            item.setData(0, QtCore.Qt.UserRole, stat)
+        self.tree.setSortingEnabled(True)
+        for column in range(len(self.Columns)): self.tree.resizeColumnToContents(column)
+
+        # Histogram of the selected operation
+        item = self.tree.currentItem()
+        stat = item.data(0, QtCore.Qt.UserRole) if item is not None else None
+        if stat is None:
+            self.histogramBox.setTitle('Recent calls')
+            self.histogram.setCounts([])
+        else:
+            self.histogramBox.setTitle('Last %d calls to %s' % (len(stat.recent), stat.name))
+            self.histogram.setCounts(stat.Histogram())
+
+        self.counters.setText(', '.join('%s: %d' % item for item in counters.items()))
+
+    def HandleReset(self):
+        """Forgets everything recorded so far"""
+        nme_perf.Reset()
+        self.tree.clear()
+        self.items = {}
+        self.Refresh()
+
+    def HandleSaveTrace(self):
+        """Saves a trace of everything recorded"""
+        fn = QtWidgets.QFileDialog.getSaveFileName(self, 'Save Trace', 'trace.json', 'Trace Files (*.json);;All Files (*)')[0]
+        if fn == '': return
+        try: nme_perf.WriteTrace(fn)
+        except OSError as e: QtWidgets.QMessageBox.warning(self, 'Save Trace', 'Couldn\'t save the trace:\n' + str(e))
+
+    def done(self, result):
+        """Stops refreshing once the dialog is closed"""
+        self.timer.stop()
+        QtWidgets.QDialog.done(self, result)
+
+
         
 
 
@@ -513,22 +1514,451 @@ class CheckDuplicateIDsDlg(QtWidgets.QDialog):
 ################################################################
 ######################### Main Window ##########################
 
+class LoadThread(QtCore.QThread):
+    """Thread that opens a file and parses its messages a chunk at a
+    time, handing each chunk to the GUI thread as soon as it's ready"""
+    opened = QtCore.pyqtSignal(object, int) # the file (still empty), number of messages
+    chunkLoaded = QtCore.pyqtSignal(object) # list of messages
+
+    def __init__(self, fp):
+        """Inits the LoadThread"""
+        QtCore.QThread.__init__(self)
+        self.fp = fp
+        self.file = None
+        self.base = nme_reload.Fingerprint() # of the file as it was read
+        self.stat = None # os.stat() of it
+        self.error = None
+        self.cancelled = False
+        self.startTime = time.perf_counter()
+        self.firstShown = None # seconds until the first messages were shown
+
+    def run(self):
+        """Parses the file"""
+        try:
+            self.stat = os.stat(self.fp)
+            self.file, count, chunks = OpenFileInChunks(self.fp)
+            self.opened.emit(self.file, count)
+            for chunk in chunks:
+                if self.cancelled: return
+                self.base.Add(self.file, chunk) # before they can be edited
+                self.chunkLoaded.emit(chunk)
+        except Exception as e: self.error = e
+
+    def cancel(self):
+        """Stops parsing after the current chunk"""
+        self.cancelled = True
+
+
+class SaveThread(QtCore.QThread):
+    """Thread that writes a snapshot of a file to a temporary file next
+    to where it's being saved. The GUI thread moves it into place after
+    the thread finishes"""
+    progress = QtCore.pyqtSignal(int, int) # messages written, total
+
+    def __init__(self, file, fp, compact=False):
+        """Inits the SaveThread. If compact is True, strings are shared
+        where they can be, to make the file smaller"""
+        QtCore.QThread.__init__(self)
+        self.file = file # the file being edited
+        self.snapshot = file.Snapshot()
+        self.fp = fp
+        self.compact = compact
+        self.saved = 0 # bytes saved by compacting
+        self.temp = None
+        self.base = None # Fingerprint of the snapshot
+        self.error = None
+        self.startTime = time.perf_counter()
+
+    def run(self):
+        """Writes the temporary file"""
+        try:
+            self.temp = WriteTemporaryFile(self.fp, lambda f: self.snapshot.saveTo(f, self.progress.emit, self.compact))
+            if self.compact: self.saved = self.snapshot.Layout()[1] - os.path.getsize(self.temp)
+            self.base = nme_reload.Fingerprint(self.snapshot)
+        except Exception as e: self.error = e
+
+
+class ReloadThread(QtCore.QThread):
+    """Thread that reads the open file again after it was changed on disk"""
+    def __init__(self, fp):
+        """Inits the ReloadThread"""
+        QtCore.QThread.__init__(self)
+        self.fp = fp
+        self.file = None
+        self.base = None # Fingerprint of it
+        self.stat = None # os.stat() of it
+        self.error = None
+
+    def run(self):
+        """Reads and parses the file"""
+        try:
+            self.stat = os.stat(self.fp)
+            with open(self.fp, 'rb') as file: data = file.read()
+            self.file = ParseData(data)
+            if any(d.severity == Diagnostic.Error for d in self.file.diagnostics):
+                raise ValueError('it\'s damaged')
+            self.base = nme_reload.Fingerprint(self.file)
+        except Exception as e: self.error = e
+
+
+
+class Document(QtCore.QObject):
+    """A file open in a tab: the MessageViewer that shows it, where it's
+    saved, and whatever's going on in the background for it. Files on
+    disk are only loaded once their tab is shown, and saved ones can be
+    unloaded again to free up memory"""
+    changed = QtCore.pyqtSignal() # the name, progress or state changed
+    statusMessage = QtCore.pyqtSignal(str)
+    loadFinished = QtCore.pyqtSignal(bool) # True if it was loaded, False if it couldn't be
+    MaxDiagnostics = 1000 # problems listed when a damaged file is opened
+    ReloadDelay = 500 # ms to wait for changes on disk to settle before reloading
+
+    def __init__(self, fp=None, file=None, metrics=None, saved=True):
+        """Inits the Document, of the file at fp (loaded later) or of
+        file. saved is False if file hasn't been saved anywhere"""
+        QtCore.QObject.__init__(self)
+        self.fp = fp # file path
+        self.loaded = False # True once the file is shown
+        self.savedChanges = 0 if saved else -1 # view.changes when it was last saved
+        self.saveThread = None # running SaveThread
+        self.loadThread = None # running LoadThread
+        self.reloadThread = None # running ReloadThread
+        self.progress = None # (done, total) of a load or save in progress
+
+        # The file is reloaded when it's changed on disk. Build tools
+        # write it in several steps, so wait for them to finish
+        self.base = None # nme_reload.Fingerprint of the file as it is on disk
+        self.diskStat = None # (mtime, size) of it
+        self.watcher = QtCore.QFileSystemWatcher(self)
+        self.watcher.fileChanged.connect(self.HandleFileChanged)
+        self.reloadTimer = QtCore.QTimer(self)
+        self.reloadTimer.setSingleShot(True)
+        self.reloadTimer.setInterval(self.ReloadDelay)
+        self.reloadTimer.timeout.connect(self.HandleReloadTimer)
+
+        self.view = MessageViewer()
+        if metrics is not None: self.view.SetMetrics(metrics)
+        self.view.statusMessage.connect(self.statusMessage)
+        self.view.historyChanged.connect(self.changed) # it may be modified now
+        if file is not None:
+            self.view.setFile(file)
+            self.loaded = True
+
+    def Name(self):
+        """Returns the name of the file"""
+        return os.path.basename(self.fp) if self.fp is not None else 'Untitled'
+
+    def TabText(self):
+        """Returns the name of the tab, which shows if there are unsaved changes"""
+        return self.Name() + '*' if self.IsModified() else self.Name()
+
+    def IsModified(self):
+        """Returns True if there are unsaved changes"""
+        return self.loaded and self.view.changes != self.savedChanges
+
+    def IsBusy(self):
+        """Returns True if the file is being loaded, saved or reloaded"""
+        return self.loadThread is not None or self.saveThread is not None or self.reloadThread is not None
+
+    def MessageCount(self):
+        """Returns the number of messages loaded"""
+        return len(self.view.file.Messages) if self.view.file is not None else 0
+
+    def Load(self):
+        """Starts loading the file in the background, unless it's loaded"""
+        if self.loaded or self.loadThread is not None or self.fp is None: return
+
+        # Nothing can be shown until the file starts arriving
+        self.view.setFile(None)
+        self.loadThread = LoadThread(self.fp)
+        self.loadThread.opened.connect(self.HandleLoadOpened)
+        self.loadThread.chunkLoaded.connect(self.HandleChunkLoaded)
+        self.loadThread.finished.connect(self.HandleLoadDone)
+        self.progress = (0, 1)
+        self.statusMessage.emit('Opening...')
+        self.changed.emit()
+        self.loadThread.start()
+
+    def Unload(self):
+        """Frees the file and its list model, if it's saved and nothing's
+        being done with it, until Load() is called again. Returns True
+        if it was unloaded"""
+        if not self.loaded or self.fp is None or self.IsModified() or self.IsBusy(): return False
+        self.WatchFile(None)
+        file = self.view.file
+        self.view.setFile(None)
+        if isinstance(file, LazyMessagesBin): file.close()
+        self.loaded = False
+        self.changed.emit()
+        return True
+
+    def Close(self):
+        """Releases the file, once anything going on in the background is done"""
+        self.FinishLoad()
+        self.FinishSave()
+        self.FinishReload()
+        self.WatchFile(None)
+        file = self.view.file
+        self.view.setFile(None) # stop indexing and scanning it
+        if isinstance(file, LazyMessagesBin): file.close()
+
+    def HandleLoadOpened(self, file, count):
+        """Shows a file being opened, before its messages are added"""
+        if self.sender() is not self.loadThread: return # cancelled
+        self.view.setFile(file, True)
+        self.progress = (0, max(count, 1))
+        self.changed.emit()
+
+    @nme_perf.Timed('Document.HandleChunkLoaded', slot=True)
+    def HandleChunkLoaded(self, messages):
+        """Adds messages to the file being opened"""
+        thread = self.loadThread
+        if self.sender() is not thread: return # cancelled
+        self.view.AppendMessages(messages)
+        nme_perf.Count('messages loaded', len(messages))
+        self.progress = (len(self.view.file.Messages), self.progress[1])
+        self.changed.emit()
+        if thread.firstShown is None: thread.firstShown = time.perf_counter() - thread.startTime
+
+    def HandleLoadDone(self):
+        """Finishes opening a file once the LoadThread is done"""
+        thread = self.sender() # None if FinishLoad() already did and dropped it
+        if thread is not None and thread is self.loadThread: self.LoadDone()
+
+    def LoadDone(self):
+        """Shows the opened file, or cleans up if it couldn't be opened"""
+        thread, self.loadThread = self.loadThread, None
+        self.progress = None
+
+        if thread.error is not None or thread.cancelled:
+            self.view.setFile(None)
+            if isinstance(thread.file, LazyMessagesBin): thread.file.close()
+            self.statusMessage.emit('')
+            if thread.error is not None:
+                QtWidgets.QMessageBox.warning(self.view, 'Open File', 'The file could not be opened:\n%s' % thread.error)
+            self.changed.emit()
+            self.loadFinished.emit(False)
+            return
+
+        self.loaded = True
+        self.view.FinishLoading()
+        self.savedChanges = self.view.changes
+        self.WatchFile(self.fp, thread.base, thread.stat)
+        self.statusMessage.emit('Opened %d messages in %.2f s (the first ones were shown after %.0f ms)' % (
+            len(thread.file.Messages), time.perf_counter() - thread.startTime, (thread.firstShown or 0) * 1000))
+        self.changed.emit()
+        self.loadFinished.emit(True)
+        if thread.file.diagnostics: self.ShowDiagnostics(thread.file.diagnostics)
+
+    def ShowDiagnostics(self, diagnostics):
+        """Tells the user about problems found in a file that was opened"""
+        if any(d.severity == Diagnostic.Error for d in diagnostics):
+            text = 'Parts of this file couldn\'t be read, so they were left out. Saving it will leave them out for good.'
+        else: text = 'This file isn\'t laid out properly, but all of it could be read. Saving it will fix it.'
+
+        box = QtWidgets.QMessageBox(QtWidgets.QMessageBox.Warning, 'Open File', text, QtWidgets.QMessageBox.Ok, self.view)
+        box.setInformativeText('Problems found: %d' % len(diagnostics))
+        box.setDetailedText('\n'.join(str(d) for d in diagnostics[:self.MaxDiagnostics]))
+        box.exec_()
+
+    def FinishLoad(self):
+        """Cancels opening the file, if it's being opened"""
+        if self.loadThread is None: return
+        self.loadThread.cancel()
+        self.loadThread.wait()
+        self.LoadDone()
+
+    def Save(self, compact=False, fp=None):
+        """Saves the file to self.fp, or to fp (which becomes self.fp once
+        it's saved there). It's written in the background from a snapshot,
+        so it can be edited in the meantime. If compact is True, strings
+        are shared where they can be"""
+        if self.saveThread is not None: return
+
+        self.saveThread = SaveThread(self.view.file, fp or self.fp, compact)
+        self.saveThread.changes = self.view.changes
+        self.saveThread.progress.connect(self.HandleSaveProgress)
+        self.saveThread.finished.connect(self.HandleSaveDone)
+        self.progress = (0, 1)
+        self.statusMessage.emit('Saving...')
+        self.changed.emit()
+        self.saveThread.start()
+
+    def HandleSaveProgress(self, done, total):
+        """Updates the save progress"""
+        self.progress = (done, max(total, 1))
+        self.changed.emit()
+
+    def HandleSaveDone(self):
+        """Finishes saving once the SaveThread is done"""
+        thread = self.sender() # None if FinishSave() already did and dropped it
+        if thread is not None and thread is self.saveThread: self.SaveDone()
+
+    def SaveDone(self):
+        """Moves the saved file into place"""
+        thread, self.saveThread = self.saveThread, None
+        self.progress = None
+        self.changed.emit()
+
+        # Swap the new file in for the old one in one step, so a crash
+        # can only ever leave one or the other behind
+        try:
+            if thread.error is not None: raise thread.error
+            if isinstance(thread.file, LazyMessagesBin):
+                # Point the messages at the new file, too
+                thread.file.Replace(thread.temp, thread.fp, thread.snapshot)
+            else:
+                os.replace(thread.temp, thread.fp)
+                SyncDirectory(thread.fp)
+        except Exception as e:
+            if thread.temp is not None and os.path.exists(thread.temp): os.remove(thread.temp)
+            self.statusMessage.emit('')
+            QtWidgets.QMessageBox.warning(self.view, 'Save File', 'The file could not be saved:\n%s' % e)
+            return
+
+        # What's on disk now is what was saved, conflicts and all
+        self.fp = thread.fp
+        try: self.WatchFile(thread.fp, thread.base, os.stat(thread.fp))
+        except OSError: self.WatchFile(None)
+        if thread.file is self.view.file:
+            self.view.model.SetConflicts(())
+            self.savedChanges = thread.changes
+        compacted = ', %d bytes saved by sharing strings' % thread.saved if thread.compact else ''
+        self.statusMessage.emit('Saved %s (%.2f s%s)' % (thread.fp, time.perf_counter() - thread.startTime, compacted))
+        self.changed.emit()
+
+    def FinishSave(self):
+        """Waits for a save in progress, if any, to finish"""
+        if self.saveThread is None: return
+        self.saveThread.wait()
+        self.SaveDone()
+
+    def WatchFile(self, fp, base=None, stat=None):
+        """Starts watching fp (None for nothing) for changes made on disk.
+        base is the Fingerprint of it and stat its os.stat()"""
+        if self.watcher.files(): self.watcher.removePaths(self.watcher.files())
+        self.reloadTimer.stop()
+        self.base = base
+        self.diskStat = (stat.st_mtime_ns, stat.st_size) if stat is not None else None
+        if fp is not None: self.watcher.addPath(fp)
+
+    def HandleFileChanged(self, fp):
+        """Waits for a file being changed on disk to settle"""
+        if self.base is None: return # not watched anymore
+        self.RewatchFile(fp)
+        self.reloadTimer.start()
+
+    def RewatchFile(self, fp):
+        """Watches fp again, since it may have been replaced. The old file
+        is still watched instead if another program still has it open"""
+        if fp in self.watcher.files(): self.watcher.removePath(fp)
+        if os.path.exists(fp): self.watcher.addPath(fp)
+
+    def HandleReloadTimer(self):
+        """Starts reloading the file, if it changed"""
+        fp = self.fp
+        if fp is None or self.base is None: return
+        if self.IsBusy():
+            self.reloadTimer.start() # try again later
+            return
+
+        try: stat = os.stat(fp)
+        except OSError:
+            self.reloadTimer.start() # it's being replaced, probably
+            return
+        self.RewatchFile(fp)
+        if (stat.st_mtime_ns, stat.st_size) == self.diskStat: return # saved by us, or not changed
+
+        self.reloadThread = ReloadThread(fp)
+        self.reloadThread.finished.connect(self.HandleReloadDone)
+        self.statusMessage.emit('Reloading...')
+        self.reloadThread.start()
+
+    @nme_perf.Timed('Document.HandleReloadDone', slot=True)
+    def HandleReloadDone(self):
+        """Picks up the changes once the ReloadThread is done"""
+        thread = self.sender() # None if the file was closed and it was dropped
+        if thread is None or thread is not self.reloadThread: return
+        self.reloadThread = None
+        if thread.error is not None:
+            # Probably still being written, so wait for the next change
+            self.statusMessage.emit('%s changed on disk, but couldn\'t be reloaded: %s' % (thread.fp, thread.error))
+            return
+
+        # If a big, mapped file was rewritten in place, the unedited strings
+        # that were lost are filled in from the new one (see nme_reload.Recover)
+        reload = nme_reload.Reload(self.base, self.view.file, thread.file, thread.base)
+        self.view.ApplyReload(reload)
+        self.base = thread.base
+        self.diskStat = (thread.stat.st_mtime_ns, thread.stat.st_size)
+        self.statusMessage.emit('Reloaded from disk: %s' % reload.Summary())
+        self.changed.emit()
+        if reload.conflicts:
+            text = 'These unsaved changes conflict with changes made on disk. They were kept, and are highlighted:'
+            box = QtWidgets.QMessageBox(QtWidgets.QMessageBox.Warning, 'Reload', text, QtWidgets.QMessageBox.Ok, self.view)
+            box.setInformativeText('Conflicts: %d' % len(reload.conflicts))
+            box.setDetailedText('\n'.join(nme_reload.Describe(c) for c in reload.conflicts[:self.MaxDiagnostics]))
+            box.setAttribute(QtCore.Qt.WA_DeleteOnClose)
+            box.open() # don't block the next reload
+
+    def FinishReload(self):
+        """Waits for a reload in progress, if any, and drops it"""
+        if self.reloadThread is None: return
+        self.reloadThread.wait()
+        self.reloadThread = None
+
+
+
 class MainWindow(QtWidgets.QMainWindow):
-    """Main window"""
+    """Main window. Every open file gets a tab, and there can be two
+    rows of tabs side by side. Picking a message in one file picks the
+    one with the same ID in the others"""
+    MaxLoadedMessages = 1000000 # messages kept loaded before hidden tabs are unloaded
+
     def __init__(self):
         """Initialises the window"""
         QtWidgets.QMainWindow.__init__(self)
-        self.fp = None # file path
-
-        # Create the viewer
-        self.view = MessageViewer()
-        self.setCentralWidget(self.view)
+        self.docs = [] # open Documents, the most recently shown last
+        self.metrics = nme_layout.BuiltinMetrics() # glyph widths of the game font
+        self.alignedKey = None # (ID, n) of the last message picked, which every tab picks too
+        self.aligning = False # True while other tabs are picking it
+        self.perfDlg = None # PerformanceDlg, once it's been opened
+
+        # Two rows of tabs, the second of which is only shown side by side
+        self.panes = []
+        splitter = QtWidgets.QSplitter()
+        for i in range(2):
+            pane = QtWidgets.QTabWidget()
+            pane.setDocumentMode(True)
+            pane.setTabsClosable(True)
+            pane.setMovable(True)
+            pane.currentChanged.connect(self.HandleTabChanged)
+            pane.tabCloseRequested.connect(self.HandleTabClose)
+            pane.tabBarClicked.connect(self.HandleTabClicked)
+            splitter.addWidget(pane)
+            self.panes.append(pane)
+        self.panes[1].hide()
+        self.activePane = self.panes[0] # the one the current file is in
+        self.setCentralWidget(splitter)
+        QtWidgets.QApplication.instance().focusChanged.connect(self.HandleFocusChanged)
 
         # Create the menubar and a few actions
         self.CreateMenubar()
 
+        # Status bar, for messages from the current file
+        self.progress = QtWidgets.QProgressBar()
+        self.progress.setMaximumWidth(160)
+        self.progress.hide()
+        self.statusBar().addPermanentWidget(self.progress)
+        self.cancelBtn = QtWidgets.QPushButton('Cancel')
+        self.cancelBtn.setToolTip('<b>Cancel:</b><br>Stops opening the file')
+        self.cancelBtn.clicked.connect(self.HandleCancel)
+        self.cancelBtn.hide()
+        self.statusBar().addPermanentWidget(self.cancelBtn)
+
         # Set window title and show the window
         self.setWindowTitle('Newer Messages Editor')
+        self.UpdateActions()
         self.show()
 
     def CreateMenubar(self):
@@ -549,19 +1979,39 @@ class MainWindow(QtWidgets.QMainWindow):
         self.saveAct = f.addAction('Save File')
         self.saveAct.setShortcut('Ctrl+S')
         self.saveAct.triggered.connect(self.HandleSave)
-        self.saveAct.setEnabled(False)
 
         self.saveAsAct = f.addAction('Save File As...')
         self.saveAsAct.setShortcut('Ctrl+Shift+S')
         self.saveAsAct.triggered.connect(self.HandleSaveAs)
-        self.saveAsAct.setEnabled(False)
+
+        self.compactAct = f.addAction('Save Compact Files')
+        self.compactAct.setCheckable(True)
+        self.compactAct.setStatusTip('Stores identical strings, and strings that are the end of another one, only once, so the game needs less memory for the file')
+
+        self.closeAct = f.addAction('Close File')
+        self.closeAct.setShortcut('Ctrl+W')
+        self.closeAct.triggered.connect(self.HandleClose)
+
+        f.addSeparator()
+
+        importAct = f.addAction('Import Text...')
+        importAct.triggered.connect(self.HandleImport)
+
+        self.exportAct = f.addAction('Export Text...')
+        self.exportAct.triggered.connect(self.HandleExport)
 
         f.addSeparator()
 
         self.checkAct = f.addAction('Check for Duplicate IDs...')
         self.checkAct.setShortcut('Ctrl+I')
         self.checkAct.triggered.connect(self.HandleCheckIDs)
-        self.checkAct.setEnabled(False)
+
+        self.mergeAct = f.addAction('Merge Changes...')
+        self.mergeAct.setShortcut('Ctrl+M')
+        self.mergeAct.triggered.connect(self.HandleMerge)
+
+        fontAct = f.addAction('Load Message Box Font...')
+        fontAct.triggered.connect(self.HandleLoadFont)
 
         f.addSeparator()
 
@@ -569,78 +2019,389 @@ class MainWindow(QtWidgets.QMainWindow):
         exitAct.setShortcut('Ctrl+Q')
         exitAct.triggered.connect(self.HandleExit)
 
+        # Edit Menu
+        e = m.addMenu('&Edit')
+
+        self.undoAct = e.addAction('Undo')
+        self.undoAct.setShortcut(QtGui.QKeySequence.Undo)
+        self.undoAct.triggered.connect(self.HandleUndo)
+
+        self.redoAct = e.addAction('Redo')
+        self.redoAct.setShortcut(QtGui.QKeySequence.Redo)
+        self.redoAct.triggered.connect(self.HandleRedo)
+
+        # View Menu
+        v = m.addMenu('&View')
+
+        self.sideAct = v.addAction('Side by Side')
+        self.sideAct.setShortcut('Ctrl+\\')
+        self.sideAct.setCheckable(True)
+        self.sideAct.toggled.connect(self.HandleSideBySide)
+
+        self.moveAct = v.addAction('Move File to Other Side')
+        self.moveAct.setShortcut('Ctrl+Shift+\\')
+        self.moveAct.triggered.connect(self.HandleMoveTab)
+
         # Help Menu
         h = m.addMenu('&Help')
 
+        perfAct = h.addAction('Performance...')
+        perfAct.triggered.connect(self.HandlePerformance)
+
         aboutAct = h.addAction('About...')
         aboutAct.setShortcut('Ctrl+H')
         aboutAct.triggered.connect(self.HandleAbout)
 
 
+    @property
+    def doc(self):
+        """The Document of the current tab, or None"""
+        return self.DocumentOf(self.activePane.currentWidget())
+
+    @property
+    def view(self):
+        """The MessageViewer of the current tab, or None"""
+        doc = self.doc
+        return doc.view if doc is not None else None
+
+    def DocumentOf(self, widget):
+        """Returns the Document whose viewer is widget, or None"""
+        for doc in self.docs:
+            if doc.view is widget: return doc
+
+    def PaneOf(self, doc):
+        """Returns the pane doc's tab is in"""
+        for pane in self.panes:
+            if pane.indexOf(doc.view) != -1: return pane
+
+    def ShownDocuments(self):
+        """Returns the Documents whose tabs are shown"""
+        return [self.DocumentOf(pane.currentWidget()) for pane in self.panes
+            if pane.isVisible() and pane.currentWidget() is not None]
+
+    def UpdateActions(self):
+        """Enables/disables actions, and shows the current file's progress"""
+        doc = self.doc
+        ready = doc is not None and doc.loaded and doc.loadThread is None
+        self.saveAct.setEnabled(ready and doc.fp is not None and doc.saveThread is None)
+        self.saveAsAct.setEnabled(ready and doc.saveThread is None)
+        self.closeAct.setEnabled(doc is not None)
+        self.exportAct.setEnabled(ready)
+        self.checkAct.setEnabled(ready)
+        self.mergeAct.setEnabled(ready)
+        self.undoAct.setEnabled(ready and doc.view.history.CanUndo())
+        self.redoAct.setEnabled(ready and doc.view.history.CanRedo())
+        self.moveAct.setEnabled(doc is not None)
+
+        progress = doc.progress if doc is not None else None
+        if progress is not None:
+            self.progress.setMaximum(progress[1])
+            self.progress.setValue(progress[0])
+        self.progress.setVisible(progress is not None)
+        self.cancelBtn.setVisible(doc is not None and doc.loadThread is not None)
+
+    def AddDocument(self, doc, show=True):
+        """Gives doc a tab, and shows it if show is True"""
+        self.docs.insert(0, doc)
+        doc.changed.connect(self.HandleDocumentChanged)
+        doc.statusMessage.connect(self.HandleStatusMessage)
+        doc.loadFinished.connect(self.HandleLoadFinished)
+        doc.view.messageSelected.connect(self.HandleMessageSelected)
+        pane = self.activePane
+        pane.addTab(doc.view, doc.TabText())
+        pane.setTabToolTip(pane.indexOf(doc.view), doc.fp or '')
+        if show: pane.setCurrentWidget(doc.view)
+        self.UpdatePeers()
+
+    def CloseDocument(self, doc):
+        """Closes doc's tab"""
+        doc.Close()
+        self.docs.remove(doc)
+        pane = self.PaneOf(doc)
+        pane.removeTab(pane.indexOf(doc.view))
+        doc.view.deleteLater()
+        self.UpdatePeers()
+        self.UpdateActions()
+
+    def UpdatePeers(self):
+        """Lets every file suggest similar messages from all of them"""
+        peers = []
+        for pane in self.panes:
+            for i in range(pane.count()):
+                doc = self.DocumentOf(pane.widget(i))
+                peers.append((doc.Name(), doc.view))
+        for doc in self.docs:
+            if doc.view.peers != peers: doc.view.SetPeers(peers)
+
+    def HandleDocumentChanged(self):
+        """Updates doc's tab, and the actions if it's the current one"""
+        doc = self.sender()
+        pane = self.PaneOf(doc)
+        if pane is None: return # closed
+        pane.setTabText(pane.indexOf(doc.view), doc.TabText())
+        pane.setTabToolTip(pane.indexOf(doc.view), doc.fp or '')
+        self.UpdatePeers() # it may have been saved under a new name
+        if doc is self.doc: self.UpdateActions()
+
+    def HandleStatusMessage(self, text):
+        """Shows status messages from the current file"""
+        if self.sender() is self.doc: self.statusBar().showMessage(text)
+
+    def HandleTabChanged(self):
+        """Loads the file of a tab when it's shown, and picks the message
+        picked in the others"""
+        pane = self.sender()
+        doc = self.DocumentOf(pane.currentWidget())
+        if doc is not None:
+            self.docs.remove(doc)
+            self.docs.append(doc)
+            doc.Load()
+            if doc.loaded: self.Align(doc)
+        self.ReleaseMemory()
+        if pane is self.activePane: self.UpdateActions()
+
+    def HandleTabClicked(self):
+        """Makes the pane whose tab was clicked the active one"""
+        self.SetActivePane(self.sender())
+
+    def HandleFocusChanged(self, old, new):
+        """Makes the pane the focus moved into the active one"""
+        for pane in self.panes:
+            if new is not None and pane.isAncestorOf(new): self.SetActivePane(pane)
+
+    def SetActivePane(self, pane):
+        """Changes which pane the current file is in"""
+        if pane is self.activePane: return
+        self.activePane = pane
+        self.UpdateActions()
+
+    def HandleLoadFinished(self, ok):
+        """Picks the message picked in the others in a file that was
+        just loaded, or closes its tab if it couldn't be"""
+        doc = self.sender()
+        if not ok:
+            self.CloseDocument(doc)
+            return
+        if doc in self.ShownDocuments(): self.Align(doc)
+        self.ReleaseMemory()
+
+    def HandleMessageSelected(self, key):
+        """Picks the same message in the other files that are shown. The
+        rest pick it once they're shown"""
+        if self.aligning: return
+        self.alignedKey = key
+        sender = self.DocumentOf(self.sender())
+        for doc in self.ShownDocuments():
+            if doc is not sender: self.Align(doc)
+
+        # Point out files the message is missing from
+        missing = [doc.Name() for doc in self.docs if doc.loaded and doc.view.file is not None and not doc.view.file.FindId(key[0])]
+        if missing: self.statusBar().showMessage('Message %d isn\'t in %s' % (key[0], ', '.join(missing)))
+
+    def Align(self, doc):
+        """Picks the message with self.alignedKey in doc"""
+        if self.alignedKey is None or doc.view.file is None: return
+        self.aligning = True
+        try: doc.view.SelectKey(self.alignedKey)
+        finally: self.aligning = False
+
+    def ReleaseMemory(self):
+        """Unloads the files of hidden tabs, least recently shown first,
+        while more than MaxLoadedMessages messages are loaded"""
+        loaded = sum(doc.MessageCount() for doc in self.docs)
+        shown = self.ShownDocuments()
+        for doc in list(self.docs):
+            if loaded <= self.MaxLoadedMessages: break
+            if doc in shown: continue
+            count = doc.MessageCount()
+            if doc.Unload(): loaded -= count
+
+    def closeEvent(self, event):
+        """Lets saves finish before the window closes"""
+        for doc in self.docs: doc.Close()
+        event.accept()
+
     def HandleNew(self):
         """Handles creating a new file"""
-        f = MessagesBin()
-        self.view.setFile(f)
-        self.saveAsAct.setEnabled(True)
-        self.checkAct.setEnabled(True)
+        self.AddDocument(Document(file=MessagesBin(), metrics=self.metrics))
 
     def HandleOpen(self):
-        """Handles file opening"""
-        fp = QtWidgets.QFileDialog.getOpenFileName(self, 'Open File', '', 'Binary Files (*.bin);;All Files (*)')[0]
-        if fp == '': return
-        self.fp = fp
-
-        # Open the file
-        file = open(fp, 'rb')
-        data = file.read()
-        file.close()
-
-        if sys.version[0] == '2': # Py2
-            # convert the str to a list
-            new = []
-            for char in data: new.append(ord(char))
-            data = new
-        
-        M = MessagesBin(data)
-
-        # Update the viewer with this data
-        self.view.setFile(M)
-
-        # Enable saving
-        self.saveAct.setEnabled(True)
-        self.saveAsAct.setEnabled(True)
-        self.checkAct.setEnabled(True)
+        """Handles file opening. Each file gets a tab, and is loaded
+        once it's shown"""
+        fps = QtWidgets.QFileDialog.getOpenFileNames(self, 'Open File', '', 'Binary Files (*.bin);;All Files (*)')[0]
+        first = None
+        for fp in fps:
+            # Files that are already open are just shown
+            for doc in self.docs:
+                if doc.fp is not None and os.path.normcase(os.path.abspath(doc.fp)) == os.path.normcase(os.path.abspath(fp)): break
+            else:
+                doc = Document(fp, metrics=self.metrics)
+                self.AddDocument(doc, False)
+            first = first or doc
+
+        # Only the file that's shown is loaded for now
+        if first is not None: self.PaneOf(first).setCurrentWidget(first.view)
+
+    def HandleCancel(self):
+        """Stops opening the current file"""
+        if self.doc is not None: self.doc.FinishLoad()
+
+    def HandleClose(self):
+        """Closes the current file"""
+        if self.doc is not None: self.HandleTabClose(self.activePane.currentIndex(), self.activePane)
+
+    def HandleTabClose(self, index, pane=None):
+        """Closes a file, checking first if it has unsaved changes"""
+        pane = pane or self.sender()
+        doc = self.DocumentOf(pane.widget(index))
+        if doc.IsModified():
+            answer = QtWidgets.QMessageBox.question(self, 'Close File', '%s has unsaved changes. Close it anyway?' % doc.Name())
+            if answer != QtWidgets.QMessageBox.Yes: return
+        self.CloseDocument(doc)
 
     def HandleSave(self):
         """Handles file saving"""
-        data = self.view.saveFile()
-
-        # Save to the file
-        file = open(self.fp, 'wb')
-        file.write(data)
-        file.close()
+        self.doc.Save(self.compactAct.isChecked())
 
     def HandleSaveAs(self):
         """Handles saving to a new file"""
         fp = QtWidgets.QFileDialog.getSaveFileName(self, 'Save File', '', 'Binary Files (*.bin);;All Files (*)')[0]
         if fp == '': return
-        self.fp = fp
 
-        # Save it
-        self.HandleSave()
+        # Save it (Save File is enabled once it's done)
+        self.doc.Save(self.compactAct.isChecked(), fp)
+
+    def HandleImport(self):
+        """Handles importing a JSON Lines or CSV file as a new file"""
+        fp = QtWidgets.QFileDialog.getOpenFileName(self, 'Import Text', '', TextFilter)[0]
+        if fp == '': return
 
-        # Enable saving
-        self.saveAct.setEnabled(True)
+        f = MessagesBin()
+        try:
+            with nme_textio.OpenText(fp) as file:
+                f.Messages = list(nme_textio.Import(file, nme_textio.FormatFromPath(fp, 'jsonl')))
+        except Exception as e:
+            QtWidgets.QMessageBox.warning(self, 'Import Text', 'The file could not be imported:\n%s' % e)
+            return
+
+        # Treat it like a new file
+        self.AddDocument(Document(file=f, metrics=self.metrics, saved=False))
+
+    def HandleExport(self):
+        """Handles exporting to a JSON Lines or CSV file"""
+        fp = QtWidgets.QFileDialog.getSaveFileName(self, 'Export Text', '', TextFilter)[0]
+        if fp == '': return
+
+        # Through a temporary file, so a failed export leaves the old file alone
+        format = nme_textio.FormatFromPath(fp, 'jsonl')
+        try: ReplaceFile(fp, lambda file: nme_textio.ExportTo(self.view.file.Messages, file, format))
+        except Exception as e:
+            QtWidgets.QMessageBox.warning(self, 'Export Text', 'The file could not be exported:\n%s' % e)
 
     def HandleCheckIDs(self):
         """Handles checking for duplicate Msg IDs"""
         dlg = CheckDuplicateIDsDlg(self.view.file)
         dlg.exec_() # we don't need to do anything else
 
+    def HandleMerge(self):
+        """Handles merging the changes made to another copy of the file
+        into this one, given the file both were made from"""
+        fps = []
+        for title in ('Merge Changes: Open the Original File', 'Merge Changes: Open the Other Copy'):
+            fp = QtWidgets.QFileDialog.getOpenFileName(self, title, '', 'Binary Files (*.bin);;All Files (*)')[0]
+            if fp == '': return
+            fps.append(fp)
+
+        files = []
+        try:
+            for fp in fps:
+                files.append(OpenFile(fp))
+                if any(d.severity == Diagnostic.Error for d in files[-1].diagnostics):
+                    raise ValueError('%s is damaged' % fp)
+
+            base, theirs = files
+            merge = nme_merge.Merge(base, self.view.file, theirs)
+            if merge.conflicts and MergeDlg(merge, self).exec_() != QtWidgets.QDialog.Accepted: return
+            merge.Apply()
+        except Exception as e:
+            QtWidgets.QMessageBox.warning(self, 'Merge Changes', 'The changes could not be merged:\n%s' % e)
+            return
+        finally:
+            for file in files:
+                if isinstance(file, LazyMessagesBin): file.close()
+
+        # The merged messages replace the old ones, so start over
+        self.view.setFile(self.view.file)
+        self.doc.savedChanges = -1 # not saved anywhere yet
+        self.doc.changed.emit()
+        self.statusBar().showMessage('Merged %d changes, %d conflicts' % (merge.changes, len(merge.conflicts)))
+
+    def HandleLoadFont(self):
+        """Handles loading the game's message font, so the preview and
+        overflow checks use its exact glyph widths"""
+        fp = QtWidgets.QFileDialog.getOpenFileName(self, 'Load Message Box Font', '', 'Wii Fonts (*.brfnt);;All Files (*)')[0]
+        if fp == '': return
+
+        try:
+            with open(fp, 'rb') as file: metrics = nme_layout.ReadBrfnt(file.read(), os.path.basename(fp))
+        except (OSError, ValueError) as e:
+            QtWidgets.QMessageBox.warning(self, 'Load Message Box Font', 'The font could not be loaded:\n%s' % e)
+            return
+
+        self.metrics = metrics
+        for doc in self.docs: doc.view.SetMetrics(metrics)
+        self.statusBar().showMessage('Checking messages with the glyph widths of %s' % metrics.name)
+
+    def HandleUndo(self):
+        """Undoes the last change to the current file"""
+        if self.view is not None: self.view.Undo()
+
+    def HandleRedo(self):
+        """Redoes the last undone change to the current file"""
+        if self.view is not None: self.view.Redo()
+
+    def HandleSideBySide(self, checked):
+        """Shows or hides the second row of tabs. Hiding it moves its
+        tabs back to the first"""
+        first, second = self.panes
+        if not checked:
+            while second.count():
+                self.MoveTab(self.DocumentOf(second.widget(0)), first)
+            self.SetActivePane(first)
+        second.setVisible(checked)
+        self.UpdateActions()
+
+    def HandleMoveTab(self):
+        """Moves the current file to the other row of tabs, showing it if needed"""
+        doc = self.doc
+        if doc is None: return
+        other = self.panes[1] if self.activePane is self.panes[0] else self.panes[0]
+        if not self.sideAct.isChecked(): self.sideAct.setChecked(True)
+        self.MoveTab(doc, other)
+        self.SetActivePane(other)
+
+    def MoveTab(self, doc, pane):
+        """Moves doc's tab to pane"""
+        old = self.PaneOf(doc)
+        old.removeTab(old.indexOf(doc.view))
+        pane.addTab(doc.view, doc.TabText())
+        pane.setTabToolTip(pane.indexOf(doc.view), doc.fp or '')
+        pane.setCurrentWidget(doc.view)
+
     def HandleExit(self):
         """Exits"""
+        for doc in self.docs:
+            doc.FinishSave()
+            doc.FinishReload()
         raise SystemExit
 
+    def HandlePerformance(self):
+        """Shows the Performance dialog, which stays open while you work"""
+        if self.perfDlg is None: self.perfDlg = PerformanceDlg(self)
+        else: self.perfDlg.timer.start()
+        self.perfDlg.show()
+        self.perfDlg.raise_()
+
     def HandleAbout(self):
         """Shows the About dialog"""
         try: readme = open('readme.md', 'r').read()
@@ -673,7 +2434,8 @@ class MainWindow(QtWidgets.QMainWindow):
 # Main function
 def main():
     """Main startup function"""
-    app = QtWidgets.QApplication(sys.argv)
+    app = QtWidgets.QApplication(nme_perf.EnableFromArgs(sys.argv))
     mainWindow = MainWindow()
     sys.exit(app.exec_())
-main()
+
+if __name__ == '__main__': main()
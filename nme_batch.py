@@ -0,0 +1,153 @@
+#!/usr/bin/python
+# -*- coding: latin-1 -*-
+
+# Newer Messages Editor - Edits NewerSMBW's messages.bin
+# Version 1.3
+# Copyright (C) 2013-2014 RoadrunnerWMC
+
+# This file is part of Newer Messages Editor.
+
+# Newer Messages Editor is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Newer Messages Editor is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Newer Messages Editor.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# nme_batch.py
+# Runs checks over many messages.bin files at once (every language of
+# every build of a mod, say), spreading the files over a process pool.
+# Each file is handled on its own, so a corrupt one can't stop the rest
+
+
+################################################################
+################################################################
+
+# Imports
+import collections, concurrent.futures, fnmatch, os, time
+
+from nme_core import Diagnostic, MessagesBin, ReplaceFile
+import nme_strings
+
+
+# Files picked up when a directory is given
+DefaultPattern = '*.bin'
+
+
+def FindFiles(paths, pattern=DefaultPattern):
+    """Returns the files in paths, searching directories recursively
+    for files matching pattern"""
+    files = []
+    for path in paths:
+        if not os.path.isdir(path):
+            files.append(path)
+            continue
+
+        for dir, dirs, names in os.walk(path):
+            dirs.sort()
+            for name in sorted(names):
+                if fnmatch.fnmatch(name.lower(), pattern.lower()): files.append(os.path.join(dir, name))
+
+    return files
+
+
+def FileStats(file, size):
+    """Returns statistics about a parsed file whose data is size bytes"""
+    messages = file.Messages
+    ids = set(msg.id for msg in messages)
+
+    # Lengths are in UTF-16 code units (characters outside the BMP take
+    # two), which the sizes of the strings in file data give without
+    # decoding them
+    sizes = [file.MessageSizes(msg) for msg in messages]
+    titles = [title // 2 - 1 for title, text in sizes]
+    texts = [text // 2 - 1 for title, text in sizes]
+    return collections.OrderedDict([
+        ('bytes', size),
+        ('messages', len(messages)),
+        ('unique_ids', len(ids)),
+        ('min_id', min(ids) if ids else None),
+        ('max_id', max(ids) if ids else None),
+        ('title_units', sum(titles)),
+        ('text_units', sum(texts)),
+        ('longest_title_units', max(titles or [0])),
+        ('longest_text_units', max(texts or [0])),
+        ])
+
+
+def ProcessFile(path, normalize=False):
+    """Parses, validates and gathers statistics about one file. Returns
+    a dict describing it; nothing is raised, errors are reported in it"""
+    result = collections.OrderedDict([('file', path), ('ok', False), ('error', None)])
+    start = time.perf_counter()
+    try:
+        with open(path, 'rb') as f: data = f.read()
+
+        file = MessagesBin(data)
+        result['diagnostics'] = [d.toPyObject() for d in file.diagnostics]
+        damaged = any(d.severity == Diagnostic.Error for d in file.diagnostics)
+        result['duplicates'] = {id: count for id, count in sorted(file.ids.Duplicates().items())}
+        result['stats'] = FileStats(file, len(data))
+
+        # Files written by anything but this editor may have their
+        # strings laid out differently; saving them puts them in order.
+        # Damaged files are left alone, since that would lose whatever
+        # couldn't be read for good. Compacted files are fine as they are
+        saved = file.save()
+        result['canonical'] = saved == data or (len(data) < len(saved) and file.save(compact=True) == data)
+        result['normalized'] = False
+        if normalize and not result['canonical'] and not damaged:
+            ReplaceFile(path, lambda f: f.write(saved))
+            result['normalized'] = True
+
+        result['ok'] = not result['duplicates'] and not file.diagnostics
+    except Exception as e:
+        result['error'] = str(e) or type(e).__name__
+
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def ProcessFiles(files, normalize=False, jobs=None):
+    """Runs ProcessFile on every file, on up to jobs processes (default:
+    one per CPU). Yields the results in the same order as files"""
+    files = list(files)
+    if jobs is None: jobs = os.cpu_count() or 1
+    jobs = max(1, min(jobs, len(files)))
+
+    # Not worth starting any processes for
+    if jobs == 1:
+        for path in files: yield ProcessFile(path, normalize)
+        return
+
+    # Hand the files out a few at a time, so that there's little
+    # overhead with lots of small files, but the work still evens out
+    chunksize = max(1, len(files) // (jobs * 8))
+    with concurrent.futures.ProcessPoolExecutor(jobs, initializer=nme_strings.SetErrors, initargs=(nme_strings.Errors,)) as pool:
+        yield from pool.map(ProcessFile, files, [normalize] * len(files), chunksize=chunksize)
+
+
+def Report(results, seconds=None):
+    """Combines the results of ProcessFiles into one report"""
+    results = list(results)
+    report = collections.OrderedDict([
+        ('files', len(results)),
+        ('ok', sum(1 for r in results if r['ok'])),
+        ('failed', sum(1 for r in results if r['error'] is not None)),
+        ('with_problems', sum(1 for r in results if r.get('diagnostics'))),
+        ('with_duplicates', sum(1 for r in results if r.get('duplicates'))),
+        ('non_canonical', sum(1 for r in results if r['error'] is None and not r['canonical'])),
+        ('normalized', sum(1 for r in results if r.get('normalized'))),
+        ('messages', sum(r['stats']['messages'] for r in results if 'stats' in r)),
+        ('bytes', sum(r['stats']['bytes'] for r in results if 'stats' in r)),
+        ('seconds', seconds),
+        ('results', results),
+        ])
+    return report
@@ -0,0 +1,332 @@
+#!/usr/bin/python
+# -*- coding: latin-1 -*-
+
+# Newer Messages Editor - Edits NewerSMBW's messages.bin
+# Version 1.3
+# Copyright (C) 2013-2014 RoadrunnerWMC
+
+# This file is part of Newer Messages Editor.
+
+# Newer Messages Editor is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Newer Messages Editor is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Newer Messages Editor.  If not, see <http://www.gnu.org/licenses/>.
+
+
+
+# nme_build.py
+# Builds messages.bin from a source directory with one text file per
+# message, which suits keeping messages in version control, and splits
+# messages.bin files into one. The file data of each message is cached,
+# keyed by its source file's mtime and content hash, so rebuilding only
+# reads and encodes the files that changed, and stitches the rest of the
+# file together from the cache.
+
+
+################################################################
+################################################################
+
+# Imports
+import array, collections, hashlib, itertools, json, os, re, struct, sys, time
+
+from nme_core import MessagesBin, ReplaceFile
+import nme_perf, nme_strings
+
+
+# Source files are named after the ID of their message, optionally
+# followed by a label: 1234.txt, 1234_intro.txt
+SourceExtension = '.txt'
+SourceName = re.compile(r'(-?\d+)(_.*)?\.txt$', re.IGNORECASE | re.DOTALL)
+
+CacheExtension = '.cache' # added to the output path for the default cache
+CacheMagic = b'NMEC'
+CacheVersion = 1
+HashSize = 16 # bytes of each source file's content hash
+
+# Files modified this close to a build may be modified again without
+# their mtime changing, so they're hashed again on the next one
+RacyWindow = 2 * 10**9 # ns
+
+
+def NaturalKey(label):
+    """Sort key that puts _2 before _10"""
+    return tuple(int(part) if part.isdigit() else part for part in re.split(r'(\d+)', label.lower()))
+
+
+def SourceFiles(dir):
+    """Returns the source files in dir as (name, ID, os.DirEntry), in
+    the order their messages go in the file: by ID, and then by label"""
+    files = []
+    with os.scandir(dir) as entries:
+        for entry in entries:
+            match = SourceName.match(entry.name)
+            if match is None or not entry.is_file(): continue
+            label = match.group(2)
+            files.append((int(match.group(1)), NaturalKey(label) if label else (), entry.name, entry))
+    files.sort(key=lambda file: file[:2])
+    return [(name, id, entry) for id, key, name, entry in files]
+
+
+def ParseSource(data):
+    """Returns the title and text in source file data. The first line is
+    the title and the rest is the text, without the last line break"""
+    text = data.decode('utf-8', 'surrogatepass')
+    if text.startswith('\ufeff'): text = text[1:] # byte order mark
+    text = text.replace('\r\n', '\n')
+    title, sep, text = text.partition('\n')
+    if text.endswith('\n'): text = text[:-1]
+    return title, text
+
+
+def FormatSource(msg):
+    """Returns the source file data of msg"""
+    if '\n' in msg.title or '\r' in msg.title:
+        raise ValueError('The title of message %d has a line break, which can\'t go in a source file' % msg.id)
+    return (msg.title + '\n' + msg.text + '\n').encode('utf-8', 'surrogatepass')
+
+
+def SourceFileNames(messages):
+    """Yields a source file name for each message in the list messages.
+    Messages with the same ID are numbered after the first: 5.txt, 5_2.txt"""
+    counts = {}
+    for msg in messages:
+        n = counts[msg.id] = counts.get(msg.id, 0) + 1
+        yield '%d%s%s' % (msg.id, '_%d' % n if n > 1 else '', SourceExtension)
+
+
+################################################################
+################################################################
+################################################################
+############################ Cache #############################
+
+
+class BuildCache():
+    """The file data of each message built so far, along with the name,
+    mtime, size and content hash of its source file, in the order they
+    were built. Saved as a JSON header with the names, then columns of
+    numbers, the hashes and the data, so that it loads quickly"""
+    def __init__(self):
+        """Inits the BuildCache"""
+        self.names = [] # source file names
+        self.mtimes = array.array('q')
+        self.sizes = array.array('q')
+        self.titleSizes = array.array('I') # bytes of each message's data that are its title
+        self.hashes = bytearray() # HashSize bytes each
+        self.data = [] # title and text of each message, as file data
+        self.errors = nme_strings.Errors # strings are encoded with this policy
+        self.output = None # (path, mtime, size) of the file built last
+
+    def Add(self, name, mtime, size, hash, titleSize, data):
+        """Adds an entry"""
+        self.names.append(name)
+        self.mtimes.append(mtime)
+        self.sizes.append(size)
+        self.hashes += hash
+        self.titleSizes.append(titleSize)
+        self.data.append(data)
+
+    def Hash(self, i):
+        """Returns the content hash of the ith entry"""
+        return bytes(self.hashes[i * HashSize:(i + 1) * HashSize])
+
+    @staticmethod
+    def Load(fp):
+        """Loads a cache from fp. An empty one is returned if it's
+        missing, damaged or was made with other settings"""
+        cache = BuildCache()
+        try:
+            with open(fp, 'rb') as file: data = file.read()
+            if data[:4] != CacheMagic: return cache
+            size, = struct.unpack_from('>I', data, 4)
+            header = json.loads(data[8:8 + size].decode('utf-8', 'surrogatepass'))
+            if header['version'] != CacheVersion or header['errors'] != cache.errors: return cache
+
+            names = header['names']
+            count = len(names)
+            pos = 8 + size
+            columns = [cache.mtimes, cache.sizes, cache.titleSizes, array.array('I')]
+            for column in columns:
+                end = pos + column.itemsize * count
+                column.frombytes(data[pos:end])
+                if sys.byteorder != 'little': column.byteswap()
+                pos = end
+            cache.hashes = bytearray(data[pos:pos + HashSize * count])
+            pos += HashSize * count
+
+            # The data of each message follows the last one's
+            blobs = memoryview(data)
+            ends = list(itertools.accumulate(itertools.chain((pos,), columns[3])))
+            if ends[-1] != len(data): raise ValueError('The cache is cut off')
+            cache.data = [blobs[a:b] for a, b in zip(ends, ends[1:])]
+            cache.names = names
+            cache.output = tuple(header['output']) if header['output'] is not None else None
+        except (OSError, ValueError, KeyError, TypeError, struct.error):
+            return BuildCache()
+        return cache
+
+    def Save(self, fp):
+        """Saves the cache to fp"""
+        header = {'version': CacheVersion, 'errors': self.errors, 'output': self.output, 'names': self.names}
+        header = json.dumps(header, ensure_ascii=False, separators=(',', ':')).encode('utf-8', 'surrogatepass')
+        dataSizes = array.array('I', map(len, self.data))
+
+        def Write(file):
+            """Writes the cache"""
+            file.write(CacheMagic + struct.pack('>I', len(header)))
+            file.write(header)
+            for column in (self.mtimes, self.sizes, self.titleSizes, dataSizes):
+                if sys.byteorder != 'little':
+                    column = array.array(column.typecode, column)
+                    column.byteswap()
+                file.write(column.tobytes())
+            file.write(self.hashes)
+            file.writelines(self.data)
+        ReplaceFile(fp, Write)
+
+
+################################################################
+################################################################
+################################################################
+########################### Building ###########################
+
+
+def Stitch(ids, titleSizes, data):
+    """Returns messages.bin data made of the file data of each message
+    (data[i], whose first titleSizes[i] bytes are the title, is that of
+    the message with ID ids[i])"""
+    # Laid out just like MessagesBin.save: the table, then the title and
+    # text of each message in order
+    count = len(ids)
+    table = bytearray(4 + 12 * count)
+    struct.pack_into('>I', table, 0, count)
+    pack_into = struct.pack_into
+    offset, pos = len(table), 4
+    for id, titleSize, blob in zip(ids, titleSizes, data):
+        pack_into('>III', table, pos, id + 0x100, offset, offset + titleSize)
+        offset += len(blob)
+        pos += 12
+    return table + b''.join(data)
+
+
+def OutputStat(output):
+    """Returns what the cache records about the output file, or None if it doesn't exist"""
+    try: stat = os.stat(output)
+    except OSError: return None
+    return (os.path.abspath(output), stat.st_mtime_ns, stat.st_size)
+
+
+def Unchanged(sourceDir, cache):
+    """Returns True if the source files in sourceDir are the ones in
+    cache, with the same mtimes and sizes. Their order only depends on
+    their names, so it's the same too"""
+    known = set(cache.names)
+    names = [name for name in os.listdir(sourceDir) if name in known or SourceName.match(name)]
+    if len(names) != len(known): return False
+
+    prefix = os.path.join(sourceDir, '')
+    for name, mtime, size in zip(cache.names, cache.mtimes, cache.sizes):
+        try: stat = os.stat(prefix + name)
+        except OSError: return False
+        if stat.st_mtime_ns != mtime or stat.st_size != size: return False
+    return True
+
+
+@nme_perf.Timed('nme_build.Build')
+def Build(sourceDir, output, cacheFp=None, force=False):
+    """Builds messages.bin at output from the source files in
+    sourceDir, using the cache at cacheFp (default: next to output),
+    unless force is True. Returns a dict describing the build"""
+    start = time.perf_counter()
+    startNs = int(time.time() * 10**9)
+    if cacheFp is None: cacheFp = output + CacheExtension
+    old = BuildCache() if force else BuildCache.Load(cacheFp)
+
+    # Nothing to do if the output is still what was written last time,
+    # and none of the source files changed
+    if old.output is not None and OutputStat(output) == old.output and Unchanged(sourceDir, old):
+        return Result(len(old.names), 0, 0, False, old.output[2], start)
+    files = SourceFiles(sourceDir)
+    stats = [entry.stat() for name, id, entry in files]
+    names = [name for name, id, entry in files]
+
+    # A file whose mtime and size did change is read, and only encoded
+    # if its content hash changed too
+    cache = BuildCache()
+    oldRows = dict(zip(old.names, itertools.count()))
+    read = encoded = 0
+    for (name, id, entry), stat in zip(files, stats):
+        i = oldRows.get(name)
+        mtime = stat.st_mtime_ns
+        if mtime > startNs - RacyWindow: mtime = 0 # could still change without this changing, so hash it next time
+        if i is not None and old.mtimes[i] == stat.st_mtime_ns and old.sizes[i] == stat.st_size:
+            cache.Add(name, mtime, stat.st_size, old.Hash(i), old.titleSizes[i], old.data[i])
+            continue
+
+        with open(entry.path, 'rb') as file: data = file.read()
+        read += 1
+        hash = hashlib.blake2b(data, digest_size=HashSize).digest()
+        if i is not None and old.Hash(i) == hash:
+            cache.Add(name, mtime, stat.st_size, hash, old.titleSizes[i], old.data[i])
+            continue
+
+        try:
+            title, text = ParseSource(data)
+            title, text = MessagesBin.EncodeString(title), MessagesBin.EncodeString(text)
+        except ValueError as e: raise ValueError('%s: %s' % (entry.path, e)) # including lone surrogates, with strict errors
+        cache.Add(name, mtime, stat.st_size, hash, len(title), title + text)
+        encoded += 1
+
+    # The file only needs writing if a message changed, or it did
+    written = encoded or names != old.names or old.output is None or OutputStat(output) != old.output
+    if written:
+        data = Stitch([id for name, id, entry in files], cache.titleSizes, cache.data)
+        ReplaceFile(output, lambda file: file.write(data))
+    cache.output = OutputStat(output)
+    cache.Save(cacheFp)
+    return Result(len(files), read, encoded, written, cache.output[2], start)
+
+
+def Result(messages, read, encoded, written, size, start):
+    """Returns the dict that describes a build"""
+    return collections.OrderedDict([
+        ('messages', messages),
+        ('read', read),
+        ('encoded', encoded),
+        ('written', bool(written)),
+        ('bytes', size),
+        ('seconds', time.perf_counter() - start),
+        ])
+
+
+def Split(messages, dir, clean=False):
+    """Writes a source file for each message into dir, which is created
+    if needed. Files that wouldn't change are left alone, so their
+    mtimes stay put. If clean is True, other source files in dir are
+    removed. Returns the number of files written"""
+    messages = list(messages)
+    os.makedirs(dir, exist_ok=True)
+    names = set()
+    written = 0
+    for msg, name in zip(messages, SourceFileNames(messages)):
+        data = FormatSource(msg)
+        names.add(name)
+        path = os.path.join(dir, name)
+        try:
+            with open(path, 'rb') as file:
+                if file.read() == data: continue
+        except OSError: pass
+        with open(path, 'wb') as file: file.write(data)
+        written += 1
+
+    if clean:
+        for name, id, entry in SourceFiles(dir):
+            if name not in names: os.remove(os.path.join(dir, name))
+    return written
@@ -0,0 +1,560 @@
+#!/usr/bin/python
+# -*- coding: latin-1 -*-
+
+# Newer Messages Editor - Edits NewerSMBW's messages.bin
+# Version 1.3
+# Copyright (C) 2013-2014 RoadrunnerWMC
+
+# This file is part of Newer Messages Editor.
+
+# Newer Messages Editor is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Newer Messages Editor is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Newer Messages Editor.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# nme_cli.py
+# Command-line interface for Newer Messages Editor. It doesn't need
+# PyQt, so it's suitable for build scripts. Run with --help for usage.
+
+
+################################################################
+################################################################
+
+# Imports
+import argparse, collections, contextlib, json, multiprocessing, os, sys, time
+
+from nme_core import version, Diagnostic, Message, MessagesBin, ParseData, ReplaceFile
+import nme_batch, nme_build, nme_diff, nme_merge, nme_perf, nme_strings, nme_textio
+
+
+################################################################
+################################################################
+################################################################
+########################## File I/O ############################
+
+
+def ReadInput(path, binary=True):
+    """Returns the contents of path, or of stdin if path is '-'"""
+    if path == '-':
+        data = sys.stdin.buffer.read()
+        return data if binary else data.decode('utf-8')
+
+    if binary:
+        with open(path, 'rb') as file: return file.read()
+    with open(path, 'r', encoding='utf-8') as file: return file.read()
+
+
+def WriteOutput(path, data):
+    """Writes data (bytes or str) to path, or to stdout if path is '-'"""
+    if path == '-':
+        if isinstance(data, str): data = data.encode('utf-8')
+        sys.stdout.buffer.write(data)
+        sys.stdout.flush()
+        return
+
+    if isinstance(data, str):
+        with open(path, 'w', encoding='utf-8') as file: file.write(data)
+    else:
+        with open(path, 'wb') as file: file.write(data)
+
+
+@contextlib.contextmanager
+def OpenInputText(path):
+    """Opens path (or stdin, for '-') for streaming text input"""
+    if path != '-':
+        with nme_textio.OpenText(path) as file: yield file
+        return
+
+    file = nme_textio.WrapText(sys.stdin.buffer)
+    try: yield file
+    finally: file.detach() # leave stdin open
+
+
+@contextlib.contextmanager
+def OpenOutputText(path):
+    """Opens path (or stdout, for '-') for streaming text output"""
+    if path != '-':
+        with nme_textio.OpenText(path, 'w') as file: yield file
+        return
+
+    file = nme_textio.WrapText(sys.stdout.buffer)
+    try: yield file
+    finally:
+        file.flush()
+        file.detach() # leave stdout open
+
+
+def WriteOutputBinary(path, write):
+    """Calls write(file) to stream binary output to path (or stdout, for
+    '-'). Files are written through a temporary file (see ReplaceFile),
+    so if anything goes wrong, what was there before is left alone"""
+    if path == '-':
+        write(sys.stdout.buffer)
+        sys.stdout.buffer.flush()
+    else: ReplaceFile(path, write)
+
+
+def OutputPath(args, path, ext):
+    """Picks where the output for input file path should go"""
+    if args.output is not None: return args.output
+    if args.output_dir is not None:
+        name = 'stdin' if path == '-' else os.path.basename(path)
+        return os.path.join(args.output_dir, os.path.splitext(name)[0] + ext)
+
+    # A single input goes to stdout, several go next to their inputs
+    if len(args.files) == 1 or path == '-': return '-'
+    return os.path.splitext(path)[0] + ext
+
+
+def ParseFile(data):
+    """Parses messages.bin data. Problems with it are listed in
+    file.diagnostics, and whatever's readable is kept"""
+    return ParseData(data)
+
+
+def Problem(path, message):
+    """Prints a problem with a file to stderr"""
+    sys.stderr.write('%s: %s\n' % (path, message))
+
+
+def ReportDiagnostics(path, diagnostics):
+    """Prints the problems found while parsing a file. Returns False if
+    any of them meant that something couldn't be read"""
+    for diagnostic in diagnostics: Problem(path, diagnostic)
+    return not any(d.severity == Diagnostic.Error for d in diagnostics)
+
+
+################################################################
+################################################################
+################################################################
+########################## Commands ############################
+
+
+def CmdDump(args):
+    """Converts messages.bin files to JSON, JSON Lines or CSV"""
+    ok = True
+    for path in args.files:
+        if args.format != 'json':
+            # Stream the messages through one at a time
+            diagnostics = []
+            try:
+                if path == '-': messages = nme_textio.ReadMessagesBinData(ReadInput(path), diagnostics)
+                else: messages = nme_textio.ReadMessagesBin(path, diagnostics)
+                with OpenOutputText(OutputPath(args, path, '.' + args.format)) as file:
+                    nme_textio.Export(messages, file, args.format)
+            except Exception as e:
+                Problem(path, e)
+                ok = False
+            if not ReportDiagnostics(path, diagnostics): ok = False
+            continue
+
+        try: file = ParseFile(ReadInput(path))
+        except Exception as e:
+            Problem(path, e)
+            ok = False
+            continue
+        if not ReportDiagnostics(path, file.diagnostics): ok = False
+
+        messages = [{'id': msg.id, 'title': msg.title, 'text': msg.text} for msg in file.Messages]
+        text = json.dumps(messages, ensure_ascii=False, indent=1) + '\n'
+        WriteOutput(OutputPath(args, path, '.json'), nme_textio.EscapeSurrogates(text))
+
+    return ok
+
+
+def CmdCompile(args):
+    """Converts JSON, JSON Lines or CSV files back to messages.bin"""
+    ok = True
+    for path in args.files:
+        format = args.format or nme_textio.FormatFromPath(path, 'json')
+        if format != 'json':
+            # Stream the messages through one at a time
+            try:
+                with OpenInputText(path) as file:
+                    WriteOutputBinary(OutputPath(args, path, '.bin'), lambda out: nme_textio.BuildMessagesBin(nme_textio.Import(file, format), out))
+            except Exception as e:
+                Problem(path, e)
+                ok = False
+            continue
+
+        try:
+            messages = json.loads(ReadInput(path, False))
+            file = MessagesBin()
+            file.Messages = [Message(int(msg['id']), str(msg['title']), str(msg['text'])) for msg in messages]
+        except Exception as e:
+            Problem(path, e)
+            ok = False
+            continue
+
+        WriteOutput(OutputPath(args, path, '.bin'), file.save())
+
+    return ok
+
+
+def CmdValidate(args):
+    """Checks messages.bin files for corruption and duplicate IDs"""
+    ok = True
+    for path in args.files:
+        try: file = ParseFile(ReadInput(path)) # fails on lone surrogates with --string-errors strict
+        except Exception as e:
+            Problem(path, e)
+            ok = False
+            continue
+
+        # Anything out of the ordinary counts, even if it could be read
+        ReportDiagnostics(path, file.diagnostics)
+
+        duplicates = sorted(file.ids.Duplicates().items())
+        for id, count in duplicates:
+            Problem(path, 'there are %d messages with ID %d' % (count, id))
+        if duplicates or file.diagnostics: ok = False
+        elif not args.quiet: print('%s: OK (%d messages)' % (path, len(file.Messages)))
+
+    return ok
+
+
+def CmdStats(args):
+    """Prints statistics about messages.bin files"""
+    ok = True
+    for path in args.files:
+        try:
+            data = ReadInput(path)
+            file = ParseFile(data)
+        except Exception as e:
+            Problem(path, e)
+            ok = False
+            continue
+
+        if not ReportDiagnostics(path, file.diagnostics): ok = False
+
+        stats = collections.OrderedDict([('file', path)])
+        stats.update(nme_batch.FileStats(file, len(data)))
+
+        if args.json: print(json.dumps(stats))
+        else:
+            print(path)
+            for key, value in list(stats.items())[1:]:
+                print('  %-20s %s' % (key.replace('_', ' ') + ':', value))
+
+    return ok
+
+
+def CmdBatch(args):
+    """Checks (and optionally normalizes) many messages.bin files in parallel"""
+    files = nme_batch.FindFiles(args.paths, args.pattern)
+    if not files:
+        Problem(', '.join(args.paths), 'no files found')
+        return False
+
+    start = time.perf_counter()
+    results = []
+    for result in nme_batch.ProcessFiles(files, args.normalize, args.jobs):
+        results.append(result)
+        path = result['file']
+        if result['error'] is not None: Problem(path, result['error'])
+        for diagnostic in result.get('diagnostics', []): Problem(path, diagnostic['description'])
+        for id, count in result.get('duplicates', {}).items():
+            Problem(path, 'there are %d messages with ID %d' % (count, id))
+    report = nme_batch.Report(results, time.perf_counter() - start)
+
+    if args.json: print(json.dumps(report))
+    else:
+        for key, value in report.items():
+            if key == 'results': continue
+            if key == 'seconds': value = '%.2f' % value
+            print('%-16s %s' % (key.replace('_', ' ') + ':', value))
+
+    return report['ok'] == report['files']
+
+
+def CmdDiff(args):
+    """Compares two messages.bin files by message ID, and writes a patch
+    that turns the first into the second"""
+    files = []
+    for path in (args.base, args.new):
+        try: file = ParseFile(ReadInput(path))
+        except Exception as e:
+            Problem(path, e)
+            return False
+        if not ReportDiagnostics(path, file.diagnostics): return False
+        files.append(file)
+
+    patch = nme_diff.Diff(*files)
+    if args.output is not None: WriteOutput(args.output, patch.toBytes())
+    out = sys.stderr if args.output == '-' else sys.stdout
+
+    # List the changes, unless they're going into a patch file
+    if args.output is None:
+        for key, hash in patch.removed: out.write('removed %s\n' % nme_diff.KeyName(key))
+        for key, hash, title, text in patch.changed:
+            fields = [name for name, value in (('title', title), ('text', text)) if value is not None]
+            out.write('changed %s (%s)\n' % (nme_diff.KeyName(key), ', '.join(fields)))
+        for key, title, text in patch.added: out.write('added %s\n' % nme_diff.KeyName(key))
+        for key in patch.Moved(): out.write('moved %s\n' % nme_diff.KeyName(key))
+    out.write('%d added, %d removed, %d changed, %d moved\n' % tuple(patch.Summary().values()))
+
+    return True
+
+
+def CmdPatch(args):
+    """Applies a patch made by diff to a messages.bin file"""
+    try: patch = nme_diff.Patch.FromBytes(ReadInput(args.patch))
+    except Exception as e:
+        Problem(args.patch, e)
+        return False
+    try: file = ParseFile(ReadInput(args.file))
+    except Exception as e:
+        Problem(args.file, e)
+        return False
+    if not ReportDiagnostics(args.file, file.diagnostics): return False
+
+    # Conflicts are left alone, unless --force says otherwise
+    conflicts = patch.Conflicts(file)
+    for conflict in conflicts: Problem(args.file, conflict)
+    if conflicts and not args.force: return False
+    patch.Apply(file, force=True)
+
+    # Patch the file in place, unless told otherwise
+    output = args.output if args.output is not None else args.file
+    try:
+        if output == '-': WriteOutput(output, file.save())
+        else: ReplaceFile(output, file.saveTo)
+    except Exception as e:
+        Problem(output, e)
+        return False
+
+    return not conflicts
+
+
+def CmdMerge(args):
+    """Merges two edited copies of a messages.bin file, given the file
+    they were both made from. Suitable as a git merge driver"""
+    files = []
+    for path in (args.base, args.ours, args.theirs):
+        try: file = ParseFile(ReadInput(path))
+        except Exception as e:
+            Problem(path, e)
+            return False
+        if not ReportDiagnostics(path, file.diagnostics): return False
+        files.append(file)
+
+    merge = nme_merge.Merge(*files)
+    for conflict in merge.conflicts:
+        if args.prefer is not None: conflict.choice = args.prefer
+        Problem(args.ours, 'conflict: %s' % conflict)
+    merge.Apply()
+
+    # Merge drivers leave the result in ours
+    output = args.output if args.output is not None else args.ours
+    try:
+        if output == '-': WriteOutput(output, files[1].save())
+        else: ReplaceFile(output, files[1].saveTo)
+    except Exception as e:
+        Problem(output, e)
+        return False
+
+    if not args.quiet:
+        out = sys.stderr if output == '-' else sys.stdout
+        out.write('%d changes merged, %d conflicts%s\n' % (merge.changes, len(merge.conflicts),
+            ' (resolved with %s)' % args.prefer if merge.conflicts and args.prefer is not None else ''))
+    return not merge.conflicts or args.prefer is not None
+
+
+def CmdCompact(args):
+    """Rewrites messages.bin files as small as they can be, with
+    identical strings and the ends of longer strings stored once"""
+    ok = True
+    for path in args.files:
+        try: file = ParseFile(ReadInput(path))
+        except Exception as e:
+            Problem(path, e)
+            ok = False
+            continue
+
+        # Damaged files are left alone, like by batch --normalize
+        if not ReportDiagnostics(path, file.diagnostics):
+            ok = False
+            continue
+
+        # Rewrite the file in place, unless told otherwise
+        output = args.output if args.output is not None else path
+        size = file.Layout()[1]
+        data = file.save(compact=True)
+        try:
+            if output == '-': WriteOutput(output, data)
+            else: ReplaceFile(output, lambda f: f.write(data))
+        except Exception as e:
+            Problem(output, e)
+            ok = False
+            continue
+
+        if not args.quiet:
+            out = sys.stderr if output == '-' else sys.stdout
+            out.write('%s: %d bytes, %d saved (%.1f%%)\n' % (path, len(data), size - len(data), 100 * (size - len(data)) / size))
+    return ok
+
+
+def CmdBuild(args):
+    """Builds a messages.bin file from a directory of source files, one
+    per message, re-encoding only the ones that changed since last time"""
+    try: result = nme_build.Build(args.source, args.output, args.cache, args.force)
+    except Exception as e:
+        Problem(args.source, e)
+        return False
+
+    if not args.quiet:
+        if not result['written']: print('%s is up to date (%d messages, checked in %.2f s)' % (
+            args.output, result['messages'], result['seconds']))
+        else: print('Built %s: %d messages, %d re-encoded, %d bytes in %.2f s' % (
+            args.output, result['messages'], result['encoded'], result['bytes'], result['seconds']))
+    return True
+
+
+def CmdSplit(args):
+    """Writes the messages in a messages.bin file to a directory of
+    source files, one per message, that build can turn back into it"""
+    try: file = ParseFile(ReadInput(args.file))
+    except Exception as e:
+        Problem(args.file, e)
+        return False
+    if not ReportDiagnostics(args.file, file.diagnostics): return False
+
+    try: written = nme_build.Split(file.Messages, args.output_dir, args.clean)
+    except Exception as e:
+        Problem(args.output_dir, e)
+        return False
+
+    print('%d of %d source files written to %s' % (written, len(file.Messages), args.output_dir))
+    return True
+
+
+################################################################
+################################################################
+################################################################
+############################ Main() ############################
+
+
+def MakeParser():
+    """Creates the argument parser"""
+    parser = argparse.ArgumentParser(prog='nme_cli', description='Newer Messages Editor %s command-line tools' % version)
+    parser.add_argument('--perf-trace', metavar='FILE',
+        help='time parsing and saving, and save a trace to FILE (Chrome trace event format) on exit')
+    parser.add_argument('--string-errors', choices=nme_strings.ErrorPolicies, default=nme_strings.Errors,
+        help='what to do with lone surrogates in strings: keep them (the default), replace them, or stop with an error')
+    commands = parser.add_subparsers(dest='command', metavar='command')
+    commands.required = True
+
+    def Add(name, func, help, outputs):
+        """Adds a subcommand"""
+        cmd = commands.add_parser(name, help=help, description=help)
+        cmd.set_defaults(func=func)
+        cmd.add_argument('files', nargs='+', metavar='file', help='input files ("-" for stdin)')
+        if outputs:
+            where = cmd.add_mutually_exclusive_group()
+            where.add_argument('-o', '--output', help='output file ("-" for stdout; single input only)')
+            where.add_argument('-d', '--output-dir', help='directory to write one output per input to')
+        return cmd
+
+    cmd = Add('dump', CmdDump, 'convert messages.bin files to JSON, JSON Lines or CSV', True)
+    cmd.add_argument('-f', '--format', choices=['json', 'jsonl', 'csv'], default='json',
+        help='output format (default: json). jsonl and csv are streamed, so they suit very large files')
+    cmd = Add('compile', CmdCompile, 'convert JSON, JSON Lines or CSV files back to messages.bin', True)
+    cmd.add_argument('-f', '--format', choices=['json', 'jsonl', 'csv'],
+        help='input format (default: guessed from the file extension)')
+    cmd = Add('validate', CmdValidate, 'check messages.bin files for problems', False)
+    cmd.add_argument('-q', '--quiet', action='store_true', help='only report problems')
+    cmd = Add('stats', CmdStats, 'print statistics about messages.bin files', False)
+    cmd.add_argument('--json', action='store_true', help='print one JSON object per file')
+    cmd = Add('compact', CmdCompact, 'make messages.bin files smaller by storing shared strings once', False)
+    cmd.add_argument('-o', '--output', help='where to write the result ("-" for stdout; single input only) instead of in place')
+    cmd.add_argument('-q', '--quiet', action='store_true', help='only report problems')
+
+    cmd = commands.add_parser('batch', help='check many messages.bin files in parallel',
+        description='Parses every file, checks it for corruption and duplicate IDs and gathers '
+        'statistics, using several processes, then prints one report for all of them')
+    cmd.set_defaults(func=CmdBatch)
+    cmd.add_argument('paths', nargs='+', metavar='path', help='input files, or directories to search')
+    cmd.add_argument('-p', '--pattern', default=nme_batch.DefaultPattern,
+        help='files to pick up in directories (default: %(default)s)')
+    cmd.add_argument('-j', '--jobs', type=int, help='number of processes (default: one per CPU)')
+    cmd.add_argument('--normalize', action='store_true',
+        help='re-save files that aren\'t laid out the way this editor saves them')
+    cmd.add_argument('--json', action='store_true', help='print the report, including every file, as JSON')
+
+    cmd = commands.add_parser('diff', help='compare two messages.bin files by message ID',
+        description='Lists the messages that were added, removed, changed or moved between two files, '
+        'or with -o, saves a patch file that makes those changes')
+    cmd.set_defaults(func=CmdDiff)
+    cmd.add_argument('base', help='original file ("-" for stdin)')
+    cmd.add_argument('new', help='changed file ("-" for stdin)')
+    cmd.add_argument('-o', '--output', help='patch file to write ("-" for stdout), e.g. fixes%s' % nme_diff.PatchExtension)
+
+    cmd = commands.add_parser('patch', help='apply a patch made by diff to a messages.bin file',
+        description='Applies a patch to a file, which is changed in place unless -o is given. Messages '
+        'are matched up by ID, so it still applies to files that other messages were added to')
+    cmd.set_defaults(func=CmdPatch)
+    cmd.add_argument('file', help='file to patch ("-" for stdin)')
+    cmd.add_argument('patch', help='patch file')
+    cmd.add_argument('-o', '--output', help='where to write the patched file ("-" for stdout) instead')
+    cmd.add_argument('--force', action='store_true',
+        help='apply the patch even if the file doesn\'t match it, skipping what can\'t be applied')
+
+    cmd = commands.add_parser('merge', help='three-way merge of two edited copies of a messages.bin file',
+        description='Merges the changes made to two copies of a file, given the file they were both made from. '
+        'The result replaces ours unless -o is given, and the exit status is 1 if there were conflicts, '
+        'so it can be used as a git merge driver: "python3 nme_cli.py merge %O %A %B"')
+    cmd.set_defaults(func=CmdMerge)
+    cmd.add_argument('base', help='the file both copies were made from')
+    cmd.add_argument('ours', help='our copy, which is replaced with the result')
+    cmd.add_argument('theirs', help='their copy')
+    cmd.add_argument('-o', '--output', help='where to write the result ("-" for stdout) instead')
+    cmd.add_argument('--prefer', choices=[nme_merge.Ours, nme_merge.Theirs],
+        help='settle conflicts in favor of one side, instead of failing')
+    cmd.add_argument('-q', '--quiet', action='store_true', help='only report conflicts')
+
+    cmd = commands.add_parser('build', help='build messages.bin from a directory with one source file per message',
+        description='Builds a messages.bin file from the source files in a directory, named after their message IDs '
+        '(1234.txt, or 1234_label.txt), with the title on the first line and the text after it. Messages go in '
+        'order of ID. Each message is cached, so rebuilding only re-encodes the files that changed')
+    cmd.set_defaults(func=CmdBuild)
+    cmd.add_argument('source', help='directory of source files')
+    cmd.add_argument('-o', '--output', required=True, help='messages.bin file to write')
+    cmd.add_argument('--cache', help='cache file (default: the output file plus %s)' % nme_build.CacheExtension)
+    cmd.add_argument('--force', action='store_true', help='re-encode every file, ignoring the cache')
+    cmd.add_argument('-q', '--quiet', action='store_true', help='only report problems')
+
+    cmd = commands.add_parser('split', help='write the messages in messages.bin to one source file each, for build',
+        description='Writes a source file for each message in a messages.bin file to a directory, leaving files '
+        'that wouldn\'t change alone')
+    cmd.set_defaults(func=CmdSplit)
+    cmd.add_argument('file', help='messages.bin file ("-" for stdin)')
+    cmd.add_argument('-d', '--output-dir', required=True, help='directory to write the source files to')
+    cmd.add_argument('--clean', action='store_true', help='remove source files for messages that aren\'t in the file')
+
+    return parser
+
+
+# Main function
+def main(argv=None):
+    """Main startup function"""
+    parser = MakeParser()
+    args = parser.parse_args(argv)
+    if getattr(args, 'output', None) is not None and len(getattr(args, 'files', ())) > 1:
+        parser.error('--output can only be used with a single input file')
+    if args.perf_trace is not None: nme_perf.Enable(traceFile=args.perf_trace)
+    nme_strings.SetErrors(args.string_errors)
+
+    return 0 if args.func(args) else 1
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support() # for the frozen Windows build
+    sys.exit(main())
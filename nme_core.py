@@ -0,0 +1,1380 @@
+#!/usr/bin/python
+# -*- coding: latin-1 -*-
+
+# Newer Messages Editor - Edits NewerSMBW's messages.bin
+# Version 1.3
+# Copyright (C) 2013-2014 RoadrunnerWMC
+
+# This file is part of Newer Messages Editor.
+
+# Newer Messages Editor is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Newer Messages Editor is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Newer Messages Editor.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# nme_core.py
+# File format classes for Newer Messages Editor. This module only uses
+# the Python standard library, so it can be used without PyQt
+
+
+################################################################
+################################################################
+
+
+version = '1.3'
+
+import array, collections, collections.abc, itertools, mmap, os, shutil, struct, sys, time
+from codecs import utf_16_be_decode
+
+import nme_perf, nme_strings
+from nme_strings import Units
+
+
+
+
+
+################################################################
+################################################################
+################################################################
+#################### File data Classes #########################
+
+
+class Message():
+    """Class that represents a message (ID, title, text)"""
+    def __init__(self, id=0, title='New Message', text=''):
+        """Inits the Message"""
+        self.id = id
+        self.title = title
+        self.text = text
+
+    def toPyObject(self):
+        """Py2 / Py3 compatibility"""
+        return self
+
+
+# Files at least this big (in bytes) are opened with LazyMessagesBin
+LazyLoadThreshold = 8 * 1024 * 1024
+
+# File data at least this big is parsed into a ColumnarMessagesBin by ParseData
+ColumnarThreshold = 8 * 1024 * 1024
+
+
+class IdIndex():
+    """Map from message IDs to the messages that use them, which is
+    kept up to date as messages are added, removed and renumbered"""
+    def __init__(self, messages=()):
+        """Inits the IdIndex"""
+        self.messages = {} # id -> list of messages
+        self.duplicates = set() # IDs used by more than one message
+        for msg in messages: self.Add(msg)
+
+    def Add(self, msg):
+        """Adds a message to the index"""
+        group = self.messages.get(msg.id)
+        if group is None: self.messages[msg.id] = [msg]
+        else:
+            group.append(msg)
+            self.duplicates.add(msg.id)
+
+    def Remove(self, msg, id=None):
+        """Removes a message from the index. id is the ID it was added
+        under, if that's not msg.id anymore"""
+        if id is None: id = msg.id
+        group = self.messages[id]
+        for i, other in enumerate(group):
+            if other is msg:
+                del group[i]
+                break
+
+        if not group: del self.messages[id]
+        elif len(group) == 1: self.duplicates.discard(id)
+
+    def Change(self, msg, oldId):
+        """Moves a message whose ID was oldId to its current ID"""
+        self.Remove(msg, oldId)
+        self.Add(msg)
+
+    def Lookup(self, id):
+        """Returns the messages with the given ID"""
+        return self.messages.get(id, [])
+
+    def IsDuplicate(self, id):
+        """Returns True if more than one message has the given ID"""
+        return id in self.duplicates
+
+    def Duplicates(self):
+        """Returns {id: number of messages} for every duplicated ID"""
+        return dict((id, len(self.messages[id])) for id in self.duplicates)
+
+    def NextFreeId(self, start=0):
+        """Returns the first unused ID from start onwards"""
+        id = start
+        while id in self.messages: id += 1
+        return id
+
+
+class Diagnostic():
+    """A problem found while parsing file data"""
+    Error = 'error' # something couldn't be read, and was left out
+    Warning = 'warning' # it could be read, but the file is malformed there
+
+    def __init__(self, severity, kind, message, entry=None, field=None, offset=None):
+        """Inits the Diagnostic"""
+        self.severity = severity
+        self.kind = kind # short name of the kind of problem
+        self.message = message
+        self.entry = entry # index table entry, if it's about one
+        self.field = field # 'title' or 'text', if it's about a string
+        self.offset = offset # where the string is, if it's about one
+
+    def __str__(self):
+        """Returns a one-line description"""
+        where = ''
+        if self.entry is not None: where = 'entry %d: ' % self.entry
+        if self.field is not None: where = 'entry %d %s at 0x%X: ' % (self.entry, self.field, self.offset)
+        return '%s: %s%s' % (self.severity, where, self.message)
+
+    def toPyObject(self):
+        """Returns the diagnostic as a dict, for JSON output"""
+        return collections.OrderedDict([
+            ('severity', self.severity), ('kind', self.kind), ('message', self.message),
+            ('entry', self.entry), ('field', self.field), ('offset', self.offset),
+            ('description', str(self))])
+
+
+class StringSection():
+    """The strings after the index table of file data. It's decoded in
+    big blocks, each one the first time a string in it is read, and
+    strings are sliced out of those"""
+    BlockSize = 256 * 1024 # bytes
+    MaxBlocks = 16 # decoded blocks to keep around
+
+    def __init__(self, data, start):
+        """Inits the StringSection"""
+        self.data = data
+        self.start = start
+        self.end = start + ((len(data) - start) & ~1) # complete characters only
+        self.blocks = collections.OrderedDict() # block number -> decoded block, or None if it can't be sliced
+        self.last = -1 # highest block decoded so far
+        self.fallbacks = 0 # strings read by themselves, rather than sliced out of blocks
+        self.read = {} # offset -> string read by itself, since shared strings are read again
+
+    def Block(self, n):
+        """Returns decoded block number n, or None if it can't be sliced"""
+        try: return self.blocks[n]
+        except KeyError: pass
+
+        # Going back to a block that's been dropped costs more than
+        # reading the string by itself
+        if n < self.last: return None
+        self.last = n
+
+        start = self.start + n * self.BlockSize
+        block = utf_16_be_decode(self.data[start:min(start + self.BlockSize, self.end)], 'surrogatepass', True)[0]
+
+        # Slicing only works while one character is one code unit, so
+        # surrogates (paired or not) force the string-by-string path
+        if not block.isascii() and nme_strings.Surrogates.search(block) is not None: block = None
+        self.blocks[n] = block
+        if len(self.blocks) > self.MaxBlocks: self.blocks.popitem(last=False)
+        return block
+
+    def Fallback(self, offset):
+        """Returns the string at offset, read by itself"""
+        self.fallbacks += 1
+        string = self.read.get(offset)
+        if string is None: string = self.read[offset] = MessagesBin.ReadString(self.data, offset)
+        return string
+
+    def Read(self, offset):
+        """Returns the string at offset. Unless self.fallbacks goes up,
+        it was sliced out of a block, so it has one character per code unit"""
+        i = offset - self.start
+        if i < 0 or i & 1 or offset >= self.end: return self.Fallback(offset)
+        n, i = divmod(i, self.BlockSize)
+        i >>= 1
+
+        try: block = self.blocks[n]
+        except KeyError: block = self.Block(n)
+        if block is None: return self.Fallback(offset)
+        end = block.find('\0', i)
+        if end != -1: return block[i:end]
+
+        # The string carries on into the next blocks
+        parts = [block[i:]]
+        while self.start + (n + 1) * self.BlockSize < self.end:
+            n += 1
+            block = self.Block(n)
+            if block is None: return self.Fallback(offset)
+            end = block.find('\0')
+            if end != -1:
+                parts.append(block[:end])
+                break
+            parts.append(block)
+        return ''.join(parts)
+
+
+class MessagesBin():
+    """Class that represents Newer's Messages.bin"""
+    ProgressInterval = 1024 # messages written between saveTo() progress calls
+    EncodedStrings = False # True if strings are kept as file data, which is quicker to compare than to decode
+
+    def __init__(self, data=None):
+        """Inits the MessagesBin"""
+        self.Messages = []
+        self.diagnostics = [] # problems found in the data it was parsed from
+        if data is not None: self.InitFromData(data)
+
+    @property
+    def Messages(self):
+        """The list of messages. Replacing it resets the ID index; change
+        it through InsertMessage, RemoveMessage and SetId to keep the
+        index up to date instead"""
+        return self._Messages
+
+    @Messages.setter
+    def Messages(self, messages):
+        self._Messages = messages
+        self.idIndex = None
+
+    @property
+    def ids(self):
+        """The IdIndex of the messages, built the first time it's needed"""
+        if self.idIndex is None: self.idIndex = IdIndex(self._Messages)
+        return self.idIndex
+
+    def InsertMessage(self, row, msg):
+        """Inserts a message at row"""
+        self._Messages.insert(row, msg)
+        if self.idIndex is not None: self.idIndex.Add(msg)
+
+    def RemoveMessage(self, row):
+        """Removes the message at row and returns it"""
+        msg = self._Messages.pop(row)
+        if self.idIndex is not None: self.idIndex.Remove(msg)
+        return msg
+
+    def SetId(self, msg, id):
+        """Changes the ID of msg"""
+        oldId, msg.id = msg.id, id
+        self.IdChanged(msg, oldId)
+
+    def IdChanged(self, msg, oldId):
+        """Updates the ID index after msg.id was changed from oldId"""
+        if self.idIndex is not None: self.idIndex.Change(msg, oldId)
+
+    def FindId(self, id):
+        """Returns the messages with the given ID"""
+        return self.ids.Lookup(id)
+
+    def FindIdInOrder(self, id):
+        """Returns the messages with the given ID in file order. FindId()
+        has them in the order they were added to the index, which
+        inserting, renumbering and undoing don't keep to"""
+        messages = self.FindId(id)
+        if len(messages) < 2: return messages
+        return sorted(messages, key=self._Messages.index)
+
+    def NextFreeId(self):
+        """Returns an unused ID for a new message, preferably the one
+        after the last message's"""
+        start = self._Messages[-1].id + 1 if self._Messages else 0
+        return self.ids.NextFreeId(start)
+
+    @nme_perf.Timed('MessagesBin.Snapshot')
+    def Snapshot(self):
+        """Returns a copy of the file as it is now, which can be saved
+        from another thread while this one keeps being edited"""
+        snapshot = MessagesBin()
+        snapshot.Messages = [Message(msg.id, msg.title, msg.text) for msg in self._Messages]
+        return snapshot
+
+    @nme_perf.Timed('MessagesBin.InitFromData')
+    def InitFromData(self, data):
+        """Inits the MessagesBin from file data. Problems with it are
+        listed in self.diagnostics, and whatever's readable is kept"""
+        self.diagnostics = []
+        self.Messages = list(self.ParseMessages(data, self.diagnostics))
+        nme_perf.Count('messages parsed', len(self._Messages))
+
+    def AppendMessages(self, messages):
+        """Adds messages to the end of the file"""
+        self._Messages.extend(messages)
+        if self.idIndex is not None:
+            for msg in messages: self.idIndex.Add(msg)
+
+    @staticmethod
+    def ParseMessages(data, diagnostics=None):
+        """Parses file data (bytes, bytearray or mmap) in one pass,
+        yielding each message as soon as its strings are decoded. Every
+        offset is checked on the way; problems are added to the list
+        diagnostics as Diagnostics, and whatever's readable is salvaged"""
+        if diagnostics is None: diagnostics = []
+        first = len(diagnostics)
+        size = len(data)
+
+        def problem(severity, kind, message, entry=None, field=None, offset=None):
+            """Records a problem"""
+            diagnostics.append(Diagnostic(severity, kind, message, entry, field, offset))
+
+        count, tableEnd = MessagesBin.ReadTableSize(data, diagnostics)
+
+        # The strings are decoded a block at a time, as they're reached.
+        # They're normally in order, one after another, which makes
+        # overlaps easy to spot on the way
+        section = StringSection(data, tableEnd)
+        read = section.Read
+        lastStart = maxEnd = 0
+        nextOffset = tableEnd # where the next string should be
+        ordered = True
+
+        def check(offset, string, entry, field):
+            """Checks the string read from offset"""
+            nonlocal lastStart, maxEnd, ordered
+            if offset >= size:
+                problem(Diagnostic.Error, 'out-of-range', 'points past the end of the file', entry, field, offset)
+                return
+
+            end = offset + 2 * Units(string)
+            if end + 2 > size: problem(Diagnostic.Warning, 'unterminated', 'runs to the end of the file without a terminator', entry, field, offset)
+            else: end += 2
+
+            if offset < tableEnd: problem(Diagnostic.Warning, 'inside-table', 'starts inside the index table', entry, field, offset)
+            elif (offset - tableEnd) & 1: problem(Diagnostic.Warning, 'misaligned', 'doesn\'t start on a character boundary', entry, field, offset)
+
+            # Strings may share their ends (the same string, or the
+            # end of a longer one), but not overlap otherwise
+            if not ordered: return
+            if offset < lastStart:
+                ordered = False
+                return
+            if offset < maxEnd and end != maxEnd: problem(Diagnostic.Warning, 'overlap', 'overlaps another string', entry, field, offset)
+            lastStart = offset
+            if end > maxEnd: maxEnd = end
+
+        for entry, (id, tOffset, bOffset) in enumerate(struct.iter_unpack('>III', data[4:4 + 12 * count])):
+            fallbacks = section.fallbacks
+            title = read(tOffset)
+            text = read(bOffset)
+
+            # A title and text right after the previous strings can't
+            # have anything wrong with them, as long as they fit
+            if section.fallbacks == fallbacks:
+                titleEnd = tOffset + 2 * len(title) + 2
+                textEnd = bOffset + 2 * len(text) + 2
+            else:
+                titleEnd = tOffset + 2 * Units(title) + 2
+                textEnd = bOffset + 2 * Units(text) + 2
+            if tOffset == nextOffset and bOffset == titleEnd and textEnd <= size:
+                lastStart = bOffset
+                maxEnd = nextOffset = textEnd
+            else:
+                check(tOffset, title, entry, 'title')
+                check(bOffset, text, entry, 'text')
+                nextOffset = maxEnd if ordered and maxEnd >= tableEnd and not (maxEnd - tableEnd) & 1 else -1
+
+            yield Message(id - 0x100, title, text)
+
+        # Strings out of order have to be sorted to find overlaps
+        if not ordered:
+            diagnostics[first:] = [d for d in diagnostics[first:] if d.kind != 'overlap']
+            MessagesBin.CheckOverlaps(data, count, diagnostics)
+
+    @staticmethod
+    def ReadTableSize(data, diagnostics):
+        """Returns the number of complete index table entries in data and
+        where the table ends, adding a Diagnostic if it's cut off"""
+        # data[0:4] is the number of messages
+        if len(data) < 4:
+            diagnostics.append(Diagnostic(Diagnostic.Error, 'short-header', 'the file is too short to have a header'))
+            return 0, len(data)
+        NumberOfMessages = struct.unpack_from('>I', data, 0)[0]
+
+        # The index table follows: 12 bytes (ID, title offset, text
+        # offset) per message. Keep the entries that are all there
+        tableEnd = 4 + 12 * NumberOfMessages
+        if len(data) >= tableEnd: return NumberOfMessages, tableEnd
+
+        count = (len(data) - 4) // 12
+        diagnostics.append(Diagnostic(Diagnostic.Error, 'truncated-table',
+            'the index table is cut off after %d of its %d entries' % (count, NumberOfMessages)))
+        return count, len(data)
+
+    @staticmethod
+    def CheckOverlaps(data, count, diagnostics):
+        """Adds a Diagnostic for every string in the first count index
+        table entries of data that overlaps another one, other than by
+        sharing its end"""
+        size = len(data)
+        regions = []
+        ends = {} # offset -> end of the string there, for shared strings
+        for entry, (id, tOffset, bOffset) in enumerate(struct.iter_unpack('>III', data[4:4 + 12 * count])):
+            for field, offset in (('title', tOffset), ('text', bOffset)):
+                if offset >= size: continue
+                end = ends.get(offset)
+                if end is None:
+                    end = MessagesBin.FindStringEnd(data, offset)
+                    if end + 2 <= size: end += 2
+                    ends[offset] = end
+                regions.append((offset, end, entry, field))
+
+        regions.sort()
+        maxEnd = 0
+        for offset, end, entry, field in regions:
+            if offset < maxEnd and end != maxEnd:
+                diagnostics.append(Diagnostic(Diagnostic.Warning, 'overlap', 'overlaps another string', entry, field, offset))
+            if end > maxEnd: maxEnd = end
+
+    @staticmethod
+    def FindStringEnd(data, offset):
+        """Returns the position of the terminator of the string at offset"""
+        # The terminator has to start on a code unit boundary, so skip
+        # any matches that straddle two characters
+        end = data.find(b'\x00\x00', offset)
+        while end != -1 and (end - offset) & 1:
+            end = data.find(b'\x00\x00', end + 1)
+
+        # No terminator: take every complete character up to the end
+        if end == -1: end = offset + ((len(data) - offset) & ~1)
+        return max(end, offset)
+
+    @staticmethod
+    def ReadString(data, offset):
+        """Reads a 0x0000-terminated UTF-16 string from data, starting at offset"""
+        end = MessagesBin.FindStringEnd(data, offset)
+        if end <= offset: return ''
+        return MessagesBin.DecodeString(data[offset:end])
+
+    @staticmethod
+    def DecodeString(data):
+        """Decodes UTF-16 string data without its terminator"""
+        return nme_strings.Decode(data)
+
+    @nme_perf.Timed('MessagesBin.save')
+    def save(self, compact=False):
+        """Returns data that can be saved to a file. If compact is True,
+        strings are shared where they can be (see CompactLayout())"""
+        if compact:
+            table, strings = self.CompactLayout()
+            return bytearray(table) + strings
+        table, size = self.Layout()
+
+        # Fill in the whole file in one buffer
+        data = bytearray(size)
+        data[:len(table)] = table
+        i = len(table)
+        for msg in self.Messages:
+            for string in self.EncodeMessage(msg):
+                data[i:i + len(string)] = string
+                i += len(string)
+
+        return data
+
+    @nme_perf.Timed('MessagesBin.saveTo')
+    def saveTo(self, file, progress=None, compact=False):
+        """Writes the file to a file object, one string at a time.
+        progress(done, total) is called every ProgressInterval messages.
+        If compact is True, strings are shared where they can be"""
+        if compact:
+            # Strings can't be shared until all of them are known
+            table, strings = self.CompactLayout()
+            file.write(table)
+            file.write(strings)
+            if progress is not None: progress(len(self.Messages), len(self.Messages))
+            return
+
+        table, size = self.Layout()
+        file.write(table)
+        total = len(self.Messages)
+        for i, msg in enumerate(self.Messages):
+            title, text = self.EncodeMessage(msg)
+            file.write(title)
+            file.write(text)
+            if progress is not None and i % self.ProgressInterval == 0: progress(i, total)
+        if progress is not None: progress(total, total)
+
+    def Layout(self):
+        """Returns the index table and the size of the whole file"""
+        # Header, then 12 bytes (ID, title offset, text offset) per message
+        table = bytearray(4 + 12 * len(self.Messages))
+        struct.pack_into('>I', table, 0, len(self.Messages))
+
+        # The strings come right after the table, in message order
+        i = len(table)
+        pos = 4
+        pack_into = struct.pack_into
+        for msg in self.Messages:
+            titleSize, textSize = self.MessageSizes(msg)
+            pack_into('>III', table, pos, 0x100 + msg.id, i, i + titleSize)
+            i += titleSize + textSize
+            pos += 12
+
+        return table, i
+
+    @nme_perf.Timed('MessagesBin.CompactLayout')
+    def CompactLayout(self):
+        """Returns the index table and the strings of the smallest file
+        that reads back the same: each distinct string is stored once,
+        and a string that's the end of a longer one points into it"""
+        # Identical strings are pooled by their encoded data
+        pool = {} # data -> number of the distinct string
+        strings = [] # distinct strings, in the order they're first used
+        refs = array.array('I') # title and text of each message -> distinct string
+        for msg in self.Messages:
+            for data in self.EncodeMessage(msg):
+                n = pool.get(data)
+                if n is None:
+                    n = pool[data] = len(strings)
+                    strings.append(data)
+                refs.append(n)
+
+        # Sorted by their reversed data, a string that's the end of
+        # another one comes right before one that ends with it. Lengths
+        # are all even, so the shared part starts on a character
+        reverse = [data[::-1] for data in strings]
+        order = sorted(range(len(strings)), key=reverse.__getitem__)
+        host = list(range(len(strings))) # string whose data each string is the end of
+        for i in range(len(order) - 2, -1, -1):
+            n, after = order[i], order[i + 1]
+            if reverse[after].startswith(reverse[n]): host[n] = host[after]
+
+        # Lay out the strings that aren't part of others, in the order
+        # they're first used, then point the rest into them
+        tableEnd = 4 + 12 * len(self.Messages)
+        offsets = [0] * len(strings)
+        out = bytearray()
+        for n, data in enumerate(strings):
+            if host[n] != n: continue
+            offsets[n] = tableEnd + len(out)
+            out += data
+        for n, data in enumerate(strings):
+            h = host[n]
+            if h != n: offsets[n] = offsets[h] + len(strings[h]) - len(data)
+
+        table = bytearray(tableEnd)
+        struct.pack_into('>I', table, 0, len(self.Messages))
+        pos = 4
+        pack_into = struct.pack_into
+        for i, msg in enumerate(self.Messages):
+            pack_into('>III', table, pos, 0x100 + msg.id, offsets[refs[2 * i]], offsets[refs[2 * i + 1]])
+            pos += 12
+
+        return table, out
+
+    def MessageSizes(self, msg):
+        """Returns the sizes of the title and text of msg in file data"""
+        # Code units, plus the terminator
+        return 2 * Units(msg.title) + 2, 2 * Units(msg.text) + 2
+
+    def EncodeMessage(self, msg):
+        """Returns the title and text of msg as file data, including terminators"""
+        return self.EncodeString(msg.title), self.EncodeString(msg.text)
+
+    @staticmethod
+    def EncodeString(string):
+        """Returns string as 0x0000-terminated UTF-16 data"""
+        return nme_strings.Encode(string) + b'\0\0'
+
+
+class LazyMessage(Message):
+    """Message whose title and text are decoded from a LazyMessagesBin on first access"""
+    def __init__(self, file, id, tOffset, bOffset):
+        """Inits the LazyMessage"""
+        self.file = file
+        self.id = id
+        self.tOffset = tOffset
+        self.bOffset = bOffset
+        self.editedTitle = None # None until the title is changed
+        self.editedText = None # None until the text is changed
+
+    @property
+    def title(self):
+        """The message title"""
+        if self.editedTitle is not None: return self.editedTitle
+        return self.file.GetString(self.tOffset)
+
+    @title.setter
+    def title(self, value):
+        self.editedTitle = value
+
+    @property
+    def text(self):
+        """The message text"""
+        if self.editedText is not None: return self.editedText
+        return self.file.GetString(self.bOffset)
+
+    @text.setter
+    def text(self, value):
+        self.editedText = value
+
+
+class LazyMessagesBin(MessagesBin):
+    """MessagesBin that memory-maps its file and decodes strings on
+    demand. If another program changes the file in place, the strings
+    that aren't cached or edited can't be read anymore (see Changed())"""
+    CacheSize = 4096 # number of decoded strings to keep around
+    CheckInterval = 0.01 # seconds between checks that the file wasn't changed
+    EncodedStrings = True
+
+    def __init__(self, fp=None):
+        """Inits the LazyMessagesBin"""
+        self.Messages = []
+        self.diagnostics = []
+        self.mapping = None
+        self.handle = None # the mapped file, kept open to check it with fstat
+        self.stat = None # its (size, mtime) when it was mapped
+        self.checked = 0 # time.monotonic() of the last check
+        self.stale = False # True once it's been changed
+        self.fp = None
+        self.cache = collections.OrderedDict() # offset -> string
+        if fp is None: return
+
+        self.Messages = [LazyMessage(self, id - 0x100, tOffset, bOffset) for id, tOffset, bOffset in self.Map(fp)]
+
+    @nme_perf.Timed('LazyMessagesBin.Map')
+    def Map(self, fp):
+        """Maps the file at fp and reads its index table. Only the table
+        is checked (see ParseMessages), since the strings are decoded
+        later on"""
+        self.close()
+        self.handle = open(fp, 'rb')
+        try:
+            stat = os.fstat(self.handle.fileno())
+            self.mapping = mmap.mmap(self.handle.fileno(), 0, access=mmap.ACCESS_READ)
+        except:
+            self.close()
+            raise
+        self.stat = (stat.st_size, stat.st_mtime_ns)
+        self.checked = time.monotonic()
+        self.stale = False
+        self.fp = fp
+
+        # Only the index table is parsed here
+        self.diagnostics = []
+        count, tableEnd = self.ReadTableSize(self.mapping, self.diagnostics)
+        return self.CheckEntries(struct.iter_unpack('>III', self.mapping[4:4 + 12 * count]))
+
+    def Changed(self):
+        """Returns True if another program has changed the mapped file
+        since it was mapped (those that save through a new file and
+        rename it over this one don't count). The strings in it would
+        have changed under their offsets, and reading past its end if it
+        was truncated would crash, so the mapping is dropped: from then
+        on, strings that aren't cached read as empty, and the file can't
+        be saved until the unedited strings are replaced (see nme_reload)"""
+        if self.stale: return True
+        if self.handle is None: return False
+        stat = os.fstat(self.handle.fileno())
+        if (stat.st_size, stat.st_mtime_ns) == self.stat: return False
+
+        # A Snapshot() being saved may still hold the mapping, so it's
+        # closed once that's done with it
+        self.stale = True
+        self.mapping = b''
+        self.handle.close()
+        self.handle = None
+        return True
+
+    def CheckFile(self):
+        """Calls Changed() before the mapping is read, unless that was
+        done very recently. This can't rule out the file being changed
+        right after, but it keeps that window short"""
+        now = time.monotonic()
+        if now - self.checked < self.CheckInterval: return
+        self.checked = now
+        self.Changed()
+
+    def Unreadable(self, msg):
+        """Returns True if msg has strings that weren't edited, and can't
+        be read from the file anymore since it was changed"""
+        if not self.stale or getattr(msg, 'file', None) is not self: return False
+        return msg.editedTitle is None or msg.editedText is None
+
+    def CheckEntries(self, entries):
+        """Yields index table entries, adding a Diagnostic for each
+        string offset past the end of the file"""
+        size = len(self.mapping)
+        for entry, (id, tOffset, bOffset) in enumerate(entries):
+            if tOffset >= size or bOffset >= size:
+                for field, offset in (('title', tOffset), ('text', bOffset)):
+                    if offset < size: continue
+                    self.diagnostics.append(Diagnostic(Diagnostic.Error, 'out-of-range', 'points past the end of the file', entry, field, offset))
+            yield id, tOffset, bOffset
+
+    def Reopen(self, fp, snapshot=None):
+        """Maps fp again after the file (or a Snapshot() of it) has been
+        saved there. The messages are pointed at their new offsets, so
+        that edited strings can be dropped and decoded from the file again"""
+        if snapshot is None: saved = zip(self.Messages, self.Messages)
+        else: saved = zip(snapshot.originals, snapshot.Messages)
+
+        for (msg, savedMsg), (id, tOffset, bOffset) in zip(saved, self.Map(fp)):
+            # Messages added after opening hold their own strings anyway
+            if getattr(msg, 'file', None) is not self: continue
+
+            # Strings edited since the snapshot was taken weren't saved
+            if msg.editedTitle is savedMsg.editedTitle:
+                msg.tOffset, msg.editedTitle = tOffset, None
+            if msg.editedText is savedMsg.editedText:
+                msg.bOffset, msg.editedText = bOffset, None
+
+    @nme_perf.Timed('LazyMessagesBin.Snapshot')
+    def Snapshot(self):
+        """Returns a copy of the file as it is now, which can be saved
+        from another thread while this one keeps being edited. It shares
+        the file mapping, so that has to stay open until it's saved"""
+        self.Changed()
+        snapshot = LazyMessagesBin()
+        snapshot.mapping = self.mapping
+        snapshot.fp = self.fp
+        snapshot.stale = self.stale
+        if self.handle is not None:
+            # It checks the file from the saving thread, with a handle of
+            # its own (closed along with it)
+            snapshot.handle = os.fdopen(os.dup(self.handle.fileno()), 'rb')
+            snapshot.stat = self.stat
+        snapshot.originals = list(self.Messages)
+
+        messages = []
+        for msg in snapshot.originals:
+            if getattr(msg, 'file', None) is not self:
+                messages.append(Message(msg.id, msg.title, msg.text))
+                continue
+            copy = LazyMessage(snapshot, msg.id, msg.tOffset, msg.bOffset)
+            copy.editedTitle, copy.editedText = msg.editedTitle, msg.editedText
+            messages.append(copy)
+        snapshot.Messages = messages
+        return snapshot
+
+    def Replace(self, temp, fp, snapshot=None):
+        """Moves a file saved at temp over fp (which may well be the
+        mapped file) and maps it instead"""
+        # Mapped files can't be replaced on Windows
+        oldFp, stale = self.fp, self.stale
+        self.close()
+        try: os.replace(temp, fp)
+        except:
+            # Nothing changed, so the offsets are still right
+            if stale: self.mapping = b''
+            else: self.Map(oldFp)
+            raise
+
+        SyncDirectory(fp)
+        self.Reopen(fp, snapshot)
+
+    def close(self):
+        """Closes the file mapping"""
+        self.cache.clear()
+        if isinstance(self.mapping, mmap.mmap): self.mapping.close()
+        self.mapping = None
+        if self.handle is not None: self.handle.close()
+        self.handle = None
+
+    def GetString(self, offset):
+        """Returns the string at offset, decoding it if it isn't cached"""
+        cache = self.cache
+        string = cache.get(offset)
+        if string is not None:
+            cache.move_to_end(offset)
+            return string
+
+        self.CheckFile()
+        string = self.ReadString(self.mapping, offset)
+        cache[offset] = string
+        if len(cache) > self.CacheSize: cache.popitem(last=False)
+        return string
+
+    def GetStringData(self, offset):
+        """Returns the raw data of the string at offset, including its
+        terminator. Raises ValueError if the file was changed"""
+        self.CheckFile()
+        if self.stale: raise ValueError('%s was changed by another program' % self.fp)
+        end = self.mapping.find(b'\x00\x00', offset)
+        if end != -1 and not (end - offset) & 1: return self.mapping[offset:end + 2] # the usual case
+        end = self.FindStringEnd(self.mapping, offset)
+        return self.mapping[offset:end] + b'\0\0'
+
+    def MessageSizes(self, msg):
+        """Returns the sizes of the title and text of msg in file data"""
+        if getattr(msg, 'file', None) is not self: return MessagesBin.MessageSizes(self, msg)
+
+        self.CheckFile()
+        if msg.editedTitle is None: titleSize = self.FindStringEnd(self.mapping, msg.tOffset) - msg.tOffset + 2
+        else: titleSize = 2 * Units(msg.editedTitle) + 2
+        if msg.editedText is None: textSize = self.FindStringEnd(self.mapping, msg.bOffset) - msg.bOffset + 2
+        else: textSize = 2 * Units(msg.editedText) + 2
+        return titleSize, textSize
+
+    def EncodeMessage(self, msg):
+        """Returns the title and text of msg as file data, including
+        terminators. Untouched strings are copied straight from the file"""
+        if getattr(msg, 'file', None) is not self: return MessagesBin.EncodeMessage(self, msg)
+
+        if msg.editedTitle is None: title = self.GetStringData(msg.tOffset)
+        else: title = self.EncodeString(msg.editedTitle)
+        if msg.editedText is None: text = self.GetStringData(msg.bOffset)
+        else: text = self.EncodeString(msg.editedText)
+        return title, text
+
+
+class ColumnarMessage():
+    """Message whose ID and strings live in the columns of a
+    ColumnarMessagesBin. These are only views, made as messages are
+    looked up; views of the same message are equal, and hash alike, so
+    any of them can stand in for the message"""
+    __slots__ = ('file', 'slot')
+
+    def __init__(self, file, slot):
+        """Inits the ColumnarMessage"""
+        self.file = file
+        self.slot = slot
+
+    def __eq__(self, other):
+        """Returns True if other is a view of the same message"""
+        return other.__class__ is ColumnarMessage and other.slot == self.slot and other.file is self.file
+
+    def __hash__(self):
+        """Hashes the message the view is of"""
+        return hash(self.slot)
+
+    @property
+    def id(self):
+        """The message ID"""
+        return self.file.idColumn[self.slot] - 0x100
+
+    @id.setter
+    def id(self, value):
+        self.file.idColumn[self.slot] = value + 0x100
+
+    @property
+    def title(self):
+        """The message title"""
+        return self.file.ReadTitle(self.slot)
+
+    @title.setter
+    def title(self, value):
+        self.file.Rewrite(self.slot, title=value)
+
+    @property
+    def text(self):
+        """The message text"""
+        return self.file.ReadText(self.slot)
+
+    @text.setter
+    def text(self, value):
+        self.file.Rewrite(self.slot, text=value)
+
+    def toPyObject(self):
+        """Py2 / Py3 compatibility"""
+        return self
+
+
+class ColumnarMessages(collections.abc.MutableSequence):
+    """The messages of a ColumnarMessagesBin, as a list. Views of them
+    are made as they're needed"""
+    def __init__(self, file):
+        """Inits ColumnarMessages"""
+        self.file = file
+
+    def __len__(self):
+        """Returns the number of messages"""
+        return len(self.file.order)
+
+    def __getitem__(self, index):
+        """Returns the message at index, or a list of them for a slice"""
+        if isinstance(index, slice): return [self.file.View(slot) for slot in self.file.order[index]]
+        return self.file.View(self.file.order[index])
+
+    def __setitem__(self, index, msg):
+        """Replaces the message at index, or the messages in a slice"""
+        if isinstance(index, slice): self.file.order[index] = array.array('I', map(self.file.Adopt, msg))
+        else: self.file.order[index] = self.file.Adopt(msg)
+        self.file.packed = False
+
+    def __delitem__(self, index):
+        """Removes the message at index, or the messages in a slice"""
+        del self.file.order[index]
+        self.file.packed = False
+
+    def __iter__(self):
+        """Yields the messages in order"""
+        file = self.file
+        if file.foreign:
+            for slot in file.order: yield file.View(slot)
+        else:
+            for slot in file.order: yield ColumnarMessage(file, slot)
+
+    def index(self, msg):
+        """Returns the row of msg, looking for its slot rather than
+        comparing views. Raises ValueError if it isn't in the file"""
+        try: return self.file.order.index(self.file.SlotOf(msg))
+        except KeyError: raise ValueError('the message isn\'t in the file')
+
+    def insert(self, index, msg):
+        """Inserts a message before index"""
+        self.file.order.insert(index, self.file.Adopt(msg))
+        self.file.packed = False
+
+    def extend(self, messages):
+        """Adds messages to the end"""
+        self.file.order.extend(array.array('I', map(self.file.Adopt, messages)))
+        self.file.packed = False
+
+
+class ColumnarIdIndex(IdIndex):
+    """IdIndex of a ColumnarMessagesBin. It holds slots rather than
+    messages, so it doesn't keep a view of every message around"""
+    def __init__(self, file):
+        """Inits the ColumnarIdIndex"""
+        self.file = file
+        self.messages = {} # id -> slot, or list of slots if there are several
+        self.duplicates = set()
+        ids, foreign = file.idColumn, file.foreign
+        for slot in file.order:
+            self.AddSlot(foreign[slot].id if slot in foreign else ids[slot] - 0x100, slot)
+
+    def Add(self, msg):
+        """Adds a message to the index"""
+        self.AddSlot(msg.id, self.file.SlotOf(msg))
+
+    def AddSlot(self, id, slot):
+        """Adds a message to the index by its slot"""
+        group = self.messages.get(id)
+        if group is None: self.messages[id] = slot
+        elif isinstance(group, list): group.append(slot)
+        else:
+            self.messages[id] = [group, slot]
+            self.duplicates.add(id)
+
+    def Remove(self, msg, id=None):
+        """Removes a message from the index. id is the ID it was added
+        under, if that's not msg.id anymore"""
+        if id is None: id = msg.id
+        group = self.messages[id]
+        if not isinstance(group, list):
+            del self.messages[id]
+            return
+
+        group.remove(self.file.SlotOf(msg))
+        if len(group) == 1:
+            self.messages[id] = group[0]
+            self.duplicates.discard(id)
+
+    def Lookup(self, id):
+        """Returns the messages with the given ID"""
+        group = self.messages.get(id)
+        if group is None: return []
+        if not isinstance(group, list): return [self.file.View(group)]
+        return [self.file.View(slot) for slot in group]
+
+
+class ColumnarMessagesBin(MessagesBin):
+    """MessagesBin that keeps its messages in columns instead of one
+    object each: IDs in an array, and strings one after another in a
+    buffer, as file data, with arrays of where each message's are.
+    file.Messages still works like a list, of ColumnarMessage views.
+    Each message is in a slot, which stays the same as it's moved
+    around; the order of the slots is the order of the messages.
+    Messages added from outside are kept as they are, since something
+    else may be holding on to them"""
+    EncodedStrings = True
+    StoreBatchSize = 4096 # messages encoded at once by Store()
+    PackThreshold = 1024 * 1024 # bytes of old strings allowed to pile up...
+    PackRatio = 0.5 # ...and the share of the buffer they can take up
+    WriteSize = 1024 * 1024 # bytes written at once by saveTo()
+
+    def __init__(self, data=None):
+        """Inits the ColumnarMessagesBin"""
+        self.Clear()
+        self.diagnostics = []
+        if data is not None: self.InitFromData(data)
+
+    def Clear(self):
+        """Removes all messages"""
+        self.idColumn = array.array('I') # slot -> ID + 0x100, as in the file
+        self.starts = array.array('I') # slot -> where its title starts in strings
+        self.splits = array.array('I') # slot -> where its text starts
+        self.ends = array.array('I') # slot -> where its text ends, after the terminator
+        self.strings = bytearray()
+        self.order = array.array('I') # row -> slot
+        self.foreign = {} # slot -> message from outside
+        self.foreignSlots = {} # message from outside -> slot
+        self.garbage = 0 # bytes of strings nothing uses anymore
+        self.packed = True # True if the rows' strings are in order at the start of the buffer
+        self.packedEnd = 0 # where they end, if so
+        self._Messages = ColumnarMessages(self)
+        self.idIndex = None
+
+    @property
+    def Messages(self):
+        """The list of messages. Replacing it resets the ID index; change
+        it through InsertMessage, RemoveMessage and SetId to keep the
+        index up to date instead"""
+        return self._Messages
+
+    @Messages.setter
+    def Messages(self, messages):
+        self.order = array.array('I', map(self.Adopt, messages))
+        self.idIndex = None
+        self.packed = False
+
+    @property
+    def ids(self):
+        """The IdIndex of the messages, built the first time it's needed"""
+        if self.idIndex is None: self.idIndex = ColumnarIdIndex(self)
+        return self.idIndex
+
+    def View(self, slot):
+        """Returns the message in slot"""
+        if self.foreign:
+            msg = self.foreign.get(slot)
+            if msg is not None: return msg
+        return ColumnarMessage(self, slot)
+
+    def SlotOf(self, msg):
+        """Returns the slot of a message in the file"""
+        if getattr(msg, 'file', None) is self: return msg.slot
+        return self.foreignSlots[msg]
+
+    def Adopt(self, msg):
+        """Returns the slot of msg, giving it a new one if it's from outside"""
+        if getattr(msg, 'file', None) is self: return msg.slot
+        slot = self.foreignSlots.get(msg)
+        if slot is not None: return slot
+
+        slot = self.NewSlot(0, 0, 0, 0)
+        self.foreign[slot] = msg
+        self.foreignSlots[msg] = slot
+        return slot
+
+    def NewSlot(self, id, start, split, end):
+        """Adds a slot and returns it"""
+        self.idColumn.append(id)
+        self.starts.append(start)
+        self.splits.append(split)
+        self.ends.append(end)
+        return len(self.idColumn) - 1
+
+    def ReadTitle(self, slot):
+        """Returns the title in slot"""
+        return self.DecodeString(self.strings[self.starts[slot]:self.splits[slot] - 2])
+
+    def ReadText(self, slot):
+        """Returns the text in slot"""
+        return self.DecodeString(self.strings[self.splits[slot]:self.ends[slot] - 2])
+
+    def Rewrite(self, slot, title=None, text=None):
+        """Changes the strings in slot. The new ones go at the end of
+        the buffer, and the old ones are left behind until Pack()"""
+        start, split, end = self.starts[slot], self.splits[slot], self.ends[slot]
+        title = self.strings[start:split] if title is None else self.EncodeString(title)
+        text = self.strings[split:end] if text is None else self.EncodeString(text)
+        self.garbage += end - start
+
+        newStart = len(self.strings)
+        self.strings += title
+        self.strings += text
+        self.starts[slot], self.splits[slot], self.ends[slot] = newStart, newStart + len(title), len(self.strings)
+        self.packed = False
+        if self.garbage > self.PackThreshold and self.garbage > len(self.strings) * self.PackRatio: self.Pack()
+
+    @nme_perf.Timed('ColumnarMessagesBin.InitFromData')
+    def InitFromData(self, data):
+        """Inits the ColumnarMessagesBin from file data. Problems with it
+        are listed in self.diagnostics, and whatever's readable is kept"""
+        self.Clear()
+        self.diagnostics = []
+        if not self.TakeData(data): self.Store(self.ParseMessages(data, self.diagnostics))
+        nme_perf.Count('messages parsed', len(self.order))
+
+    def TakeData(self, data):
+        """Takes the strings of file data as they are, without decoding
+        them, if they're laid out the way save() does it: one after
+        another, in order, with nothing in between. Returns False if
+        they aren't, or if anything else is wrong with the data"""
+        size = len(data)
+        if size < 4: return False
+        count = struct.unpack_from('>I', data, 0)[0]
+        tableEnd = 4 + 12 * count
+        if size < tableEnd or (size - tableEnd) & 1: return False
+
+        table = array.array('I', data[4:tableEnd])
+        if sys.byteorder == 'little': table.byteswap()
+        bounds = array.array('I', bytes(4 * (2 * count + 1)))
+        bounds[0:-1:2] = table[1::3]
+        bounds[1:-1:2] = table[2::3]
+        bounds[-1] = size
+        if bounds[0] != tableEnd: return False
+
+        # Each string has to end with the only terminator in it, right
+        # before the next one starts. Strings are only decoded as
+        # they're read, so lone surrogates are refused here if need be
+        errors = 'strict' if nme_strings.Errors == 'strict' else 'surrogatepass'
+        if utf_16_be_decode(data[tableEnd:size], errors, True)[0].count('\0') != 2 * count: return False
+        previous = tableEnd
+        for bound in bounds[1:]:
+            if bound <= previous or bound > size or bound & 1 or data[bound - 1] or data[bound - 2]: return False
+            previous = bound
+
+        offsets = array.array('I', [bound - tableEnd for bound in bounds])
+        self.idColumn = table[0::3]
+        self.starts = offsets[0:-1:2]
+        self.splits = offsets[1::2]
+        self.ends = offsets[2::2]
+        self.strings = bytearray(data[tableEnd:size])
+        self.order = array.array('I', range(count))
+        self.packed = True
+        self.packedEnd = len(self.strings)
+        return True
+
+    def Store(self, messages):
+        """Copies messages into new slots at the end of the file. Unlike
+        AppendMessages, the messages themselves aren't kept"""
+        packed = self.packed and self.packedEnd == len(self.strings)
+        messages = iter(messages)
+        while True:
+            batch = list(itertools.islice(messages, self.StoreBatchSize))
+            if not batch: break
+
+            # All of the strings are encoded in one go; each one is
+            # terminated, so the join leaves them ready to use
+            strings = [string for msg in batch for string in (msg.title, msg.text)]
+            sizes = (2 * Units(string) + 2 for string in strings)
+            bounds = array.array('I', itertools.accumulate(itertools.chain((len(self.strings),), sizes)))
+            self.strings += self.EncodeString('\0'.join(strings))
+
+            first = len(self.idColumn)
+            self.idColumn.extend([msg.id + 0x100 for msg in batch])
+            self.starts.extend(bounds[0:-1:2])
+            self.splits.extend(bounds[1::2])
+            self.ends.extend(bounds[2::2])
+            self.order.extend(range(first, len(self.idColumn)))
+            if self.idIndex is not None:
+                for slot in range(first, len(self.idColumn)): self.idIndex.AddSlot(self.idColumn[slot] - 0x100, slot)
+
+        self.packed = packed
+        if packed: self.packedEnd = len(self.strings)
+
+    @nme_perf.Timed('ColumnarMessagesBin.Pack')
+    def Pack(self):
+        """Rewrites the buffer with the messages' strings in order, as
+        they're saved, leaving out old strings that have been replaced.
+        Removed messages keep theirs (after the rest), since a view of
+        one could still be around to put it back"""
+        Unset = 0xFFFFFFFF
+        count = len(self.idColumn)
+        starts = array.array('I', [Unset]) * count
+        splits = array.array('I', bytes(4 * count))
+        ends = array.array('I', bytes(4 * count))
+        strings = bytearray()
+        oldStarts, oldSplits, oldEnds = self.starts, self.splits, self.ends
+        foreign = self.foreign
+        packed = True
+
+        with memoryview(self.strings) as oldStrings:
+            for slot in self.order:
+                if starts[slot] != Unset:
+                    packed = False # the same message is in more than one row
+                    continue
+
+                start = len(strings)
+                if slot in foreign:
+                    # Only saved, since these hold their own strings
+                    msg = foreign[slot]
+                    title, text = MessagesBin.EncodeMessage(self, msg)
+                    self.idColumn[slot] = msg.id + 0x100
+                    strings += title
+                    strings += text
+                    split = start + len(title)
+                else:
+                    oldStart = oldStarts[slot]
+                    strings += oldStrings[oldStart:oldEnds[slot]]
+                    split = start + oldSplits[slot] - oldStart
+                starts[slot], splits[slot], ends[slot] = start, split, len(strings)
+            packedEnd = len(strings)
+
+            for slot in range(count):
+                if starts[slot] != Unset or slot in foreign: continue
+                start = oldStarts[slot]
+                starts[slot] = len(strings)
+                splits[slot] = len(strings) + oldSplits[slot] - start
+                strings += oldStrings[start:oldEnds[slot]]
+                ends[slot] = len(strings)
+
+        # Messages from outside that were removed are let go of, and
+        # their slots are left empty
+        for slot in [slot for slot in foreign if starts[slot] == Unset]:
+            del self.foreignSlots[foreign.pop(slot)]
+            starts[slot] = 0
+
+        self.starts, self.splits, self.ends, self.strings = starts, splits, ends, strings
+        self.garbage = 0
+        self.packed = packed
+        self.packedEnd = packedEnd
+
+    @nme_perf.Timed('ColumnarMessagesBin.Snapshot')
+    def Snapshot(self):
+        """Returns a copy of the file as it is now, which can be saved
+        from another thread while this one keeps being edited"""
+        snapshot = ColumnarMessagesBin()
+        for name in ('idColumn', 'starts', 'splits', 'ends', 'order', 'strings'):
+            setattr(snapshot, name, getattr(self, name)[:])
+        snapshot.garbage, snapshot.packed, snapshot.packedEnd = self.garbage, self.packed, self.packedEnd
+        for slot, msg in self.foreign.items():
+            copy = Message(msg.id, msg.title, msg.text)
+            snapshot.foreign[slot] = copy
+            snapshot.foreignSlots[copy] = slot
+        return snapshot
+
+    def Table(self):
+        """Returns the header and index table of the file, which has to
+        be packed. It's built a column at a time"""
+        order, count = self.order, len(self.order)
+        tableEnd = 4 + 12 * count
+        ids, starts, splits = self.idColumn, self.starts, self.splits
+
+        table = array.array('I', bytes(tableEnd)) # 'I' is 32 bits wherever Python runs
+        table[0] = count
+        table[1::3] = array.array('I', [ids[slot] for slot in order])
+        table[2::3] = array.array('I', [tableEnd + starts[slot] for slot in order])
+        table[3::3] = array.array('I', [tableEnd + splits[slot] for slot in order])
+        if sys.byteorder == 'little': table.byteswap()
+        return table.tobytes()
+
+    @nme_perf.Timed('ColumnarMessagesBin.save')
+    def save(self, compact=False):
+        """Returns data that can be saved to a file"""
+        if compact: return MessagesBin.save(self, True)
+        if not self.packed or self.foreign: self.Pack()
+        if not self.packed: return MessagesBin.save(self)
+
+        data = bytearray(self.Table())
+        with memoryview(self.strings) as strings: data += strings[:self.packedEnd]
+        return data
+
+    @nme_perf.Timed('ColumnarMessagesBin.saveTo')
+    def saveTo(self, file, progress=None, compact=False):
+        """Writes the file to a file object, a big piece at a time.
+        progress(done, total) is called after every piece, with done
+        worked out from how much has been written"""
+        if compact: return MessagesBin.saveTo(self, file, progress, True)
+        if not self.packed or self.foreign: self.Pack()
+        if not self.packed: return MessagesBin.saveTo(self, file, progress)
+
+        file.write(self.Table())
+        total, size = len(self.order), self.packedEnd
+        with memoryview(self.strings) as strings:
+            for start in range(0, size, self.WriteSize):
+                if progress is not None: progress(total * start // size, total)
+                file.write(strings[start:min(start + self.WriteSize, size)])
+        if progress is not None: progress(total, total)
+
+    def MessageSizes(self, msg):
+        """Returns the sizes of the title and text of msg in file data"""
+        if getattr(msg, 'file', None) is not self: return MessagesBin.MessageSizes(self, msg)
+        slot = msg.slot
+        return self.splits[slot] - self.starts[slot], self.ends[slot] - self.splits[slot]
+
+    def EncodeMessage(self, msg):
+        """Returns the title and text of msg as file data, including
+        terminators, straight from the buffer"""
+        if msg.__class__ is not ColumnarMessage or msg.file is not self: return MessagesBin.EncodeMessage(self, msg)
+        slot, strings = msg.slot, self.strings
+        split = self.splits[slot]
+        return bytes(strings[self.starts[slot]:split]), bytes(strings[split:self.ends[slot]])
+
+
+def ParseData(data):
+    """Parses file data that's already been read. Big files are kept in
+    columns, which takes much less memory than a Message for each one"""
+    if len(data) >= ColumnarThreshold: return ColumnarMessagesBin(data)
+    return MessagesBin(data)
+
+
+def OpenFile(fp):
+    """Opens the messages.bin at fp. Big files are mapped and decoded on demand"""
+    if os.path.getsize(fp) >= LazyLoadThreshold: return LazyMessagesBin(fp)
+
+    with open(fp, 'rb') as file: data = file.read()
+    return MessagesBin(data)
+
+
+def OpenFileInChunks(fp, chunkSize=4096, firstChunkSize=256):
+    """Opens the messages.bin at fp like OpenFile, but returns it still
+    empty. Also returns the number of messages in it and a generator
+    that parses them and yields them in lists: firstChunkSize messages,
+    and then chunkSize at a time, so that the first ones are ready
+    quickly however big the file is. Add them with AppendMessages.
+    Problems with the file are listed in file.diagnostics as they're found"""
+    if os.path.getsize(fp) >= LazyLoadThreshold:
+        file = LazyMessagesBin()
+        try: entries = file.Map(fp)
+        except:
+            file.close()
+            raise
+        count = file.ReadTableSize(file.mapping, [])[0]
+        messages = (LazyMessage(file, id - 0x100, tOffset, bOffset) for id, tOffset, bOffset in entries)
+    else:
+        with open(fp, 'rb') as f: data = f.read()
+        file = MessagesBin()
+        count = file.ReadTableSize(data, [])[0]
+        messages = file.ParseMessages(data, file.diagnostics)
+
+    def chunks():
+        """Yields the messages in chunks"""
+        size = firstChunkSize
+        while True:
+            with nme_perf.Timer('load chunk'): chunk = list(itertools.islice(messages, size))
+            if not chunk: return
+            yield chunk
+            size = chunkSize
+
+    return file, count, chunks()
+
+
+def WriteTemporaryFile(fp, write):
+    """Calls write(file) to write a temporary file next to fp, and
+    makes sure it's on the disk. Returns the temporary file's path"""
+    temp = '%s.%d.tmp' % (fp, os.getpid())
+    flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0)
+    fd = os.open(temp, flags, 0o666)
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            write(file)
+            file.flush()
+            os.fsync(file.fileno())
+        if os.path.exists(fp): shutil.copymode(fp, temp)
+    except BaseException: # KeyboardInterrupt too
+        os.remove(temp)
+        raise
+    return temp
+
+
+def SyncDirectory(fp):
+    """Makes sure the directory entry of fp is on the disk, where
+    that's possible"""
+    if os.name != 'posix': return
+    fd = os.open(os.path.dirname(os.path.abspath(fp)), os.O_RDONLY)
+    try: os.fsync(fd)
+    finally: os.close(fd)
+
+
+def ReplaceFile(fp, write):
+    """Writes fp by calling write(file) through a temporary file, so
+    that fp is either completely replaced or left alone, even if the
+    program or the computer crashes halfway through"""
+    temp = WriteTemporaryFile(fp, write)
+    try: os.replace(temp, fp)
+    except BaseException:
+        os.remove(temp)
+        raise
+    SyncDirectory(fp)
@@ -0,0 +1,363 @@
+#!/usr/bin/python
+# -*- coding: latin-1 -*-
+
+# Newer Messages Editor - Edits NewerSMBW's messages.bin
+# Version 1.3
+# Copyright (C) 2013-2014 RoadrunnerWMC
+
+# This file is part of Newer Messages Editor.
+
+# Newer Messages Editor is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Newer Messages Editor is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Newer Messages Editor.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# nme_diff.py
+# Keyed diffs between messages.bin files, and compact patch files that
+# apply them. Messages are matched up by ID (and, for duplicated IDs, by
+# which of them it is), rather than by position, so a patch still
+# applies to a file that other mods have added their own messages to.
+# Each message's content is hashed, so files are compared in linear
+# time, and a patch can tell when it's applied to the wrong version of
+# a message.
+
+
+################################################################
+################################################################
+
+# Imports
+import bisect, collections, hashlib, itertools, struct
+
+from nme_core import Message, MessagesBin
+
+
+# Patch file format
+Magic = b'NMEP'
+FormatVersion = 2 # version 1 stored IDs without the 0x100 bias, so it couldn't store negative ones
+HashSize = 8 # bytes of each message's content hash
+PatchExtension = '.nmpatch'
+
+# Record types in patch files
+OpRemove = 1 # key, base hash
+OpChange = 2 # key, base hash, fields, new strings
+OpAdd = 3 # key, title, text
+OpPlace = 4 # key, anchor: puts an added or moved message after anchor
+
+# Fields of OpChange
+FieldTitle = 1
+FieldText = 2
+
+HeaderStruct = struct.Struct('>4sHHIII') # magic, version, flags, base count, result count, records
+KeyStruct = struct.Struct('>BII') # op, ID + 0x100 (as in messages.bin), occurrence
+
+
+def Keys(messages):
+    """Returns the key of each message: (ID, occurrence), where
+    occurrence counts earlier messages with the same ID"""
+    ids = [msg.id for msg in messages]
+    if len(set(ids)) == len(ids): return list(zip(ids, itertools.repeat(0)))
+
+    keys = []
+    seen = {}
+    for id in ids:
+        n = seen.get(id, 0)
+        seen[id] = n + 1
+        keys.append((id, n))
+    return keys
+
+
+def Contents(file, encoded):
+    """Returns (title, text) for each message in file, to compare them
+    by: the strings themselves, or if encoded is True, their file data,
+    which files that keep their strings encoded can give without
+    decoding anything"""
+    if encoded: return [file.EncodeMessage(msg) for msg in file.Messages]
+    return [(msg.title, msg.text) for msg in file.Messages]
+
+
+def MessageHash(file, msg):
+    """Returns the content hash of msg, a message in file. It's taken
+    over the message as it's stored, so lazily loaded strings don't
+    have to be decoded"""
+    title, text = file.EncodeMessage(msg)
+    return hashlib.blake2b(title + text, digest_size=HashSize).digest()
+
+
+def StableIndexes(sequence):
+    """Returns the set of indexes into sequence of a longest increasing
+    subsequence of it: the messages that can stay where they are, while
+    the rest are moved around them"""
+    if all(a < b for a, b in zip(sequence, sequence[1:])): return set(range(len(sequence)))
+
+    tails = [] # smallest value ending an increasing run of each length
+    tailIndexes = []
+    parents = [None] * len(sequence)
+    for i, value in enumerate(sequence):
+        length = bisect.bisect_left(tails, value)
+        if length == len(tails):
+            tails.append(value)
+            tailIndexes.append(i)
+        else:
+            tails[length] = value
+            tailIndexes[length] = i
+        parents[i] = tailIndexes[length - 1] if length else None
+
+    stable = set()
+    i = tailIndexes[-1] if tailIndexes else None
+    while i is not None:
+        stable.add(i)
+        i = parents[i]
+    return stable
+
+
+class Patch():
+    """Changes that turn one messages.bin file into another, keyed by
+    message ID. Made by Diff(), and saved and loaded with toBytes() and
+    FromBytes()"""
+    def __init__(self):
+        """Inits the Patch"""
+        self.baseCount = 0 # messages in the file it was made from...
+        self.resultCount = 0 # ...and in the file it makes
+        self.removed = [] # (key, base hash)
+        self.changed = [] # (key, base hash, new title or None, new text or None)
+        self.added = [] # (key, title, text)
+        self.placed = [] # (key, anchor key or None), for added and moved messages, in their new order
+
+    def IsEmpty(self):
+        """Returns True if the patch doesn't change anything"""
+        return not (self.removed or self.changed or self.added or self.placed)
+
+    def Moved(self):
+        """Returns the keys of the messages that are moved, but not added"""
+        added = set(key for key, title, text in self.added)
+        return [key for key, anchor in self.placed if key not in added]
+
+    def Summary(self):
+        """Returns the number of messages the patch touches, by change"""
+        return collections.OrderedDict([
+            ('added', len(self.added)),
+            ('removed', len(self.removed)),
+            ('changed', len(self.changed)),
+            ('moved', len(self.Moved())),
+            ])
+
+    def toBytes(self):
+        """Returns the patch as patch file data"""
+        records = len(self.removed) + len(self.changed) + len(self.added) + len(self.placed)
+        data = [HeaderStruct.pack(Magic, FormatVersion, 0, self.baseCount, self.resultCount, records)]
+        EncodeString = MessagesBin.EncodeString
+
+        for key, hash in self.removed:
+            data.append(KeyStruct.pack(OpRemove, key[0] + 0x100, key[1]))
+            data.append(hash)
+        for key, hash, title, text in self.changed:
+            data.append(KeyStruct.pack(OpChange, key[0] + 0x100, key[1]))
+            data.append(hash)
+            data.append(bytes([(FieldTitle if title is not None else 0) | (FieldText if text is not None else 0)]))
+            if title is not None: data.append(EncodeString(title))
+            if text is not None: data.append(EncodeString(text))
+        for key, title, text in self.added:
+            data.append(KeyStruct.pack(OpAdd, key[0] + 0x100, key[1]))
+            data.append(EncodeString(title))
+            data.append(EncodeString(text))
+        for key, anchor in self.placed:
+            data.append(KeyStruct.pack(OpPlace, key[0] + 0x100, key[1]))
+            if anchor is None: data.append(b'\0')
+            else: data.append(b'\1' + struct.pack('>II', anchor[0] + 0x100, anchor[1]))
+
+        return b''.join(data)
+
+    @staticmethod
+    def FromBytes(data):
+        """Returns the Patch in patch file data. Raises ValueError if
+        it isn't valid"""
+        if len(data) < HeaderStruct.size or data[:4] != Magic: raise ValueError('not a patch file')
+        magic, version, flags, baseCount, resultCount, records = HeaderStruct.unpack_from(data)
+        if version not in (1, FormatVersion): raise ValueError('unsupported patch file version: %d' % version)
+        bias = 0x100 if version >= 2 else 0
+
+        patch = Patch()
+        patch.baseCount, patch.resultCount = baseCount, resultCount
+        offset = HeaderStruct.size
+
+        def String():
+            """Reads a string at offset"""
+            nonlocal offset
+            end = MessagesBin.FindStringEnd(data, offset)
+            if end + 2 > len(data): raise ValueError('the patch file is cut off')
+            string = MessagesBin.ReadString(data, offset)
+            offset = end + 2
+            return string
+
+        def Read(size):
+            """Reads size bytes at offset"""
+            nonlocal offset
+            if offset + size > len(data): raise ValueError('the patch file is cut off')
+            offset += size
+            return data[offset - size:offset]
+
+        for i in range(records):
+            op, id, n = KeyStruct.unpack(Read(KeyStruct.size))
+            key = id - bias, n
+            if op == OpRemove: patch.removed.append((key, Read(HashSize)))
+            elif op == OpChange:
+                hash = Read(HashSize)
+                fields = Read(1)[0]
+                title = String() if fields & FieldTitle else None
+                text = String() if fields & FieldText else None
+                patch.changed.append((key, hash, title, text))
+            elif op == OpAdd:
+                title = String()
+                patch.added.append((key, title, String()))
+            elif op == OpPlace:
+                if Read(1)[0]:
+                    id, n = struct.unpack('>II', Read(8))
+                    anchor = id - bias, n
+                else: anchor = None
+                patch.placed.append((key, anchor))
+            else: raise ValueError('unknown record type %d in the patch file' % op)
+
+        if offset != len(data): raise ValueError('unexpected data at the end of the patch file')
+        return patch
+
+    def Conflicts(self, file):
+        """Returns a list of descriptions of the reasons the patch can't
+        be applied cleanly to file: messages that it changes or removes
+        that are missing or different, and messages that it adds that
+        are already there"""
+        index = dict(zip(Keys(file.Messages), file.Messages))
+        conflicts = []
+
+        for key, hash in self.removed + [(key, hash) for key, hash, title, text in self.changed]:
+            msg = index.get(key)
+            if msg is None: conflicts.append('%s isn\'t in the file' % KeyName(key))
+            elif MessageHash(file, msg) != hash: conflicts.append('%s has been changed' % KeyName(key))
+        for key, title, text in self.added:
+            if key in index: conflicts.append('%s is already in the file' % KeyName(key))
+
+        # Added and moved messages go after messages that have to be there
+        placed = set(key for key, anchor in self.placed)
+        removed = set(key for key, hash in self.removed)
+        for key, anchor in self.placed:
+            if anchor is not None and anchor not in placed and (anchor not in index or anchor in removed):
+                conflicts.append('%s goes after %s, which isn\'t in the file' % (KeyName(key), KeyName(anchor)))
+
+        return conflicts
+
+    def Apply(self, file, force=False):
+        """Applies the patch to file (a MessagesBin), changing it in
+        place. Raises ValueError if it doesn't apply cleanly (see
+        Conflicts()), unless force is True: then whatever can be applied
+        is, and messages whose place can't be found go at the end"""
+        if not force:
+            conflicts = self.Conflicts(file)
+            if conflicts:
+                more = ' (and %d more)' % (len(conflicts) - 1) if len(conflicts) > 1 else ''
+                raise ValueError('the patch doesn\'t match the file: %s%s' % (conflicts[0], more))
+
+        messages = collections.OrderedDict(zip(Keys(file.Messages), file.Messages))
+        for key, hash in self.removed: messages.pop(key, None)
+        for key, hash, title, text in self.changed:
+            msg = messages.get(key)
+            if msg is None: continue
+            if title is not None: msg.title = title
+            if text is not None: msg.text = text
+        for key, title, text in self.added:
+            if key not in messages: messages[key] = Message(key[0], title, text)
+
+        # Everything that isn't placed keeps its order, and placed
+        # messages are threaded in after their anchors
+        placed = set(key for key, anchor in self.placed)
+        followers = {} # anchor -> keys placed after it
+        for key, anchor in self.placed:
+            if key not in messages: continue
+            if anchor is not None and anchor not in messages: anchor = None, None # goes at the end
+            followers.setdefault(anchor, []).append(key)
+
+        result = []
+        emitted = set()
+        def Emit(key):
+            """Adds a message, followed by everything placed after it"""
+            stack = [key]
+            while stack:
+                key = stack.pop()
+                if key in messages and key not in emitted:
+                    result.append(messages[key])
+                    emitted.add(key)
+                stack.extend(reversed(followers.pop(key, ())))
+        Emit(None)
+        for key in messages:
+            if key not in placed: Emit(key)
+        Emit((None, None))
+
+        # Nothing gets lost, even if the patch is damaged
+        result.extend(msg for key, msg in messages.items() if key not in emitted)
+        file.Messages = result
+
+
+def KeyName(key):
+    """Returns a description of a message key"""
+    id, n = key
+    if n: return 'message %d (#%d with that ID)' % (id, n + 1)
+    return 'message %d' % id
+
+
+def Diff(old, new, known=None):
+    """Returns the Patch that turns old into new (both MessagesBins).
+    known gives the content hashes of messages in old, by key, that are
+    to be compared by those instead of their strings"""
+    known = known or {}
+    patch = Patch()
+    patch.baseCount, patch.resultCount = len(old.Messages), len(new.Messages)
+
+    oldKeys, newKeys = Keys(old.Messages), Keys(new.Messages)
+    oldRows = dict(zip(oldKeys, itertools.count()))
+    newRows = dict(zip(newKeys, itertools.count()))
+
+    # Strings are compared directly, or as file data if either file
+    # keeps them that way; only messages that differ are hashed
+    encoded = old.EncodedStrings or new.EncodedStrings
+    oldContents, newContents = Contents(old, encoded), Contents(new, encoded)
+
+    for key, i in oldRows.items():
+        if key not in newRows: patch.removed.append((key, known.get(key) or MessageHash(old, old.Messages[i])))
+
+    common = [] # old rows of messages in both, in their new order
+    for key, j in newRows.items():
+        i = oldRows.get(key)
+        if i is None:
+            msg = new.Messages[j]
+            patch.added.append((key, msg.title, msg.text))
+            continue
+        common.append(i)
+
+        if key in known:
+            msg = new.Messages[j]
+            if MessageHash(new, msg) != known[key]: patch.changed.append((key, known[key], msg.title, msg.text))
+            continue
+
+        oldTitle, oldText = oldContents[i]
+        newTitle, newText = newContents[j]
+        if oldTitle == newTitle and oldText == newText: continue
+        msg = new.Messages[j]
+        patch.changed.append((key, MessageHash(old, old.Messages[i]),
+            msg.title if oldTitle != newTitle else None, msg.text if oldText != newText else None))
+
+    # Messages that are still in the same order relative to each other
+    # stay put, and the rest are moved
+    stable = StableIndexes(common)
+    moved = set(common[k] for k in range(len(common)) if k not in stable)
+    for j, key in enumerate(newKeys):
+        i = oldRows.get(key)
+        if i is None or i in moved: patch.placed.append((key, newKeys[j - 1] if j else None))
+
+    return patch
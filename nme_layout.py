@@ -0,0 +1,228 @@
+#!/usr/bin/python
+# -*- coding: latin-1 -*-
+
+# Newer Messages Editor - Edits NewerSMBW's messages.bin
+# Version 1.3
+# Copyright (C) 2013-2014 RoadrunnerWMC
+
+# This file is part of Newer Messages Editor.
+
+# Newer Messages Editor is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Newer Messages Editor is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Newer Messages Editor.  If not, see <http://www.gnu.org/licenses/>.
+
+
+
+# nme_layout.py
+# Works out how messages look in the game's message box: how wide each
+# line is and whether the title and text fit. Glyph widths come from a
+# lookup table with an entry for every character, so a whole line is
+# measured in one go. The table is built from the game's font (.brfnt)
+# if it's been loaded, and is otherwise a built-in estimate of it.
+# Control codes (see nme_strings) are left out.
+
+
+################################################################
+################################################################
+
+# Imports
+import struct
+
+import nme_strings
+
+
+# The message box, in font pixels. These are estimates, measured from
+# screenshots, so messages right at the limit are worth a look in-game
+TitleWidth = 400 # widest title that fits
+TextWidth = 480 # widest line of text that fits
+TextLines = 6 # most lines of text that fit
+
+# Overflow flags
+TitleTooWide = 1
+TextTooWide = 2
+TooManyLines = 4
+
+# Built-in glyph widths, close to those of the game's message font
+BuiltinWidths = [
+    (7, '\'.,:;!|il'),
+    (10, ' "()[]{}-fjrtI'),
+    (15, '$*+/<=>?\\^_`~abcdeghknopqsuvxyz0123456789FJL'),
+    (18, '#%&ABCDEGHKNOPQRSTUVXYZ'),
+    (23, '@mwMW'),
+    ]
+BuiltinDefault = 15 # accented letters and anything else
+BuiltinWide = 26 # CJK and fullwidth characters
+BuiltinLineHeight = 28
+WideRanges = [(0x1100, 0x115F), (0x2E80, 0xA4CF), (0xAC00, 0xD7A3), (0xF900, 0xFAFF), (0xFE30, 0xFE4F), (0xFF00, 0xFF60), (0xFFE0, 0xFFE6)]
+
+
+class FontMetrics():
+    """Glyph widths of a font. Every character has an entry in a lookup
+    table, so strings are measured with str.translate"""
+    def __init__(self, name, widths, default, lineHeight):
+        """Inits FontMetrics. widths is {character code: width}, and
+        other characters are default wide"""
+        self.name = name
+        self.lineHeight = lineHeight
+
+        # Character n translates to the character numbered its width
+        table = bytearray([min(default, 255)]) * 0x110000
+        for code, width in widths.items(): table[code] = min(width, 255)
+        self.table = table.decode('latin-1')
+
+    def Width(self, line):
+        """Returns the width of a line, in pixels"""
+        return sum(line.translate(self.table).encode('latin-1'))
+
+    def Widths(self, line):
+        """Returns the width of each character in a line, as bytes"""
+        return line.translate(self.table).encode('latin-1')
+
+
+def BuiltinMetrics():
+    """Returns the built-in estimate of the game font's metrics"""
+    widths = {}
+    for first, last in WideRanges:
+        for code in range(first, last + 1): widths[code] = BuiltinWide
+    for width, chars in BuiltinWidths:
+        for c in chars: widths[ord(c)] = width
+    return FontMetrics('Built-in estimate', widths, BuiltinDefault, BuiltinLineHeight)
+
+
+def ReadBrfnt(data, name='Game font'):
+    """Reads the metrics of a Wii font (.brfnt). Raises ValueError if
+    data isn't a usable one"""
+    if len(data) < 16 or data[:4] != b'RFNT': raise ValueError('This isn\'t a .brfnt font')
+    endian = '>' if data[4:6] == b'\xFE\xFF' else '<'
+
+    glyphWidths = {} # glyph index -> width
+    codes = {} # character code -> glyph index
+    info = None
+    try:
+        pos, blocks = struct.unpack_from(endian + 'HH', data, 12)
+        for i in range(blocks):
+            magic, size = struct.unpack_from(endian + '4sI', data, pos)
+            if size < 8: raise ValueError('The font has a block of size %d' % size)
+            body = pos + 8
+
+            if magic == b'FINF':
+                # Line height, the glyph drawn for unmapped characters,
+                # and the default width
+                info = struct.unpack_from(endian + 'BBHbBB', data, body)
+            elif magic == b'CWDH':
+                # (left, glyph width, advance) for a range of glyphs
+                first, last = struct.unpack_from(endian + 'HH', data, body)
+                entries = body + 8
+                for index in range(first, last + 1):
+                    glyphWidths[index] = data[entries + 3 * (index - first) + 2]
+            elif magic == b'CMAP':
+                # Maps a range of character codes to glyphs, directly,
+                # with a table, or with a list of pairs
+                first, last, method = struct.unpack_from(endian + 'HHH', data, body)
+                mapping = body + 12
+                if method == 0:
+                    offset = struct.unpack_from(endian + 'H', data, mapping)[0]
+                    for code in range(first, last + 1): codes[code] = code - first + offset
+                elif method == 1:
+                    indexes = struct.unpack_from(endian + '%dH' % (last - first + 1), data, mapping)
+                    for code, index in zip(range(first, last + 1), indexes):
+                        if index != 0xFFFF: codes[code] = index
+                elif method == 2:
+                    count = struct.unpack_from(endian + 'H', data, mapping)[0]
+                    pairs = struct.unpack_from(endian + '%dH' % (count * 2), data, mapping + 2)
+                    codes.update(zip(pairs[0::2], pairs[1::2]))
+                else: raise ValueError('The font has an unknown character map type (%d)' % method)
+
+            pos += size
+    except (struct.error, IndexError):
+        raise ValueError('The font is cut off or damaged')
+    if info is None: raise ValueError('The font has no FINF block')
+
+    fontType, lineFeed, alterIndex, left, glyphWidth, charWidth = info
+    default = glyphWidths.get(alterIndex, charWidth)
+    widths = dict((code, glyphWidths.get(index, default)) for code, index in codes.items())
+    return FontMetrics(name, widths, default, lineFeed or BuiltinLineHeight)
+
+
+def Lines(text):
+    """Splits message text into the lines shown in the box. Lines only
+    end where the text has a line break; trailing ones aren't shown"""
+    return text.rstrip('\n').split('\n')
+
+
+def Overflow(title, text, metrics):
+    """Returns the overflow flags of a message, which are 0 if it fits"""
+    # Escapes and other control codes don't take up any room
+    title, text = nme_strings.PlainText(title), nme_strings.PlainText(text)
+    flags = 0
+    width = metrics.Width
+    if max(map(width, title.split('\n'))) > TitleWidth: flags |= TitleTooWide
+    lines = Lines(text)
+    if len(lines) > TextLines: flags |= TooManyLines
+    if max(map(width, lines)) > TextWidth: flags |= TextTooWide
+    return flags
+
+
+def DescribeOverflow(flags):
+    """Returns a list of what's wrong, given a message's overflow flags"""
+    problems = []
+    if flags & TitleTooWide: problems.append('the title is too wide')
+    if flags & TextTooWide: problems.append('a line of text is too wide')
+    if flags & TooManyLines: problems.append('there are more than %d lines of text' % TextLines)
+    return problems
+
+
+class Layout():
+    """Title and lines of text of a message, with the widths of their
+    characters, as the message box lays them out"""
+    def __init__(self, title, text, metrics):
+        """Lays out a message"""
+        self.metrics = metrics
+        self.title = nme_strings.PlainText(title).replace('\n', ' ')
+        self.titleWidths = metrics.Widths(self.title)
+        self.lines = Lines(nme_strings.PlainText(text))
+        self.widths = [metrics.Widths(line) for line in self.lines] # per character, per line
+        self.flags = Overflow(title, text, metrics)
+
+
+class OverflowIndex():
+    """Overflow flags of a set of messages, kept up to date as they're
+    added, changed and removed. Only messages that overflow are kept"""
+    def __init__(self, metrics):
+        """Inits the OverflowIndex"""
+        self.metrics = metrics
+        self.flags = {} # message -> overflow flags
+
+    def __len__(self):
+        """Returns the number of messages that overflow"""
+        return len(self.flags)
+
+    def AddMessages(self, messages):
+        """Checks messages and adds the ones that overflow"""
+        metrics, flags = self.metrics, self.flags
+        for msg in messages:
+            overflow = Overflow(msg.title, msg.text, metrics)
+            if overflow: flags[msg] = overflow
+
+    def Update(self, msg):
+        """Checks a message again after it's been edited"""
+        overflow = Overflow(msg.title, msg.text, self.metrics)
+        if overflow: self.flags[msg] = overflow
+        else: self.flags.pop(msg, None)
+
+    def Remove(self, msg):
+        """Forgets a message"""
+        self.flags.pop(msg, None)
+
+    def Flags(self, msg):
+        """Returns the overflow flags of a message"""
+        return self.flags.get(msg, 0)
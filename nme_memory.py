@@ -0,0 +1,180 @@
+#!/usr/bin/python
+# -*- coding: latin-1 -*-
+
+# Newer Messages Editor - Edits NewerSMBW's messages.bin
+# Version 1.3
+# Copyright (C) 2013-2014 RoadrunnerWMC
+
+# This file is part of Newer Messages Editor.
+
+# Newer Messages Editor is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Newer Messages Editor is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Newer Messages Editor.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# nme_memory.py
+# Translation memory: finds the messages whose text is most like some
+# other text, without comparing it to every message. Each text is cut
+# into character trigrams, and only a MinHash sketch of them (the ones
+# with the lowest hashes) is indexed. Similar texts end up with mostly
+# the same sketch, so the messages sharing the most of it are the
+# candidates, which are then compared for real.
+
+
+################################################################
+################################################################
+
+# Imports
+import array, collections, heapq, sys, time
+
+
+SketchSize = 16 # trigrams indexed per message
+MaxPostings = 2000 # trigrams in more sketches than this are skipped when looking up
+MaxCandidates = 100 # messages compared for real per lookup
+MinScore = 0.3 # how similar a message has to be to be suggested
+
+# Rebuild the index once this many entries are out of date, and more
+# of them are out of date than not
+CompactThreshold = 4096
+
+
+def Grams(text):
+    """Returns the set of trigrams of text, in lowercase and with runs
+    of whitespace counted as one space"""
+    text = ' %s ' % ' '.join(text.lower().split())
+    return set(text[i:i + 3] for i in range(len(text) - 2))
+
+
+def Sketch(grams):
+    """Returns the MinHash sketch of a set of trigrams: the hashes of
+    the SketchSize of them with the lowest hashes"""
+    return heapq.nsmallest(SketchSize, set(hash(gram) for gram in grams))
+
+
+def Similarity(a, b):
+    """Returns how similar two sets of trigrams are, from 0 to 1"""
+    if not a or not b: return 0.0
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
+
+
+def Scan(messages, text, count=5):
+    """Returns the (score, message) pairs for the count messages most
+    like text, the slow way"""
+    grams = Grams(text)
+    scores = ((Similarity(grams, Grams(msg.text)), msg) for msg in messages)
+    return heapq.nlargest(count, (s for s in scores if s[0] >= MinScore), key=lambda s: s[0])
+
+
+class TranslationMemory():
+    """Incrementally updated similarity index over message texts"""
+    def __init__(self):
+        """Inits the TranslationMemory"""
+        self.docs = [] # document number -> message (None once out of date)
+        self.docOf = {} # message -> document number
+        self.postings = {} # trigram hash -> array of document numbers
+        self.dead = 0 # number of out-of-date documents
+        self.buildTime = 0.0 # seconds spent adding messages
+
+    def __len__(self):
+        """Returns the number of messages in the index"""
+        return len(self.docOf)
+
+    def __contains__(self, msg):
+        """Returns True if msg is in the index"""
+        return msg in self.docOf
+
+    def AddMessages(self, messages):
+        """Adds messages that aren't in the index yet"""
+        start = time.perf_counter()
+        for msg in messages:
+            if msg not in self.docOf: self.Add(msg)
+        self.buildTime += time.perf_counter() - start
+
+    def Add(self, msg):
+        """Adds a message to the index"""
+        doc = len(self.docs)
+        self.docs.append(msg)
+        self.docOf[msg] = doc
+
+        postings = self.postings
+        for key in Sketch(Grams(msg.text)):
+            docs = postings.get(key)
+            if docs is None: docs = postings[key] = array.array('i')
+            docs.append(doc)
+
+    def Remove(self, msg):
+        """Removes a message from the index, if it's there"""
+        doc = self.docOf.pop(msg, None)
+        if doc is None: return
+
+        # Its postings are left where they are until the next Compact()
+        self.docs[doc] = None
+        self.dead += 1
+        if self.dead > CompactThreshold and self.dead > len(self.docOf): self.Compact()
+
+    def Update(self, msg):
+        """Re-indexes a message that has been changed"""
+        if msg not in self.docOf: return
+        self.Remove(msg)
+        self.Add(msg)
+
+    def Compact(self):
+        """Rebuilds the index without any out-of-date entries"""
+        messages = [msg for msg in self.docs if msg is not None]
+        buildTime = self.buildTime
+        self.__init__()
+        self.AddMessages(messages)
+        self.buildTime += buildTime
+
+    def Lookup(self, text, count=5, exclude=None):
+        """Returns the (score, message) pairs for the count indexed
+        messages most like text (other than exclude), best first"""
+        grams = Grams(text)
+        if not grams: return []
+
+        # Count how much of its sketch each message shares. Trigrams
+        # in too many sketches say little, so they're skipped, unless
+        # they're all there is
+        lists = [self.postings.get(key, ()) for key in Sketch(grams)]
+        lists.sort(key=len)
+        counts = collections.Counter()
+        for i, docs in enumerate(lists):
+            if len(docs) > MaxPostings:
+                if i == 0: counts.update(docs[-MaxPostings:])
+                break
+            counts.update(docs)
+
+        # Compare the best candidates for real. Lots of messages have
+        # the same text, so each text is only compared once
+        results = []
+        scores = {}
+        for doc, shared in counts.most_common(MaxCandidates):
+            msg = self.docs[doc]
+            if msg is None or msg is exclude: continue
+            text = msg.text
+            score = scores.get(text)
+            if score is None: score = scores[text] = Similarity(grams, Grams(text))
+            if score >= MinScore: results.append((score, msg))
+        return heapq.nlargest(count, results, key=lambda s: s[0])
+
+    def Stats(self):
+        """Returns a dict with the size of the index and how long it took to build"""
+        size = sys.getsizeof(self.docs) + sys.getsizeof(self.docOf) + sys.getsizeof(self.postings)
+        for docs in self.postings.values(): size += sys.getsizeof(docs)
+
+        return {
+            'messages': len(self.docOf),
+            'trigrams': len(self.postings),
+            'seconds': self.buildTime,
+            'bytes': size,
+            }
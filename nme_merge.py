@@ -0,0 +1,312 @@
+#!/usr/bin/python
+# -*- coding: latin-1 -*-
+
+# Newer Messages Editor - Edits NewerSMBW's messages.bin
+# Version 1.3
+# Copyright (C) 2013-2014 RoadrunnerWMC
+
+# This file is part of Newer Messages Editor.
+
+# Newer Messages Editor is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Newer Messages Editor is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Newer Messages Editor.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# nme_merge.py
+# Three-way merges of messages.bin files that several people edited
+# copies of. Messages are matched up with the original (base) file by
+# ID, like nme_diff does, or by content if they were renumbered, so
+# changes to different messages, or to different parts of a message,
+# are combined automatically. What's left are conflicts, where both
+# sides changed the same thing differently; each one's choice says
+# which side wins.
+
+
+################################################################
+################################################################
+
+# Imports
+import itertools
+
+from nme_core import Message
+from nme_diff import Contents, Keys, KeyName
+
+
+# The two sides of a merge
+Ours = 'ours'
+Theirs = 'theirs'
+
+# Contents of empty messages (see nme_diff.Contents), which are too
+# common to tell whether a message was renumbered
+Blank = set([('', ''), (b'\0\0', b'\0\0')])
+
+# Resolution of a message that's kept as it is in ours
+Keep = (1, 1, 1)
+
+
+class Conflict():
+    """Something both sides changed differently. ours and theirs are
+    the message as it would end up if that side won (None if it would
+    be removed), and can be edited before the merge is applied"""
+    Edit = 'edit' # both changed the same parts of a message
+    Delete = 'delete' # one side removed a message the other changed
+    Add = 'add' # both added different messages with the same ID
+    Order = 'order' # both reordered the messages
+
+    def __init__(self, kind, key=None, fields=(), ours=None, theirs=None):
+        """Inits the Conflict"""
+        self.kind = kind
+        self.key = key # (ID, occurrence) of the message, in base if it was there
+        self.fields = fields # for Edit: the fields that conflict
+        self.ours = ours
+        self.theirs = theirs
+        self.choice = Ours
+
+    def Chosen(self):
+        """Returns the message as it ends up with the current choice"""
+        return self.ours if self.choice == Ours else self.theirs
+
+    def __str__(self):
+        """Returns a description of the conflict"""
+        if self.kind == self.Edit:
+            return '%s was changed on both sides (%s)' % (KeyName(self.key), ', '.join(self.fields))
+        if self.kind == self.Delete:
+            removed, changed = (Ours, Theirs) if self.ours is None else (Theirs, Ours)
+            return '%s was removed by %s and changed by %s' % (KeyName(self.key), removed, changed)
+        if self.kind == self.Add: return 'both sides added %s, differently' % KeyName(self.key)
+        return 'the messages were reordered on both sides'
+
+
+def Match(baseKeys, baseContents, keys, contents):
+    """Matches the messages of one side up with those of the base file.
+    Returns (side row or None for each base row, base row or None for
+    each side row). A message that was removed, and one that was added
+    with exactly the same contents, are taken to be one message that
+    was renumbered"""
+    rows = dict(zip(keys, itertools.count()))
+    toSide = [rows.get(key) for key in baseKeys]
+
+    # Which of several messages with one ID is which can't be told by
+    # ID, so match those by contents first, and then in order
+    duplicated = set(id for id, n in baseKeys if n) | set(id for id, n in keys if n)
+    if duplicated:
+        baseGroups, groups = {}, {} # ID -> rows
+        for i, (id, n) in enumerate(baseKeys):
+            if id in duplicated: baseGroups.setdefault(id, []).append(i)
+        for j, (id, n) in enumerate(keys):
+            if id in duplicated: groups.setdefault(id, []).append(j)
+
+        for id, baseRows in baseGroups.items():
+            byContents = {}
+            for j in groups.get(id, ()): byContents.setdefault(contents[j], []).append(j)
+            unmatched = []
+            for i in baseRows:
+                sameRows = byContents.get(baseContents[i])
+                toSide[i] = sameRows.pop(0) if sameRows else None
+                if toSide[i] is None: unmatched.append(i)
+            rest = [j for sameRows in byContents.values() for j in sameRows]
+            rest.sort()
+            for i, j in zip(unmatched, rest): toSide[i] = j
+
+    toBase = [None] * len(keys)
+    for i, j in enumerate(toSide):
+        if j is not None: toBase[j] = i
+
+    removed = {} # contents -> base rows
+    for i, j in enumerate(toSide):
+        if j is None and baseContents[i] not in Blank: removed.setdefault(baseContents[i], []).append(i)
+    if not removed: return toSide, toBase
+
+    added = {} # contents -> side rows
+    for j, i in enumerate(toBase):
+        if i is None: added.setdefault(contents[j], []).append(j)
+    for content, baseRows in removed.items():
+        sideRows = added.get(content, ())
+        if len(baseRows) == 1 and len(sideRows) == 1:
+            toSide[baseRows[0]] = sideRows[0]
+            toBase[sideRows[0]] = baseRows[0]
+
+    return toSide, toBase
+
+
+class Merge():
+    """Three-way merge of two edited copies (ours and theirs) of a base
+    file, all MessagesBins. Set the choices of the conflicts, and then
+    Apply() it to ours"""
+    def __init__(self, base, ours, theirs):
+        """Inits the Merge, working out what can be merged automatically"""
+        self.base, self.ours, self.theirs = base, ours, theirs
+        self.conflicts = []
+        self.changes = 0 # changes taken from theirs automatically
+
+        # Only compare what needs comparing, without decoding anything
+        encoded = any(file.EncodedStrings for file in (base, ours, theirs))
+        self.contents = [Contents(file, encoded) for file in (base, ours, theirs)]
+        self.ids = [[msg.id for msg in file.Messages] for file in (base, ours, theirs)]
+        baseKeys, oursKeys, theirsKeys = [Keys(file.Messages) for file in (base, ours, theirs)]
+        baseContents, oursContents, theirsContents = self.contents
+        oursMatch, oursToBase = Match(baseKeys, baseContents, oursKeys, oursContents)
+        theirsMatch, theirsToBase = Match(baseKeys, baseContents, theirsKeys, theirsContents)
+
+        # Every message in any of them is an item: (base row, our row,
+        # their row), with None where it isn't there
+        self.items = list(zip(range(len(baseKeys)), oursMatch, theirsMatch))
+        addedByKey = {}
+        for j, i in enumerate(oursToBase):
+            if i is None:
+                addedByKey[oursKeys[j]] = len(self.items)
+                self.items.append((None, j, None))
+        for k, i in enumerate(theirsToBase):
+            if i is not None: continue
+            item = addedByKey.get(theirsKeys[k])
+            if item is None: self.items.append((None, None, k))
+            else: self.items[item] = (None, self.items[item][1], k) # both added it
+        self.itemKeys = [baseKeys[b] if b is not None else oursKeys[o] if o is not None else theirsKeys[t] for b, o, t in self.items]
+
+        # Where each side's messages went
+        self.oursItems = [None] * len(oursKeys)
+        self.theirsItems = [None] * len(theirsKeys)
+        for n, (b, o, t) in enumerate(self.items):
+            if o is not None: self.oursItems[o] = n
+            if t is not None: self.theirsItems[t] = n
+
+        # Decide what to do with each one. Most messages are the same in
+        # theirs as in base, so those are checked right here
+        self.results = []
+        baseIds, theirsIds = self.ids[0], self.ids[2]
+        for n, (b, o, t) in enumerate(self.items):
+            if b is not None and o is not None and t is not None and theirsContents[t] == baseContents[b] and theirsIds[t] == baseIds[b]:
+                self.results.append(Keep)
+            else: self.results.append(self.Resolve(n))
+
+        # Whichever side reordered the messages decides the order, but
+        # it's a conflict if both did
+        oursInOrder, theirsInOrder = self.InOrder(oursToBase), self.InOrder(theirsToBase)
+        self.order = Theirs if oursInOrder and not theirsInOrder else Ours
+        self.orderConflict = None
+        if not theirsInOrder:
+            if oursInOrder: self.changes += 1
+            elif [n for n in self.oursItems if self.items[n][2] is not None] != [n for n in self.theirsItems if self.items[n][1] is not None]:
+                self.orderConflict = self.Add(Conflict(Conflict.Order))
+
+    @staticmethod
+    def InOrder(toBase):
+        """Returns True if a side's messages are still in base order"""
+        rows = [i for i in toBase if i is not None]
+        return all(a < b for a, b in zip(rows, rows[1:]))
+
+    def Fields(self, side, row):
+        """Returns (ID, title contents, text contents) of a message in
+        one of the files (0 for base, 1 for ours, 2 for theirs)"""
+        return (self.ids[side][row],) + self.contents[side][row]
+
+    def Copy(self, n, sides):
+        """Returns a new Message for item n, whose ID, title and text
+        are taken from the files in sides (see Fields())"""
+        files = (self.base, self.ours, self.theirs)
+        id, title, text = (files[side].Messages[self.items[n][side]] for side in sides)
+        return Message(id.id, title.title, text.text)
+
+    def Resolve(self, n):
+        """Works out what happens to item n. Returns None if it's removed,
+        a Conflict, or the files its ID, title and text come from (see
+        Fields())"""
+        b, o, t = self.items[n]
+        key = self.itemKeys[n]
+
+        if b is None:
+            if t is None: return Keep
+            if o is None:
+                self.changes += 1
+                return (2, 2, 2)
+            if self.Fields(1, o) == self.Fields(2, t): return Keep
+            return self.Add(Conflict(Conflict.Add, key, (), self.Copy(n, (1, 1, 1)), self.Copy(n, (2, 2, 2))))
+
+        base = self.Fields(0, b)
+        if o is None and t is None: return None
+        if o is None or t is None:
+            # Removing it is fine, as long as the other side didn't change it
+            side, row = (2, t) if o is None else (1, o)
+            if self.Fields(side, row) == base:
+                if o is not None: self.changes += 1
+                return None
+            copy = self.Copy(n, (side,) * 3)
+            return self.Add(Conflict(Conflict.Delete, key, (), copy if side == 1 else None, copy if side == 2 else None))
+
+        ours, theirs = self.Fields(1, o), self.Fields(2, t)
+        if ours == theirs or theirs == base: return Keep # the usual case
+        if ours == base:
+            self.changes += 1
+            return (2, 2, 2)
+
+        # Both changed it: merge it field by field
+        fields, conflicts = [], []
+        for name, b, o, t in zip(('ID', 'title', 'text'), base, ours, theirs):
+            if o == t or t == b: fields.append(1)
+            elif o == b: fields.append(2)
+            else:
+                fields.append(None)
+                conflicts.append(name)
+        if 2 in fields: self.changes += 1
+        if not conflicts: return tuple(fields)
+
+        oursFields = tuple(1 if f is None else f for f in fields)
+        theirsFields = tuple(2 if f is None else f for f in fields)
+        return self.Add(Conflict(Conflict.Edit, key, tuple(conflicts), self.Copy(n, oursFields), self.Copy(n, theirsFields)))
+
+    def Add(self, conflict):
+        """Adds a conflict, and returns it"""
+        self.conflicts.append(conflict)
+        return conflict
+
+    def Result(self, n):
+        """Returns the message item n ends up as, or None if it's removed.
+        Our messages are reused where they aren't changed"""
+        result = self.results[n]
+        if result is None: return None
+        if isinstance(result, Conflict): return result.Chosen()
+        if result == Keep: return self.ours.Messages[self.items[n][1]]
+        return self.Copy(n, result)
+
+    def Apply(self):
+        """Turns ours into the merged file, using the conflicts' choices"""
+        messages = [self.Result(n) for n in range(len(self.items))]
+
+        # One side's order is kept, and the other side's messages are
+        # threaded in after the messages they came after there
+        order = self.orderConflict.choice if self.orderConflict is not None else self.order
+        mainItems, otherItems = (self.oursItems, self.theirsItems) if order == Ours else (self.theirsItems, self.oursItems)
+        main = set(mainItems)
+        followers = {} # item -> items placed after it
+        previous = None
+        for n in otherItems:
+            if messages[n] is None: continue
+            if n not in main: followers.setdefault(previous, []).append(n)
+            previous = n
+
+        result = []
+        done = set()
+        def Emit(n):
+            """Adds an item, followed by everything placed after it"""
+            stack = [n]
+            while stack:
+                n = stack.pop()
+                if n is not None and n not in done and messages[n] is not None:
+                    result.append(messages[n])
+                    done.add(n)
+                stack.extend(reversed(followers.pop(n, ())))
+        Emit(None)
+        for n in mainItems: Emit(n)
+
+        # Nothing gets lost, whatever happens
+        result.extend(msg for n, msg in enumerate(messages) if msg is not None and n not in done)
+        self.ours.Messages = result
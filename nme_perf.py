@@ -0,0 +1,227 @@
+#!/usr/bin/python
+# -*- coding: latin-1 -*-
+
+# Newer Messages Editor - Edits NewerSMBW's messages.bin
+# Version 1.3
+# Copyright (C) 2013-2014 RoadrunnerWMC
+
+# This file is part of Newer Messages Editor.
+
+# Newer Messages Editor is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Newer Messages Editor is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Newer Messages Editor.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# nme_perf.py
+# Built-in instrumentation. Slow operations are timed, and the timings
+# are kept as rolling histograms (shown in Help -> Performance) and as
+# a trace that can be saved in Chrome's trace event format and opened
+# in chrome://tracing or https://ui.perfetto.dev. It's off unless the
+# NME_PERF environment variable is set (or NME_PERF_TRACE, to a file
+# to save the trace to on exit), or the --perf or --perf-trace=FILE
+# flag is given, and then only costs a check of Enabled per call.
+
+
+################################################################
+################################################################
+
+# Imports
+import atexit, collections, functools, json, os, threading, time
+
+
+Enabled = bool(os.environ.get('NME_PERF') or os.environ.get('NME_PERF_TRACE'))
+TraceFile = os.environ.get('NME_PERF_TRACE') or None # saved on exit
+
+WindowSize = 1000 # calls kept for each operation's histogram
+MaxEvents = 200000 # trace events kept; the oldest ones are dropped
+
+# Upper bounds of the histogram buckets, in seconds. The last bucket
+# holds everything slower
+Buckets = (0.0001, 0.0003, 0.001, 0.003, 0.01, 0.03, 0.1, 0.3, 1, 3)
+
+Stats = collections.OrderedDict() # name -> Stat
+Counters = collections.OrderedDict() # name -> total
+Events = collections.deque(maxlen=MaxEvents) # (name, start, seconds or None, thread, value)
+Origin = time.perf_counter()
+Lock = threading.Lock()
+
+CO_VARARGS = 0x04 # inspect.CO_VARARGS; inspect is left out of the Windows build
+
+
+class Stat():
+    """Timings of one operation"""
+    def __init__(self, name):
+        """Inits the Stat"""
+        self.name = name
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self.last = 0
+        self.recent = collections.deque(maxlen=WindowSize) # seconds
+
+    def Add(self, seconds):
+        """Adds one call"""
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.last = seconds
+        self.recent.append(seconds)
+
+    def Percentile(self, p):
+        """Returns the p-th percentile (0 to 100) of the recent calls"""
+        recent = sorted(self.recent)
+        if not recent: return 0
+        return recent[min(len(recent) - 1, int(len(recent) * p / 100))]
+
+    def Histogram(self):
+        """Returns the number of recent calls in each bucket"""
+        counts = [0] * (len(Buckets) + 1)
+        for seconds in self.recent:
+            i = 0
+            while i < len(Buckets) and seconds > Buckets[i]: i += 1
+            counts[i] += 1
+        return counts
+
+
+def Enable(enabled=True, traceFile=None):
+    """Turns the instrumentation on or off. If traceFile is given, the
+    trace is saved there on exit"""
+    global Enabled, TraceFile
+    Enabled = enabled
+    if traceFile is not None: TraceFile = traceFile
+
+
+def EnableFromArgs(argv):
+    """Handles the --perf and --perf-trace=FILE command-line flags, and
+    returns argv without them"""
+    rest = []
+    for arg in argv:
+        if arg == '--perf': Enable()
+        elif arg.startswith('--perf-trace='): Enable(traceFile=arg.split('=', 1)[1])
+        else: rest.append(arg)
+    return rest
+
+
+def Record(name, start, seconds):
+    """Records a call to name that started at start (a perf_counter()
+    time) and took seconds"""
+    with Lock:
+        stat = Stats.get(name)
+        if stat is None: stat = Stats[name] = Stat(name)
+        stat.Add(seconds)
+        Events.append((name, start, seconds, threading.get_ident(), None))
+
+
+def Count(name, n=1):
+    """Adds n to a counter"""
+    if not Enabled: return
+    with Lock:
+        value = Counters[name] = Counters.get(name, 0) + n
+        Events.append((name, time.perf_counter(), None, threading.get_ident(), value))
+
+
+def Timed(name, slot=False):
+    """Decorator that times every call to a function as name. If slot
+    is True, extra positional arguments are dropped like PyQt does for
+    slots that take fewer arguments than their signal, since it can't
+    see through the wrapper"""
+    def decorator(func):
+        code = func.__code__
+        maxArgs = code.co_argcount if slot and not code.co_flags & CO_VARARGS else None
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if maxArgs is not None: args = args[:maxArgs]
+            if not Enabled: return func(*args, **kwargs)
+            start = time.perf_counter()
+            try: return func(*args, **kwargs)
+            finally: Record(name, start, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+class Timer():
+    """Context manager that times a block of code as name"""
+    def __init__(self, name):
+        """Inits the Timer"""
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        """Starts timing"""
+        if Enabled: self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        """Records the time taken"""
+        if self.start is not None: Record(self.name, self.start, time.perf_counter() - self.start)
+        return False
+
+
+def Reset():
+    """Forgets everything recorded so far"""
+    with Lock:
+        Stats.clear()
+        Counters.clear()
+        Events.clear()
+
+
+def Snapshot():
+    """Returns copies of (Stats, Counters) that other threads won't change"""
+    with Lock:
+        stats = []
+        for stat in Stats.values():
+            copy = Stat(stat.name)
+            copy.count, copy.total, copy.max, copy.last = stat.count, stat.total, stat.max, stat.last
+            copy.recent.extend(stat.recent)
+            stats.append(copy)
+        return stats, collections.OrderedDict(Counters)
+
+
+def TraceEvents():
+    """Returns what's been recorded as Chrome trace events"""
+    with Lock: events = list(Events)
+
+    pid = os.getpid()
+    threads = {} # thread ident -> small number, in order of appearance
+    trace = []
+    for name, start, seconds, thread, value in events:
+        tid = threads.setdefault(thread, len(threads) + 1)
+        event = {'name': name, 'cat': 'nme', 'pid': pid, 'tid': tid, 'ts': (start - Origin) * 1e6}
+        if seconds is None:
+            event['ph'] = 'C'
+            event['args'] = {name: value}
+        else:
+            event['ph'] = 'X'
+            event['dur'] = seconds * 1e6
+        trace.append(event)
+
+    # Name the threads, so the trace viewer can tell them apart
+    for thread, tid in threads.items():
+        threadName = 'thread %d' % tid
+        for t in threading.enumerate():
+            if t.ident == thread: threadName = t.name
+        trace.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': threadName}})
+    return trace
+
+
+def WriteTrace(fp):
+    """Saves the trace to fp, in Chrome's trace event format"""
+    with open(fp, 'w', encoding='utf-8') as file:
+        json.dump({'traceEvents': TraceEvents(), 'displayTimeUnit': 'ms'}, file)
+
+
+@atexit.register
+def WriteTraceOnExit():
+    """Saves the trace to TraceFile, if there is one"""
+    if TraceFile is None: return
+    try: WriteTrace(TraceFile)
+    except OSError as e: print('Couldn\'t save the performance trace to %s: %s' % (TraceFile, e))
@@ -0,0 +1,195 @@
+#!/usr/bin/python
+# -*- coding: latin-1 -*-
+
+# Newer Messages Editor - Edits NewerSMBW's messages.bin
+# Version 1.3
+# Copyright (C) 2013-2014 RoadrunnerWMC
+
+# This file is part of Newer Messages Editor.
+
+# Newer Messages Editor is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Newer Messages Editor is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Newer Messages Editor.  If not, see <http://www.gnu.org/licenses/>.
+
+
+
+# nme_reload.py
+# Picks up changes made on disk to a file that's open in the editor,
+# such as a build script regenerating it, without opening it again. The
+# new version is diffed against the messages in memory (nme_diff), and
+# a fingerprint of the version last read or saved (each message's
+# content hash, by key) tells changes made on disk apart from unsaved
+# edits. Unsaved edits are kept; where a message was changed both ways,
+# that's a conflict.
+
+
+################################################################
+################################################################
+
+# Imports
+from nme_core import MessagesBin, LazyMessagesBin
+from nme_diff import Diff, KeyName, Keys, MessageHash
+from nme_merge import Conflict
+
+
+class Fingerprint():
+    """Content hash of every message in a version of a file, by key (see
+    nme_diff.Keys). Messages can be added a chunk at a time"""
+    def __init__(self, file=None):
+        """Inits the Fingerprint, of all of file if it's given"""
+        self.hashes = {} # key -> content hash, in file order
+        self.counts = {} # ID -> messages with it so far
+        if file is not None: self.Add(file, file.Messages)
+
+    def Add(self, file, messages):
+        """Adds messages of file, which come after those added so far"""
+        hashes, counts = self.hashes, self.counts
+        for msg in messages:
+            n = counts.get(msg.id, 0)
+            counts[msg.id] = n + 1
+            hashes[(msg.id, n)] = MessageHash(file, msg)
+
+    def get(self, key):
+        """Returns the hash of the message with key, or None"""
+        return self.hashes.get(key)
+
+
+def Recover(base, ours, theirs):
+    """Fills in the strings of ours (a LazyMessagesBin) that were lost
+    when its file was changed in place, from theirs. Those that weren't
+    edited were still as base has them, so the messages that weren't
+    edited at all are returned as {key: base hash}, to be compared by that"""
+    theirMessages = dict(zip(Keys(theirs.Messages), theirs.Messages))
+    known = {}
+    for key, msg in zip(Keys(ours.Messages), ours.Messages):
+        if not ours.Unreadable(msg): continue
+        if msg.editedTitle is None and msg.editedText is None and base.get(key) is not None:
+            known[key] = base.get(key)
+
+        their = theirMessages.get(key)
+        if msg.editedTitle is None: msg.title = their.title if their is not None else ''
+        if msg.editedText is None: msg.text = their.text if their is not None else ''
+    return known
+
+
+def Reordered(old, new):
+    """Returns True if the keys that are in both lists aren't in the same
+    order in each"""
+    oldSet, newSet = set(old), set(new)
+    return [key for key in old if key in newSet] != [key for key in new if key in oldSet]
+
+
+class Reload():
+    """The changes to make to ours (the file in memory) to pick up those
+    made on disk, given base (the Fingerprint of the file as it was on
+    disk) and theirs (the file as it is now). theirPrint is the
+    Fingerprint of theirs, if it's already been worked out"""
+    def __init__(self, base, ours, theirs, theirPrint=None):
+        """Works out the changes"""
+        self.conflicts = [] # Conflicts, with ours being the message in memory
+        self.flagged = [] # messages in ours that conflict
+        self.changed = [] # messages in ours whose title or text change
+
+        # Everything that's different in memory is either a change made
+        # on disk, an unsaved edit, or both
+        known = Recover(base, ours, theirs) if isinstance(ours, LazyMessagesBin) and ours.Changed() else None
+        self.patch = patch = Diff(ours, theirs, known)
+        index = dict(zip(Keys(ours.Messages), ours.Messages))
+
+        def TheirHash(key):
+            """Returns the content hash of a message in theirs"""
+            nonlocal theirPrint
+            if theirPrint is None: theirPrint = Fingerprint(theirs)
+            return theirPrint.get(key)
+
+        skipped = set() # keys of messages to leave alone
+        removed = []
+        for key, hash in patch.removed:
+            baseHash = base.get(key)
+            if baseHash is None: skipped.add(key) # added here, and not saved yet
+            elif hash == baseHash: removed.append((key, hash))
+            else:
+                skipped.add(key)
+                self.Flag(Conflict(Conflict.Delete, key, ours=index[key]))
+        patch.removed = removed
+
+        changed = []
+        for key, hash, title, text in patch.changed:
+            baseHash = base.get(key)
+            if hash == baseHash: changed.append((key, hash, title, text))
+            elif baseHash is None:
+                # Added here and on disk, differently
+                skipped.add(key)
+                self.Flag(Conflict(Conflict.Add, key, ours=index[key]))
+            elif TheirHash(key) == baseHash: skipped.add(key) # only edited here
+            else:
+                skipped.add(key)
+                fields = [field for field, value in (('title', title), ('text', text)) if value is not None]
+                self.Flag(Conflict(Conflict.Edit, key, fields, ours=index[key]))
+        patch.changed = changed
+        self.changed = [index[key] for key, hash, title, text in changed]
+
+        added = []
+        for key, title, text in patch.added:
+            baseHash = base.get(key)
+            if baseHash is None: added.append((key, title, text))
+            else:
+                # Removed here, and not saved yet
+                skipped.add(key)
+                if TheirHash(key) != baseHash: self.conflicts.append(Conflict(Conflict.Delete, key))
+        patch.added = added
+
+        # Messages are only moved around if that happened on disk, and
+        # not here too
+        new = set(key for key, title, text in added)
+        baseKeys, ourKeys = list(base.hashes), list(index)
+        theirKeys = list(theirPrint.hashes) if theirPrint is not None else Keys(theirs.Messages)
+        if not Reordered(baseKeys, theirKeys): skipped.update(key for key, anchor in patch.placed if key not in new)
+        elif Reordered(baseKeys, ourKeys):
+            skipped.update(key for key, anchor in patch.placed if key not in new)
+            self.conflicts.append(Conflict(Conflict.Order))
+        patch.placed = [(key, anchor) for key, anchor in patch.placed if key not in skipped]
+
+    def Flag(self, conflict):
+        """Records a conflict with a message in ours"""
+        self.conflicts.append(conflict)
+        self.flagged.append(conflict.ours)
+
+    def IsEmpty(self):
+        """Returns True if there's nothing to pick up"""
+        return self.patch.IsEmpty()
+
+    def Result(self, ours):
+        """Returns the messages of ours as they end up, in order. Those
+        that are kept are the same Message objects, with changes made
+        on disk applied to them"""
+        scratch = MessagesBin()
+        scratch.Messages = list(ours.Messages)
+        self.patch.Apply(scratch, True)
+        return scratch.Messages
+
+    def Summary(self):
+        """Returns a description of the changes"""
+        summary = self.patch.Summary()
+        text = ', '.join('%d %s' % (count, what) for what, count in summary.items() if count) or 'nothing changed'
+        if self.conflicts: text += '; %d conflict%s with unsaved edits' % (len(self.conflicts), '' if len(self.conflicts) == 1 else 's')
+        return text
+
+
+def Describe(conflict):
+    """Returns a description of a Conflict found by Reload"""
+    if conflict.kind == Conflict.Order: return 'the messages were reordered here and on disk'
+    name = KeyName(conflict.key)
+    if conflict.kind == Conflict.Edit: return '%s was changed here and on disk (%s)' % (name, ', '.join(conflict.fields))
+    if conflict.kind == Conflict.Add: return '%s was added here and on disk, differently' % name
+    if conflict.ours is None: return '%s was removed here, but changed on disk' % name
+    return '%s was changed here, but removed on disk' % name
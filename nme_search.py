@@ -0,0 +1,179 @@
+#!/usr/bin/python
+# -*- coding: latin-1 -*-
+
+# Newer Messages Editor - Edits NewerSMBW's messages.bin
+# Version 1.3
+# Copyright (C) 2013-2014 RoadrunnerWMC
+
+# This file is part of Newer Messages Editor.
+
+# Newer Messages Editor is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Newer Messages Editor is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Newer Messages Editor.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# nme_search.py
+# Full-text search over message titles and texts. Each message's words
+# go into an inverted index, and the vocabulary has a trigram index of
+# its own, so substrings of words can be found without looking at every
+# message. Candidates are then checked against the actual text.
+
+
+################################################################
+################################################################
+
+# Imports
+import array, re, sys, time
+
+
+# What counts as a word
+WordPattern = re.compile(r'\w+')
+
+# Rebuild the index once this many entries are out of date, and more
+# of them are out of date than not
+CompactThreshold = 4096
+
+
+def MessageText(msg):
+    """Returns the searchable text of a message: its label in the
+    message list, followed by its text, in lowercase"""
+    return ('%d: %s\n%s' % (msg.id, msg.title, msg.text)).lower()
+
+
+def Scan(messages, query):
+    """Returns the set of messages containing query, the slow way"""
+    query = query.lower()
+    return set(msg for msg in messages if query in MessageText(msg))
+
+
+class SearchIndex():
+    """Incrementally updated substring index over a set of messages"""
+    def __init__(self):
+        """Inits the SearchIndex"""
+        self.docs = [] # document number -> message (None once out of date)
+        self.docOf = {} # message -> document number
+        self.postings = {} # word -> array of document numbers
+        self.grams = {} # trigram -> set of words containing it
+        self.dead = 0 # number of out-of-date documents
+        self.buildTime = 0.0 # seconds spent adding messages
+
+    def __len__(self):
+        """Returns the number of messages in the index"""
+        return len(self.docOf)
+
+    def __contains__(self, msg):
+        """Returns True if msg is in the index"""
+        return msg in self.docOf
+
+    def AddMessages(self, messages):
+        """Adds messages that aren't in the index yet"""
+        start = time.perf_counter()
+        for msg in messages:
+            if msg not in self.docOf: self.Add(msg)
+        self.buildTime += time.perf_counter() - start
+
+    def Add(self, msg):
+        """Adds a message to the index"""
+        doc = len(self.docs)
+        self.docs.append(msg)
+        self.docOf[msg] = doc
+
+        postings = self.postings
+        for word in set(WordPattern.findall(MessageText(msg))):
+            docs = postings.get(word)
+            if docs is None:
+                # New word: make it findable by its trigrams
+                docs = postings[word] = array.array('i')
+                grams = self.grams
+                for i in range(len(word) - 2):
+                    gram = word[i:i + 3]
+                    words = grams.get(gram)
+                    if words is None: grams[gram] = set((word,))
+                    else: words.add(word)
+            docs.append(doc)
+
+    def Remove(self, msg):
+        """Removes a message from the index, if it's there"""
+        doc = self.docOf.pop(msg, None)
+        if doc is None: return
+
+        # Its postings are left where they are until the next Compact()
+        self.docs[doc] = None
+        self.dead += 1
+        if self.dead > CompactThreshold and self.dead > len(self.docOf): self.Compact()
+
+    def Update(self, msg):
+        """Re-indexes a message that has been changed"""
+        if msg not in self.docOf: return
+        self.Remove(msg)
+        self.Add(msg)
+
+    def Compact(self):
+        """Rebuilds the index without any out-of-date entries"""
+        messages = [msg for msg in self.docs if msg is not None]
+        buildTime = self.buildTime
+        self.__init__()
+        self.AddMessages(messages)
+        self.buildTime += buildTime
+
+    def Words(self, token):
+        """Returns the indexed words that contain token"""
+        if len(token) < 3:
+            return [word for word in self.postings if token in word]
+
+        # Every trigram of token has to appear in the word
+        grams = [self.grams.get(token[i:i + 3], ()) for i in range(len(token) - 2)]
+        grams.sort(key=len)
+        words = set(grams[0])
+        for other in grams[1:]:
+            if not words: break
+            words &= other
+        return [word for word in words if token in word]
+
+    def Search(self, query):
+        """Returns the set of indexed messages containing query (case-
+        insensitively), or None if the query has no words to look up"""
+        query = query.lower()
+        tokens = set(WordPattern.findall(query))
+        if not tokens: return None
+
+        # Each word of the query has to be part of some word in the
+        # message. Start with the longest, since it's usually the rarest
+        candidates = None
+        for token in sorted(tokens, key=len, reverse=True):
+            docs = set()
+            for word in self.Words(token): docs.update(self.postings[word])
+            if candidates is None: candidates = docs
+            else: candidates &= docs
+            if not candidates: return set()
+
+        # Check the candidates against the real text
+        results = set()
+        for doc in candidates:
+            msg = self.docs[doc]
+            if msg is not None and query in MessageText(msg): results.add(msg)
+        return results
+
+    def Stats(self):
+        """Returns a dict with the size of the index and how long it took to build"""
+        size = sys.getsizeof(self.docs) + sys.getsizeof(self.docOf)
+        size += sys.getsizeof(self.postings) + sys.getsizeof(self.grams)
+        for word, docs in self.postings.items(): size += sys.getsizeof(word) + sys.getsizeof(docs)
+        for words in self.grams.values(): size += sys.getsizeof(words)
+
+        return {
+            'messages': len(self.docOf),
+            'words': len(self.postings),
+            'trigrams': len(self.grams),
+            'seconds': self.buildTime,
+            'bytes': size,
+            }
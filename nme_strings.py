@@ -0,0 +1,161 @@
+#!/usr/bin/python
+# -*- coding: latin-1 -*-
+
+# Newer Messages Editor - Edits NewerSMBW's messages.bin
+# Version 1.3
+# Copyright (C) 2013-2014 RoadrunnerWMC
+
+# This file is part of Newer Messages Editor.
+
+# Newer Messages Editor is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Newer Messages Editor is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Newer Messages Editor.  If not, see <http://www.gnu.org/licenses/>.
+
+
+
+# nme_strings.py
+# Converts message strings to and from the UTF-16 data in messages.bin,
+# a whole string at a time, and splits message text into plain text and
+# the control codes the game's text writer understands. Characters
+# outside the BMP are stored as surrogate pairs, like in any UTF-16 data.
+
+
+################################################################
+################################################################
+
+# Imports
+import collections, re
+from codecs import utf_16_be_decode
+
+
+# What to do with lone surrogates (halves of surrogate pairs on their
+# own), which aren't valid UTF-16 but do turn up in files:
+#   surrogatepass - keep them as they are, so files survive a round trip
+#   replace - replace them, with U+FFFD when reading and ? when writing
+#   strict - refuse, with a ValueError
+ErrorPolicies = ('surrogatepass', 'replace', 'strict')
+Errors = 'surrogatepass'
+
+# Matches characters outside the BMP, which take two code units
+AstralChars = re.compile('[\U00010000-\U0010FFFF]')
+
+# Matches characters that aren't exactly one code unit of data decoded
+# with surrogatepass: surrogate pairs, and lone surrogates
+Surrogates = re.compile('[\ud800-\udfff\U00010000-\U0010FFFF]')
+
+# Token kinds
+Text = 'text' # plain text
+LineBreak = 'linebreak'
+Tab = 'tab'
+Escape = 'escape' # a control sequence, see EscapeFields
+Control = 'control' # any other control character, or a cut-off escape
+
+# Splits text into tokens; each group is one kind of token. An escape
+# is U+001A, then a code unit whose high byte is the size of the whole
+# sequence in bytes and low byte is its group, then its tag, then any
+# parameters
+TokenPattern = re.compile('([^\x00-\x1f]+)|(\n)|(\t)|(\x1a)|([\x00-\x1f])', re.DOTALL)
+TokenKinds = (None, Text, LineBreak, Tab, Escape, Control)
+ControlChars = re.compile('[\x00-\x08\x0b-\x1f]') # besides line breaks and tabs
+
+
+def SetErrors(policy):
+    """Changes what happens to lone surrogates in strings converted from
+    now on (see ErrorPolicies)"""
+    global Errors
+    if policy not in ErrorPolicies: raise ValueError('Unknown error policy: %s' % policy)
+    Errors = policy
+
+
+def Decode(data):
+    """Decodes UTF-16 string data without its terminator"""
+    return utf_16_be_decode(data, Errors, True)[0]
+
+
+def Encode(string):
+    """Encodes a string as UTF-16 data, without a terminator"""
+    return string.encode('utf-16-be', Errors)
+
+
+def Units(string):
+    """Returns the number of UTF-16 code units string takes up"""
+    if string.isascii() or AstralChars.search(string) is None: return len(string)
+    return len(string) + len(AstralChars.findall(string))
+
+
+def Tokenize(string):
+    """Splits a string into a tuple of (kind, text) tokens, which add up
+    to the whole string"""
+    tokens = []
+    pos, end = 0, len(string)
+    match = TokenPattern.match
+    while pos < end:
+        m = match(string, pos)
+        kind = TokenKinds[m.lastindex]
+        stop = m.end()
+        if kind is Escape:
+            # The escape's size says where it stops
+            size = ord(string[stop]) >> 8 if stop < end else 0
+            if size < 4 or size & 1 or pos + size // 2 > end: kind = Control
+            else: stop = pos + size // 2
+        tokens.append((kind, string[pos:stop]))
+        pos = stop
+    return tuple(tokens)
+
+
+def EscapeFields(text):
+    """Returns the group, tag (None if there isn't one) and parameters of
+    an escape token's text"""
+    return ord(text[1]) & 0xFF, ord(text[2]) if len(text) > 2 else None, text[3:]
+
+
+class TokenCache():
+    """Token streams of recently tokenized strings. Editing a message
+    gives it new strings, so entries never go out of date, and messages
+    that haven't changed are never tokenized twice"""
+    def __init__(self, size=4096):
+        """Inits the TokenCache, to hold up to size token streams"""
+        self.size = size
+        self.tokens = collections.OrderedDict() # string -> tokens
+
+    def Tokens(self, string):
+        """Returns the tokens of string"""
+        tokens = self.tokens
+        try:
+            result = tokens[string]
+            tokens.move_to_end(string)
+            return result
+        except KeyError: pass
+
+        result = tokens[string] = Tokenize(string)
+        if len(tokens) > self.size: tokens.popitem(last=False)
+        return result
+
+    def clear(self):
+        """Forgets every token stream"""
+        self.tokens.clear()
+
+
+Cache = TokenCache()
+
+
+def Tokens(string):
+    """Returns the tokens of string, from the cache if it's been
+    tokenized recently"""
+    return Cache.Tokens(string)
+
+
+def PlainText(string):
+    """Returns string without its escapes and control characters, but
+    with its line breaks and tabs"""
+    if ControlChars.search(string) is None: return string
+    return ''.join(text for kind, text in Tokens(string) if kind is Text or kind is LineBreak or kind is Tab)
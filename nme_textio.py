@@ -0,0 +1,186 @@
+#!/usr/bin/python
+# -*- coding: latin-1 -*-
+
+# Newer Messages Editor - Edits NewerSMBW's messages.bin
+# Version 1.3
+# Copyright (C) 2013-2014 RoadrunnerWMC
+
+# This file is part of Newer Messages Editor.
+
+# Newer Messages Editor is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Newer Messages Editor is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Newer Messages Editor.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# nme_textio.py
+# Streaming conversion between messages.bin and line-oriented text
+# formats (JSON Lines and CSV). Everything here works on generators, so
+# memory use stays flat no matter how many messages there are
+
+
+################################################################
+################################################################
+
+# Imports
+import array, csv, io, json, mmap, os, re, shutil, struct, tempfile
+
+from nme_core import Message, MessagesBin
+
+
+# Supported text formats, by file extension
+Formats = {'.jsonl': 'jsonl', '.csv': 'csv'}
+
+# Matches lone surrogates, which can't be written as UTF-8
+Surrogates = re.compile('[\ud800-\udfff]')
+
+# CSV column names
+CsvHeader = ['id', 'title', 'text']
+
+
+def EscapeSurrogates(text):
+    """Replaces lone surrogates in JSON text with \\u escapes"""
+    return Surrogates.sub(lambda m: '\\u%04x' % ord(m.group()), text)
+
+
+def FormatFromPath(path, default=None):
+    """Guesses the text format of path from its extension"""
+    for ext, format in Formats.items():
+        if path.lower().endswith(ext): return format
+    return default
+
+
+def OpenText(path, mode='r'):
+    """Opens a text file the way the readers and writers here expect"""
+    # surrogatepass lets lone surrogates survive a CSV round trip
+    return open(path, mode, encoding='utf-8', errors='surrogatepass', newline='')
+
+
+def WrapText(file):
+    """Wraps a binary file object like OpenText opens text files"""
+    return io.TextIOWrapper(file, encoding='utf-8', errors='surrogatepass', newline='')
+
+
+################################################################
+################################################################
+################################################################
+########################### Readers ############################
+
+
+def ReadMessagesBin(fp, diagnostics=None):
+    """Yields the messages in the messages.bin at fp, one at a time.
+    Problems with the file are added to the list diagnostics"""
+    with open(fp, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0: data = b'' # can't be mapped
+        else: data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try: yield from ReadMessagesBinData(data, diagnostics)
+        finally:
+            if isinstance(data, mmap.mmap): data.close()
+
+
+def ReadMessagesBinData(data, diagnostics=None):
+    """Yields the messages in messages.bin data, one at a time.
+    Problems with the data are added to the list diagnostics"""
+    return MessagesBin.ParseMessages(data, diagnostics)
+
+
+def ReadJsonLines(file):
+    """Yields the messages in a JSON Lines text file"""
+    for line in file:
+        if not line.strip(): continue
+        row = json.loads(line)
+        yield Message(int(row['id']), str(row.get('title', '')), str(row.get('text', '')))
+
+
+def ReadCsv(file):
+    """Yields the messages in a CSV text file with a header row"""
+    for row in csv.DictReader(file):
+        yield Message(int(row['id']), row.get('title') or '', row.get('text') or '')
+
+
+def Import(file, format):
+    """Yields the messages in a text file of the given format"""
+    if format == 'jsonl': return ReadJsonLines(file)
+    if format == 'csv': return ReadCsv(file)
+    raise ValueError('Unknown format: %s' % format)
+
+
+################################################################
+################################################################
+################################################################
+########################### Writers ############################
+
+
+def JsonLines(messages):
+    """Yields one JSON Lines row per message"""
+    for msg in messages:
+        row = json.dumps({'id': msg.id, 'title': msg.title, 'text': msg.text}, ensure_ascii=False)
+        yield EscapeSurrogates(row) + '\n'
+
+
+def WriteJsonLines(messages, file):
+    """Writes messages to a JSON Lines text file"""
+    file.writelines(JsonLines(messages))
+
+
+def WriteCsv(messages, file):
+    """Writes messages to a CSV text file with a header row"""
+    writer = csv.writer(file, lineterminator='\n')
+    writer.writerow(CsvHeader)
+    writer.writerows((msg.id, msg.title, msg.text) for msg in messages)
+
+
+def Export(messages, file, format):
+    """Writes messages to a text file of the given format"""
+    if format == 'jsonl': WriteJsonLines(messages, file)
+    elif format == 'csv': WriteCsv(messages, file)
+    else: raise ValueError('Unknown format: %s' % format)
+
+
+def ExportTo(messages, file, format):
+    """Writes messages to a binary file object as a text file of the
+    given format, leaving the file object open"""
+    text = WrapText(file)
+    try: Export(messages, text, format)
+    finally: text.detach() # flushes it
+
+
+def BuildMessagesBin(messages, out):
+    """Writes messages straight to a binary file object as messages.bin,
+    without keeping them all in memory. Returns the number of messages"""
+    # The table has to come first, but its size isn't known until the
+    # end, so the strings are spooled to a temporary file meanwhile
+    table = array.array('I') # ID, title offset, text offset (from the start of the strings)
+    size = 0
+    with tempfile.TemporaryFile() as strings:
+        for msg in messages:
+            title = MessagesBin.EncodeString(msg.title)
+            text = MessagesBin.EncodeString(msg.text)
+            table.extend((0x100 + msg.id, size, size + len(title)))
+            strings.write(title)
+            strings.write(text)
+            size += len(title) + len(text)
+
+        # Now the real offsets are known
+        count = len(table) // 3
+        base = 4 + 12 * count
+        header = bytearray(base)
+        struct.pack_into('>I', header, 0, count)
+        for i in range(count):
+            id, tOffset, bOffset = table[3 * i:3 * i + 3]
+            struct.pack_into('>III', header, 4 + 12 * i, id, base + tOffset, base + bOffset)
+        del table
+
+        out.write(header)
+        strings.seek(0)
+        shutil.copyfileobj(strings, out)
+
+    return count
@@ -0,0 +1,304 @@
+#!/usr/bin/python
+# -*- coding: latin-1 -*-
+
+# Newer Messages Editor - Edits NewerSMBW's messages.bin
+# Version 1.3
+# Copyright (C) 2013-2014 RoadrunnerWMC
+
+# This file is part of Newer Messages Editor.
+
+# Newer Messages Editor is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Newer Messages Editor is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Newer Messages Editor.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# nme_undo.py
+# Undo/redo history for Newer Messages Editor. Edits are recorded as
+# small commands instead of snapshots of the file, and the history is
+# kept under a memory limit by throwing away the oldest commands.
+#
+# Commands work on a "target", which has to provide these methods:
+#     InsertMessage(row, msg), RemoveRow(row), MoveMessage(row, newRow),
+#     SetId(msg, id), RowOf(msg, hint) and MessageChanged(row)
+# MessageListModel in newer_messages_editor.py is one.
+
+
+################################################################
+################################################################
+
+# Imports
+import sys, time
+
+from nme_core import LazyMessage
+
+
+# Rough per-command overhead in bytes, on top of the strings it holds
+CommandOverhead = 200
+
+
+def StringDiff(old, new):
+    """Returns (start, removed, inserted): new is old with removed
+    replaced by inserted at start"""
+    # Skip the common prefix and suffix
+    end = min(len(old), len(new))
+    start = 0
+    while start < end and old[start] == new[start]: start += 1
+    end -= start
+    suffix = 0
+    while suffix < end and old[-1 - suffix] == new[-1 - suffix]: suffix += 1
+
+    return start, old[start:len(old) - suffix], new[start:len(new) - suffix]
+
+
+################################################################
+################################################################
+################################################################
+########################### Commands ###########################
+
+
+class Command():
+    """Base class for undoable commands. The base versions do nothing"""
+    def Undo(self, target):
+        """Undoes the command and returns the row it affected, or None"""
+        return None
+
+    def Redo(self, target):
+        """Redoes the command and returns the row it affected, or None"""
+        return None
+
+    def MergeWith(self, other):
+        """Absorbs other, a newer command, into this one if possible.
+        Returns True if it did"""
+        return False
+
+    def Size(self):
+        """Returns roughly how many bytes the command takes up"""
+        return CommandOverhead
+
+
+class EditCommand(Command):
+    """Change to the title or text of a message, stored as a diff"""
+    MergeInterval = 1.0 # keystrokes less than this many seconds apart are undone together
+
+    def __init__(self, row, msg, field, old, new):
+        """Inits the EditCommand. field is 'title' or 'text'"""
+        self.row = row
+        self.msg = msg
+        self.field = field
+        self.start, self.removed, self.inserted = StringDiff(old, new)
+        self.time = time.monotonic()
+
+    def Apply(self, target, removed, inserted):
+        """Replaces removed with inserted in the message"""
+        string = getattr(self.msg, self.field)
+        string = string[:self.start] + inserted + string[self.start + len(removed):]
+        setattr(self.msg, self.field, string)
+
+        self.row = target.RowOf(self.msg, self.row)
+        target.MessageChanged(self.row)
+        return self.row
+
+    def Undo(self, target):
+        """Undoes the edit"""
+        return self.Apply(target, self.inserted, self.removed)
+
+    def Redo(self, target):
+        """Redoes the edit"""
+        return self.Apply(target, self.removed, self.inserted)
+
+    def MergeWith(self, other):
+        """Merges keystrokes made in quick succession into one edit"""
+        if not isinstance(other, EditCommand): return False
+        if other.msg != self.msg or other.field != self.field: return False
+        if other.time - self.time > self.MergeInterval: return False
+
+        # Work out the string before both edits, then diff that
+        # against the string after both
+        after = getattr(self.msg, self.field)
+        middle = after[:other.start] + other.removed + after[other.start + len(other.inserted):]
+        before = middle[:self.start] + self.removed + middle[self.start + len(self.inserted):]
+        self.start, self.removed, self.inserted = StringDiff(before, after)
+        self.time = other.time
+        return True
+
+    def Size(self):
+        """Returns roughly how many bytes the command takes up"""
+        return CommandOverhead + sys.getsizeof(self.removed) + sys.getsizeof(self.inserted)
+
+
+class IdCommand(Command):
+    """Change to the ID of a message"""
+    def __init__(self, row, msg, old, new):
+        """Inits the IdCommand"""
+        self.row = row
+        self.msg = msg
+        self.old = old
+        self.new = new
+
+    def Apply(self, target, id):
+        """Sets the message ID"""
+        target.SetId(self.msg, id)
+        self.row = target.RowOf(self.msg, self.row)
+        target.MessageChanged(self.row)
+        return self.row
+
+    def Undo(self, target):
+        """Restores the old ID"""
+        return self.Apply(target, self.old)
+
+    def Redo(self, target):
+        """Sets the new ID again"""
+        return self.Apply(target, self.new)
+
+    def MergeWith(self, other):
+        """Merges consecutive changes to the same message's ID"""
+        if not isinstance(other, IdCommand) or other.msg != self.msg: return False
+        self.new = other.new
+        return True
+
+
+class AddCommand(Command):
+    """Addition of a message"""
+    def __init__(self, row, msg):
+        """Inits the AddCommand"""
+        self.row = row
+        self.msg = msg
+
+        # Read the strings into a memory-mapped message, so it doesn't
+        # depend on the file it came from anymore. Other messages keep
+        # their strings already, and rewriting a columnar one would
+        # leave a dead copy in its string buffer
+        if isinstance(msg, LazyMessage):
+            msg.title, msg.text = msg.title, msg.text
+        self.size = CommandOverhead + sys.getsizeof(msg.title) + sys.getsizeof(msg.text)
+
+    def Undo(self, target):
+        """Removes the message again"""
+        target.RemoveRow(self.row)
+        return None
+
+    def Redo(self, target):
+        """Puts the message back"""
+        target.InsertMessage(self.row, self.msg)
+        return self.row
+
+    def Size(self):
+        """Returns roughly how many bytes the command takes up"""
+        return self.size
+
+
+class RemoveCommand(AddCommand):
+    """Removal of a message"""
+    def Undo(self, target):
+        """Puts the message back"""
+        return AddCommand.Redo(self, target)
+
+    def Redo(self, target):
+        """Removes the message again"""
+        return AddCommand.Undo(self, target)
+
+
+class MoveCommand(Command):
+    """Move of a message from one row to another"""
+    def __init__(self, row, newRow):
+        """Inits the MoveCommand. newRow is the row the message ends up in"""
+        self.row = row
+        self.newRow = newRow
+
+    def Undo(self, target):
+        """Moves the message back"""
+        target.MoveMessage(self.newRow, self.row)
+        return self.row
+
+    def Redo(self, target):
+        """Moves the message again"""
+        target.MoveMessage(self.row, self.newRow)
+        return self.newRow
+
+
+################################################################
+################################################################
+################################################################
+########################### History ############################
+
+
+class UndoHistory():
+    """List of undoable commands with a memory limit"""
+    def __init__(self, memoryLimit=16 * 1024 * 1024):
+        """Inits the UndoHistory. memoryLimit is in bytes"""
+        self.memoryLimit = memoryLimit
+        self.Clear()
+
+    def Clear(self):
+        """Forgets every command"""
+        self.commands = []
+        self.index = 0 # commands[:index] can be undone, commands[index:] redone
+        self.size = 0
+        self.mergeable = False
+
+    def CanUndo(self):
+        """Returns True if there's something to undo"""
+        return self.index > 0
+
+    def CanRedo(self):
+        """Returns True if there's something to redo"""
+        return self.index < len(self.commands)
+
+    def Push(self, command):
+        """Records a command that has just been done"""
+        # Anything that could have been redone is gone now
+        for old in self.commands[self.index:]: self.size -= old.Size()
+        del self.commands[self.index:]
+
+        top = self.commands[-1] if self.commands else None
+        if self.mergeable and top is not None:
+            oldSize = top.Size()
+            if top.MergeWith(command):
+                self.size += top.Size() - oldSize
+                self.Trim()
+                return
+
+        self.commands.append(command)
+        self.index += 1
+        self.size += command.Size()
+        self.mergeable = True
+        self.Trim()
+
+    def StopMerging(self):
+        """Makes sure the next command won't be merged into the last one"""
+        self.mergeable = False
+
+    def Trim(self):
+        """Throws away the oldest commands until the history fits in
+        its memory limit. The newest command is always kept"""
+        drop = 0
+        while self.size > self.memoryLimit and drop < len(self.commands) - 1:
+            self.size -= self.commands[drop].Size()
+            drop += 1
+        if drop == 0: return
+
+        del self.commands[:drop]
+        self.index = max(self.index - drop, 0)
+
+    def Undo(self, target):
+        """Undoes the last command. Returns the row it affected, or None"""
+        if not self.CanUndo(): return None
+        self.mergeable = False
+        self.index -= 1
+        return self.commands[self.index].Undo(target)
+
+    def Redo(self, target):
+        """Redoes the next command. Returns the row it affected, or None"""
+        if not self.CanRedo(): return None
+        self.mergeable = False
+        self.index += 1
+        return self.commands[self.index - 1].Redo(target)
@@ -0,0 +1,90 @@
+#!/usr/bin/python
+# -*- coding: latin-1 -*-
+
+# Newer Messages Editor - Edits NewerSMBW's messages.bin
+# Version 1.3
+# Copyright (C) 2013-2014 RoadrunnerWMC
+
+# This file is part of Newer Messages Editor.
+
+# Newer Messages Editor is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Newer Messages Editor is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Newer Messages Editor.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# tests/test_ids.py
+# Checks that messages with the same ID are found in file order, which
+# keys like (ID, occurrence) rely on, after the file has been edited
+
+
+################################################################
+################################################################
+
+# Imports
+import os, tempfile, unittest
+
+from nme_core import ColumnarMessagesBin, LazyMessagesBin, Message, MessagesBin
+
+
+def MakeData():
+    """Returns file data with duplicated IDs"""
+    file = MessagesBin()
+    file.Messages = [Message(id, 'm%d' % row, '') for row, id in enumerate([1, 2, 1, 3, 1, 2])]
+    return bytes(file.save())
+
+
+class FindIdInOrderTest(unittest.TestCase):
+    """FindIdInOrder, for each kind of MessagesBin"""
+    def Check(self, file):
+        """Edits file, checking FindIdInOrder against the messages after each step"""
+        def Expect(id):
+            self.assertEqual([msg.title for msg in file.FindIdInOrder(id)],
+                [msg.title for msg in file.Messages if msg.id == id])
+
+        for id in (1, 2, 3): Expect(id)
+
+        # Added to the index last, but first in the file
+        file.InsertMessage(0, Message(1, 'inserted', ''))
+        Expect(1)
+
+        # Renumbered to an ID used further down
+        file.SetId(file.Messages[1], 2) # m0
+        Expect(2)
+
+        # Removed and put back, as undoing a removal does
+        msg = file.RemoveMessage(3) # m2
+        file.InsertMessage(3, msg)
+        Expect(1)
+        self.assertEqual([msg.title for msg in file.FindIdInOrder(1)], ['inserted', 'm2', 'm4'])
+
+        # Moved to the top
+        file.InsertMessage(0, file.RemoveMessage(len(file.Messages) - 1)) # m5
+        Expect(2)
+        self.assertEqual([msg.title for msg in file.FindIdInOrder(2)], ['m5', 'm0', 'm1'])
+
+    def testMessagesBin(self):
+        self.Check(MessagesBin(MakeData()))
+
+    def testColumnarMessagesBin(self):
+        self.Check(ColumnarMessagesBin(MakeData()))
+
+    def testLazyMessagesBin(self):
+        with tempfile.TemporaryDirectory() as dir:
+            fp = os.path.join(dir, 'messages.bin')
+            with open(fp, 'wb') as f: f.write(MakeData())
+            file = LazyMessagesBin(fp)
+            try: self.Check(file)
+            finally: file.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -80,7 +80,7 @@ printv('>> Directory ready!')
 # exclude QtWebKit to save space, plus Python stuff we don't use
 excludes = ['doctest', 'pdb', 'unittest', 'difflib', 'inspect',
     'os2emxpath', 'posixpath', 'optpath', 'locale', 'calendar',
-    'select', 'multiprocessing', 'ssl',
+    'ssl',
     'PyQt5.QtWebKit', 'PyQt5.QtNetwork']
 
 # Set it up
@@ -103,6 +103,10 @@ setup(
             'newer_messages_editor.py',
             base = base,
             ),
+        Executable(
+            'nme_cli.py',
+            base = None, # console program
+            ),
         ],
     )
 print('>> Built frozen executable!')